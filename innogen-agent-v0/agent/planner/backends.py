@@ -0,0 +1,246 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import OpenAI
+from openai.types.chat import ChatCompletion
+
+# ------------------------------
+# LLM backends for planner.py: chat, stream and batch over
+#   openrouter  the OpenRouter API (OPENROUTER_API_KEY, OPENROUTER_BASE_URL)
+#   local       any OpenAI-compatible server, e.g. llama.cpp's llama-server
+#               with a small quantized model on CPU (LLM_BASE_URL)
+#   fake        in-process, answers a text_print tree (one per problem id
+#               for batch prompts); no network or key
+# Selected with LLM_BACKEND (default openrouter); LLM_MODEL overrides the
+# model. Each backend keeps latency and token-throughput figures, which
+# planner.py reports on stderr (BACKEND line, read by retry_loop.py).
+#
+#   llama-server -m qwen2.5-1.5b-instruct-q4_k_m.gguf --parallel 4 --port 8080
+#   LLM_BACKEND=local python retry_loop.py "Print Hello World"
+# ------------------------------
+
+DEFAULT_MODEL = "meta-llama/llama-3-8b-instruct"
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+# llama-server's default port; --parallel sets how many requests it decodes at once
+LOCAL_BASE_URL = "http://127.0.0.1:8080/v1"
+LOCAL_PARALLEL = 4
+
+BATCH_WORKERS = 8
+
+PROBLEM_RE = re.compile(r"PROBLEM:\s*\n(.+?)\n\s*\n", re.S)
+BATCH_PROBLEM_RE = re.compile(r"^\[id: (.+?)\]\n(.+?)(?=\n\s*\n)", re.M | re.S)
+
+
+class BackendError(Exception):
+    pass
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)"""
+    return max(1, math.ceil(len(text or "") / 4))
+
+
+class BackendStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, prompt_tokens=0, completion_tokens=0):
+        with self._lock:
+            self.requests += 1
+            self.seconds += seconds
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def record_error(self, seconds):
+        with self._lock:
+            self.errors += 1
+            self.seconds += seconds
+
+
+class ChatBackend:
+    name = "base"
+
+    def __init__(self, model):
+        self.model = model
+        self.stats = BackendStats()
+
+    def chat(self, messages, **options) -> ChatCompletion:
+        start = time.perf_counter()
+        try:
+            response = self._complete(messages, **options)
+        except Exception:
+            self.stats.record_error(time.perf_counter() - start)
+            raise
+        usage = getattr(response, "usage", None)
+        self.stats.record(
+            time.perf_counter() - start,
+            getattr(usage, "prompt_tokens", 0) or 0,
+            getattr(usage, "completion_tokens", 0) or 0,
+        )
+        return response
+
+    def stream(self, messages, **options):
+        """Completion text, chunk by chunk; closing the generator early cancels the request"""
+        start = time.perf_counter()
+        text = []
+        failed = False
+        chunks = self._stream(messages, **options)
+        try:
+            for delta in chunks:
+                text.append(delta)
+                yield delta
+        except Exception:
+            failed = True
+            self.stats.record_error(time.perf_counter() - start)
+            raise
+        finally:
+            chunks.close()
+            if not failed:
+                prompt = "".join(str(m.get("content", "")) for m in messages)
+                self.stats.record(time.perf_counter() - start, estimate_tokens(prompt), estimate_tokens("".join(text)))
+
+    def batch(self, conversations, max_workers=None, **options):
+        """Completions in order; a failed conversation gets its exception in place"""
+        def one(messages):
+            try:
+                return self.chat(messages, **options)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=max_workers or self.batch_workers) as pool:
+            return list(pool.map(one, conversations))
+
+    @property
+    def batch_workers(self):
+        return BATCH_WORKERS
+
+    def report(self):
+        stats = self.stats
+        return {
+            "backend": self.name,
+            "model": self.model,
+            "requests": stats.requests,
+            "errors": stats.errors,
+            "seconds": round(stats.seconds, 3),
+            "prompt_tokens": stats.prompt_tokens,
+            "completion_tokens": stats.completion_tokens,
+        }
+
+
+class OpenAICompatibleBackend(ChatBackend):
+    name = "openai"
+
+    def __init__(self, base_url, api_key, model):
+        super().__init__(model)
+        self.base_url = base_url
+        # 429 / 5xx backoff is done by call_with_retries
+        self.client = OpenAI(base_url=base_url, api_key=api_key, max_retries=0)
+
+    def _complete(self, messages, **options):
+        return self.client.chat.completions.create(model=self.model, messages=messages, **options)
+
+    def _stream(self, messages, **options):
+        chunks = self.client.chat.completions.create(model=self.model, messages=messages, stream=True, **options)
+        try:
+            for chunk in chunks:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            chunks.close()  # drops the connection, so the server stops generating
+
+
+class OpenRouterBackend(OpenAICompatibleBackend):
+    name = "openrouter"
+
+    def __init__(self, model=None):
+        api_key = os.getenv("OPENROUTER_API_KEY")
+        if not api_key:
+            raise BackendError("OPENROUTER_API_KEY not set")
+        super().__init__(os.getenv("OPENROUTER_BASE_URL", OPENROUTER_BASE_URL), api_key, model or DEFAULT_MODEL)
+
+
+class LocalBackend(OpenAICompatibleBackend):
+    name = "local"
+
+    def __init__(self, model=None):
+        super().__init__(
+            os.getenv("LLM_BASE_URL", LOCAL_BASE_URL),
+            os.getenv("LLM_API_KEY", "local"),
+            model or "local"  # llama-server answers with whatever model it loaded
+        )
+        self.parallel = int(os.getenv("LLM_PARALLEL", LOCAL_PARALLEL))
+
+    @property
+    def batch_workers(self):
+        return self.parallel
+
+
+class FakeBackend(ChatBackend):
+    name = "fake"
+
+    def __init__(self, model=None):
+        super().__init__(model or "fake")
+
+    def _content(self, messages):
+        prompt = messages[-1].get("content", "") if messages else ""
+        batch = BATCH_PROBLEM_RE.findall(prompt)
+        if batch:
+            return json.dumps({"trees": [{"id": pid, "tree": self._tree(text)} for pid, text in batch]})
+        match = PROBLEM_RE.search(prompt)
+        return json.dumps(self._tree(match.group(1) if match else prompt))
+
+    def _tree(self, text):
+        return {
+            "type": "text_print",
+            "value_inputs": {"TEXT": {"type": "text_literal", "fields": {"TEXT": text.strip()}}}
+        }
+
+    def _complete(self, messages, **options):
+        contents = [self._content(messages)] * max(1, int(options.get("n") or 1))
+        prompt = "".join(str(m.get("content", "")) for m in messages)
+        completion_tokens = sum(estimate_tokens(c) for c in contents)
+        return ChatCompletion.model_validate({
+            "id": "fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": self.model,
+            "choices": [
+                {"index": i, "message": {"role": "assistant", "content": c}, "finish_reason": "stop"}
+                for i, c in enumerate(contents)
+            ],
+            "usage": {
+                "prompt_tokens": estimate_tokens(prompt),
+                "completion_tokens": completion_tokens,
+                "total_tokens": estimate_tokens(prompt) + completion_tokens,
+            },
+        })
+
+    def _stream(self, messages, **options):
+        content = self._content(messages)
+        for i in range(0, len(content), 16):
+            yield content[i:i + 16]
+
+
+BACKENDS = {
+    "openrouter": OpenRouterBackend,
+    "local": LocalBackend,
+    "fake": FakeBackend,
+}
+
+
+def get_backend(name=None, model=None) -> ChatBackend:
+    name = name or os.getenv("LLM_BACKEND", "openrouter")
+    if name not in BACKENDS:
+        raise BackendError(f"Unknown LLM backend: {name} (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name](model=model or os.getenv("LLM_MODEL"))
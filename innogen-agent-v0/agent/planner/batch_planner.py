@@ -0,0 +1,202 @@
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+from dotenv import load_dotenv
+
+from backends import BackendError, get_backend
+from block_knowledge import BlockKnowledgeBase
+from blocks import Block
+from limiter import AIMDLimiter, call_with_retries, classify_error
+from profiling import profiled
+from prompt import batch_user_prompt, system_prompt
+from schemas import batch_tree_schema, rejected, response_format, unsupported
+from tree_validator import validate_tree
+import budget
+import deadline
+
+# ------------------------------
+# Batch planning: several problems in ONE planner request.
+# planner.py sends the long system prompt (and its retrieved blocks) once
+# per problem; here k problems share one request, one system prompt and
+# the union of their retrieved blocks, which is what matters when the
+# provider limits requests per minute rather than tokens.
+#
+#   python batch_planner.py batch.json
+#   batch.json: [{"problem_id": ..., "description": ...}, ...]
+#
+# Every problem whose tree comes back valid gets output/batch/<id>.json
+# (the same JSON as block_tree.json). Missing, malformed, invalid or
+# not_expressible trees are simply left out: main.py plans those problems
+# alone with retry_loop.py. Usage goes to output/batch_stats.json.
+# ------------------------------
+
+load_dotenv()
+
+BASE_DIR = Path(__file__).parent
+OUTPUT_DIR = BASE_DIR / "output"
+BATCH_DIR = OUTPUT_DIR / "batch"
+BATCH_STATS_PATH = OUTPUT_DIR / "batch_stats.json"
+
+# One batch = one request (the limiter only paces its retries)
+LIMITER = AIMDLimiter(initial=1, max_limit=1)
+
+STATS = {
+    "problems": [],
+    "planned": [],
+    "attempts": 0,
+    "llm_errors": 0,
+    "llm_retries": {},
+    "prompt_tokens": 0,
+    "completion_tokens": 0,
+    "response_format_rejected": 0,
+    "validation_errors": [],
+}
+
+
+def export_stats():
+    OUTPUT_DIR.mkdir(exist_ok=True)
+    with open(BATCH_STATS_PATH, "w", encoding="utf-8") as f:
+        json.dump(STATS, f, indent=2)
+
+
+def retrieve_blocks(kb: BlockKnowledgeBase, problems: Dict[str, str]) -> List[Dict]:
+    """Union of every problem's retrieved blocks, in first-seen order"""
+    blocks = {}
+    for text in problems.values():
+        for block in kb.retrieve_relevant_blocks(text):
+            blocks.setdefault(block["type"], block)
+    return list(blocks.values())
+
+
+def parse_trees(text: str, ids: List[str]) -> Dict[str, Dict]:
+    """
+    Trees by problem id from a batch completion. Accepts the requested
+    {"trees": [...]} object or a bare array of entries; unknown ids are
+    ignored and an id answered twice is dropped.
+    """
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        raise ValueError("No JSON found in batch planner output")
+    start = min(starts)
+    end = text.rfind("]" if text[start] == "[" else "}") + 1
+    parsed = json.loads(text[start:end])
+
+    entries = parsed.get("trees") if isinstance(parsed, dict) else parsed
+    if not isinstance(entries, list):
+        raise ValueError("Batch planner output has no list of trees")
+
+    trees = {}
+    duplicates = set()
+    for entry in entries:
+        if not isinstance(entry, dict) or str(entry.get("id")) not in ids:
+            continue
+        pid = str(entry["id"])
+        if pid in trees:
+            duplicates.add(pid)
+        trees[pid] = entry.get("tree")
+
+    for pid in duplicates:
+        trees.pop(pid)
+    return trees
+
+
+def export_valid_trees(trees: Dict[str, Dict]):
+    """Write every valid tree to output/batch/<id>.json"""
+    BATCH_DIR.mkdir(parents=True, exist_ok=True)
+    for pid, tree in trees.items():
+        if not isinstance(tree, dict) or tree.get("error"):
+            continue
+        try:
+            block = Block.from_dict(tree)
+        except ValueError as e:
+            STATS["validation_errors"].append(f"Malformed block tree: {e}")
+            continue
+        errors = validate_tree(block)
+        if errors:
+            STATS["validation_errors"].extend(errors)
+            continue
+        with open(BATCH_DIR / f"{pid}.json", "w", encoding="utf-8") as f:
+            json.dump(block.to_dict(), f, indent=2)
+        STATS["planned"].append(pid)
+
+
+# ------------------------------
+def main():
+    if len(sys.argv) < 2:
+        print(json.dumps({"error": "missing_batch"}))
+        sys.exit(1)
+
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        problems = {str(p["problem_id"]): p["description"] for p in json.load(f)}
+    STATS["problems"] = list(problems)
+
+    try:
+        backend = get_backend()
+    except BackendError as e:
+        print(f"❌ {e}")
+        return
+
+    kb = BlockKnowledgeBase()
+    blocks = retrieve_blocks(kb, problems)
+    tree_format = response_format(batch_tree_schema(blocks), name="block_trees")
+
+    messages = [
+        {"role": "system", "content": system_prompt()},
+        {"role": "user", "content": batch_user_prompt(problems, json.dumps(kb.format_for_llm(blocks), indent=2))}
+    ]
+
+    def create(**options):
+        budget.check(STATS["prompt_tokens"] + STATS["completion_tokens"], STATS["attempts"], "Batch planner call")
+        STATS["attempts"] += 1
+        response = backend.chat(
+            messages,
+            temperature=0,
+            timeout=deadline.timeout(cap=120),
+            **options
+        )
+        usage = getattr(response, "usage", None)
+        STATS["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+        STATS["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+        return response
+
+    def request():
+        if tree_format is None:
+            return create()
+        try:
+            return create(response_format=tree_format)
+        except Exception as e:
+            if not rejected(e):
+                raise
+            if unsupported(e):
+                STATS["response_format_rejected"] += 1
+            return create()
+
+    def on_retry(error_class, delay):
+        STATS["llm_retries"][error_class] = STATS["llm_retries"].get(error_class, 0) + 1
+
+    print(f"📦 Planning {len(problems)} problems in one request")
+    try:
+        response = call_with_retries(request, LIMITER, on_retry=on_retry)
+        trees = parse_trees(response.choices[0].message.content or "", list(problems))
+    except (deadline.DeadlineExceeded, budget.BudgetExceeded) as e:
+        # The problems are planned alone, where the deadline / budget is reported
+        print(f"⚠️  Batch planning stopped: {e}")
+        return
+    except Exception as e:
+        STATS["llm_errors"] += 1
+        print(f"⚠️  Batch planning failed ({classify_error(e)}): {e}")
+        return
+
+    export_valid_trees(trees)
+    print(f"📦 Batch planned {len(STATS['planned'])}/{len(problems)}")
+
+
+# ------------------------------
+if __name__ == "__main__":
+    try:
+        with profiled("plan_batch"):
+            main()
+    finally:
+        export_stats()
@@ -0,0 +1,156 @@
+import argparse
+import hashlib
+import html
+import json
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+# ------------------------------
+# Catalog dependency graph.
+# normalized_blocks.json lists almost no inputs (only what was connected
+# when the catalog was scraped), so the input slots of a block are read
+# from its python_sample the way the code generator sees them: literals
+# left over once the field defaults are claimed are value slots, `pass`
+# is a statement slot. Each value slot is typed by its default literal
+# and mapped to the blocks that can fill it, so retrieval can add the
+# minimal set of filler blocks for whatever it selected.
+#
+#   python block_graph.py            # rebuild ../data/block_graph.json
+# ------------------------------
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+CATALOG_PATH = DATA_DIR / "normalized_blocks.json"
+GRAPH_PATH = DATA_DIR / "block_graph.json"
+
+# Slot kind -> blocks that fill it (no slots of their own)
+FILLERS = {
+    "number": ["essentials_num_literal", "essentials_var_get"],
+    "text": ["text_literal", "essentials_var_get"],
+    "boolean": ["essentials_bool_true", "essentials_bool_false", "essentials_compare"],
+    "list": ["essentials_list_create", "essentials_var_get"],
+    "any": ["essentials_var_get"],
+    # Any statement block fits; the planner already gets them from retrieval
+    "statement": [],
+}
+
+TOKEN_RE = re.compile(r"""
+     (?P<string>'(?:\\.|[^'\\])*'|"(?:\\.|[^"\\])*")
+    |(?P<number>\d+(?:\.\d+)?)
+    |(?P<name>[A-Za-z_]\w*)
+    |(?P<open>[(\[{])
+    |(?P<close>[)\]}])
+    |(?P<other>\S)
+""", re.X)
+
+FIELD_RE = re.compile(r'<field name="([^"]+)"[^>]*>(.*?)</field>', re.S)
+
+LITERAL_KINDS = {"None": "any", "False": "boolean", "True": "boolean"}
+
+
+def catalog_digest(blocks: List[Dict]) -> str:
+    return hashlib.sha256(json.dumps(blocks, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def code_body(sample: str) -> str:
+    """python_sample without its definitions header (imports, declarations)"""
+    if "\n\n\n" not in sample:
+        return sample
+    return sample.split("\n\n\n", 1)[1]
+
+
+def block_slots(block: Dict) -> List[str]:
+    """Kinds of the input slots of one block, in sample order"""
+    tokens = [(m.lastgroup, m.group()) for m in TOKEN_RE.finditer(code_body(block.get("python_sample") or ""))]
+    defaults = [html.unescape(d) for _, d in FIELD_RE.findall(block.get("xml_template") or "")]
+
+    # Field defaults are edited in place, not filled by other blocks
+    claimed = set()
+    for default in defaults:
+        for i, (kind, text) in enumerate(tokens):
+            if i in claimed:
+                continue
+            if (default and text == default) or (not default and kind == "string" and text in {"''", '""'}):
+                claimed.add(i)
+                break
+
+    # A literal block (`0`, `True`, `''`) is a filler, not a slot
+    if len(tokens) == 1:
+        return []
+
+    slots = []
+    for i, (kind, text) in enumerate(tokens):
+        if i in claimed:
+            continue
+        if kind == "name" and text == "pass":
+            slots.append("statement")
+        elif kind == "name" and text in LITERAL_KINDS:
+            slots.append(LITERAL_KINDS[text])
+        elif kind == "number":
+            slots.append("number")
+        elif kind == "string":
+            slots.append("text")
+        elif kind == "open" and text == "[" and i + 1 < len(tokens) and tokens[i + 1][1] == "]":
+            # `[]` standing alone, not a subscript like `x[0]`
+            if i == 0 or tokens[i - 1][0] not in {"name", "close", "string"}:
+                slots.append("list")
+    return slots
+
+
+def build_graph(blocks: List[Dict]) -> Dict:
+    known = {b["type"] for b in blocks}
+    nodes = {}
+    for block in blocks:
+        slots = block_slots(block)
+        requires = []
+        for slot in slots:
+            for filler in FILLERS[slot]:
+                if filler in known and filler != block["type"] and filler not in requires:
+                    requires.append(filler)
+        nodes[block["type"]] = {"slots": slots, "requires": requires}
+    return {"catalog": catalog_digest(blocks), "nodes": nodes}
+
+
+def load_graph(blocks: List[Dict]) -> Dict:
+    """The saved graph, or a fresh one when the catalog has changed"""
+    if GRAPH_PATH.exists():
+        graph = json.loads(GRAPH_PATH.read_text(encoding="utf-8"))
+        if graph.get("catalog") == catalog_digest(blocks):
+            return graph
+    return build_graph(blocks)
+
+
+def closure(graph: Dict, types: Iterable[str]) -> List[str]:
+    """Block types the given types need to have their inputs filled, not
+    including the given types themselves"""
+    nodes = graph["nodes"]
+    pending = list(dict.fromkeys(types))
+    selected = set(pending)
+    added = []
+    while pending:
+        node = nodes.get(pending.pop(0))
+        for required in node["requires"] if node else []:
+            if required not in selected:
+                selected.add(required)
+                added.append(required)
+                pending.append(required)
+    return added
+
+
+# ------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the catalog dependency graph")
+    parser.add_argument("--catalog", default=str(CATALOG_PATH))
+    parser.add_argument("--out", default=str(GRAPH_PATH))
+    args = parser.parse_args(argv)
+
+    blocks = json.loads(Path(args.catalog).read_text(encoding="utf-8"))
+    graph = build_graph(blocks)
+    Path(args.out).write_text(json.dumps(graph, indent=2), encoding="utf-8")
+
+    with_slots = sum(1 for node in graph["nodes"].values() if node["slots"])
+    print(f"✅ {len(graph['nodes'])} blocks, {with_slots} with input slots -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,8 @@ from pathlib import Path
 from sentence_transformers import SentenceTransformer
 from qdrant_client import QdrantClient
 
+from block_graph import closure, load_graph
+
 # -------------------------
 # Paths & constants
 # -------------------------
@@ -14,6 +16,12 @@ EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
 TOP_K_SEMANTIC = 8
 TOP_K_KEYWORD = 20
 
+# Cosine similarity a semantic hit needs to be kept (None keeps the top k)
+SCORE_THRESHOLD = 0.3
+
+# Added to every keyword search when no dependency closure is taken
+DEFAULT_MODULES = ["Text", "Numbers", "Logic & Booleans"]
+
 KEYWORD_TO_MODULE = {
     "print": ["Text"],
     "display": ["Text"],
@@ -28,20 +36,27 @@ KEYWORD_TO_MODULE = {
 }
 
 class BlockKnowledgeBase:
-    def __init__(self):
+    def __init__(self, qdrant=None):
         self.blocks = self._load_blocks()
         self.by_type = {b["type"]: b for b in self.blocks}
         self.by_module = self._index_by_module()
+        self.graph = load_graph(self.blocks)
 
-        # 🔥 LOCAL EMBEDDINGS
-        self.embedder = SentenceTransformer(EMBEDDING_MODEL_NAME)
+        # 🔥 LOCAL EMBEDDINGS (loaded on the first semantic search)
+        self._embedder = None
 
-        # 🔥 REMOTE QDRANT
-        self.qdrant = QdrantClient(
+        # 🔥 REMOTE QDRANT (or a local client passed in, e.g. for benchmarks)
+        self.qdrant = qdrant or QdrantClient(
             url="https://64ae9382-4720-40e0-92ef-b7ee2da511c7.us-east4-0.gcp.cloud.qdrant.io:6333",
             api_key=os.getenv("QDRANT_API_KEY", None),
         )
 
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            self._embedder = SentenceTransformer(EMBEDDING_MODEL_NAME)
+        return self._embedder
+
     def _load_blocks(self):
         with open(DATA_PATH, "r", encoding="utf-8") as f:
             return json.load(f)
@@ -52,7 +67,7 @@ class BlockKnowledgeBase:
             index.setdefault(block["module"], []).append(block)
         return index
 
-    def _semantic_search(self, problem_text: str):
+    def _semantic_search(self, problem_text: str, limit: int = TOP_K_SEMANTIC, score_threshold=None):
         query_vector = self.embedder.encode(
             problem_text,
             normalize_embeddings=True
@@ -61,13 +76,14 @@ class BlockKnowledgeBase:
         results = self.qdrant.search(
             collection_name=COLLECTION_NAME,
             query_vector=query_vector,
-            limit=TOP_K_SEMANTIC,
+            limit=limit,
+            score_threshold=score_threshold,
             with_payload=True,
         )
 
         return [r.payload for r in results]
 
-    def _keyword_search(self, problem_text: str):
+    def _keyword_search(self, problem_text: str, limit: int = TOP_K_KEYWORD, default_modules=DEFAULT_MODULES):
         problem_text = problem_text.lower()
         relevant_modules = set()
 
@@ -75,27 +91,46 @@ class BlockKnowledgeBase:
             if keyword in problem_text:
                 relevant_modules.update(modules)
 
-        relevant_modules.update(["Text", "Numbers", "Logic & Booleans"])
+        relevant_modules.update(default_modules)
 
         blocks = []
         for module in relevant_modules:
             blocks.extend(self.by_module.get(module, []))
 
-        return blocks[:TOP_K_KEYWORD]
+        return blocks[:limit]
 
-    def retrieve_relevant_blocks(self, problem_text: str):
+    def retrieve_relevant_blocks(
+        self,
+        problem_text: str,
+        top_k_semantic: int = TOP_K_SEMANTIC,
+        top_k_keyword: int = TOP_K_KEYWORD,
+        score_threshold=SCORE_THRESHOLD,
+        with_closure: bool = True,
+    ):
         semantic_blocks = []
         try:
-            semantic_blocks = self._semantic_search(problem_text)
+            semantic_blocks = self._semantic_search(problem_text, top_k_semantic, score_threshold)
         except Exception as e:
             print(f"[WARN] Semantic search failed ({e}), falling back to keyword only")
 
-        keyword_blocks = self._keyword_search(problem_text)
+        # The closure brings in the literals and variables the selected
+        # blocks need, so whole default modules are only added without it
+        keyword_blocks = self._keyword_search(
+            problem_text, top_k_keyword, default_modules=[] if with_closure else DEFAULT_MODULES
+        )
+
+        if with_closure and not semantic_blocks and not keyword_blocks:
+            # Nothing scored high enough and no keyword matched
+            keyword_blocks = self._keyword_search(problem_text, top_k_keyword)
 
         merged = {}
         for block in semantic_blocks + keyword_blocks:
             merged[block["type"]] = block
 
+        if with_closure:
+            for block_type in closure(self.graph, merged):
+                merged[block_type] = self.by_type[block_type]
+
         return list(merged.values())
 
     def format_for_llm(self, blocks):
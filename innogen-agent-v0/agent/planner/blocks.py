@@ -0,0 +1,310 @@
+import sys
+import threading
+import weakref
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# ------------------------------
+# Block-tree nodes (same as v3 semantic/blocks.py).
+# Planner output is parsed into slotted, immutable Block objects instead of
+# nested dicts: fields and inputs are tuples of (name, value) pairs, and
+# identical subtrees are one shared object (NodeTable interns them).
+#   Block.from_dict(data)   parse (raises ValueError on malformed nodes)
+#   block.to_dict()         the JSON the assembler reads
+#   block.iter_xml()        Blockly XML in chunks, without recursion
+# ------------------------------
+
+Pairs = Tuple[Tuple[str, Any], ...]
+
+XML_ESCAPES = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&apos;"})
+
+
+class Block:
+    """
+    Immutable block-tree node. Build through NodeTable.block or
+    Block.from_dict so equal subtrees are shared.
+    """
+
+    __slots__ = ("type", "fields", "value_inputs", "statement_inputs", "next", "_hash", "__weakref__")
+
+    def __init__(
+        self,
+        type: str,
+        fields: Optional[Pairs] = None,
+        value_inputs: Optional[Tuple[Tuple[str, "Block"], ...]] = None,
+        statement_inputs: Optional[Tuple[Tuple[str, "Block"], ...]] = None,
+        next: Optional["Block"] = None
+    ):
+        setter = object.__setattr__
+        setter(self, "type", type)
+        setter(self, "fields", fields)
+        setter(self, "value_inputs", value_inputs)
+        setter(self, "statement_inputs", statement_inputs)
+        setter(self, "next", next)
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError("blocks are shared and immutable; build a new one instead")
+
+    # -------------------------
+    # Lookups (no .get guards)
+    # -------------------------
+    def field(self, name: str, default: Any = None) -> Any:
+        for key, value in self.fields or ():
+            if key == name:
+                return value
+        return default
+
+    def value(self, name: str) -> Optional["Block"]:
+        for key, child in self.value_inputs or ():
+            if key == name:
+                return child
+        return None
+
+    def statement(self, name: str) -> Optional["Block"]:
+        for key, child in self.statement_inputs or ():
+            if key == name:
+                return child
+        return None
+
+    def children(self) -> Iterator["Block"]:
+        """Value inputs, statement inputs, then next"""
+        for _, child in self.value_inputs or ():
+            yield child
+        for _, child in self.statement_inputs or ():
+            yield child
+        if self.next is not None:
+            yield self.next
+
+    def walk(self) -> Iterator["Block"]:
+        """Every block of the tree, depth first (a shared subtree once per use)"""
+        stack = [self]
+        while stack:
+            block = stack.pop()
+            yield block
+            stack.extend(reversed(list(block.children())))
+
+    # -------------------------
+    # Identity
+    # -------------------------
+    def __hash__(self) -> int:
+        try:
+            return self._hash
+        except AttributeError:
+            value = hash((
+                self.type,
+                self.fields,
+                _hash_inputs(self.value_inputs),
+                _hash_inputs(self.statement_inputs),
+                hash(self.next),
+            ))
+            object.__setattr__(self, "_hash", value)
+            return value
+
+    def __eq__(self, other: Any) -> bool:
+        if self is other:
+            return True
+        if not isinstance(other, Block) or hash(self) != hash(other):
+            return False
+        # Only blocks of different tables (or a hash collision) get here
+        return (
+            self.type == other.type
+            and self.fields == other.fields
+            and self.value_inputs == other.value_inputs
+            and self.statement_inputs == other.statement_inputs
+            and self.next == other.next
+        )
+
+    def __ne__(self, other: Any) -> bool:
+        return not self == other
+
+    def __repr__(self) -> str:
+        return f"Block({self.type!r})"
+
+    def __copy__(self) -> "Block":
+        return self
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "Block":
+        return self
+
+    def __reduce__(self):
+        return (_unpickle, (self.to_dict(),))
+
+    # -------------------------
+    # Serialization
+    # -------------------------
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], nodes: Optional["NodeTable"] = None) -> "Block":
+        """
+        Build (interned) blocks from a JSON block tree.
+
+        Raises:
+            ValueError if a node is not an object with a type, or its
+            fields or inputs are malformed
+        """
+        return (nodes or NODES).intern(data)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready dict; a shared subtree is written out at every use."""
+        data: Dict[str, Any] = {"type": self.type}
+        if self.fields is not None:
+            data["fields"] = dict(self.fields)
+        if self.value_inputs is not None:
+            data["value_inputs"] = {name: child.to_dict() for name, child in self.value_inputs}
+        if self.statement_inputs is not None:
+            data["statement_inputs"] = {name: child.to_dict() for name, child in self.statement_inputs}
+        if self.next is not None:
+            data["next"] = self.next.to_dict()
+        return data
+
+    def iter_xml(self) -> Iterator[str]:
+        """
+        Blockly XML for this block and everything below it, in chunks.
+        An explicit stack keeps long `next` chains clear of the recursion
+        limit. Field text is escaped.
+        """
+        stack: list = [self]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                yield item
+                continue
+
+            yield f'<block type="{item.type}">'
+            for name, value in item.fields or ():
+                yield f'<field name="{name}">{str(value).translate(XML_ESCAPES)}</field>'
+
+            # Pushed in reverse so they pop in document order
+            tail: list = ["</block>"]
+            if item.next is not None:
+                tail += ["</next>", item.next, "<next>"]
+            for name, child in reversed(item.statement_inputs or ()):
+                tail += ["</statement>", child, f'<statement name="{name}">']
+            for name, child in reversed(item.value_inputs or ()):
+                tail += ["</value>", child, f'<value name="{name}">']
+            stack.extend(tail)
+
+    def to_xml(self) -> str:
+        return "".join(self.iter_xml())
+
+
+def _hash_inputs(inputs: Optional[Tuple[Tuple[str, Block], ...]]) -> Any:
+    if inputs is None:
+        return None
+    return tuple((name, hash(child)) for name, child in inputs)
+
+
+def _fields_key(fields: Optional[Pairs]) -> Any:
+    # Field values are nearly always strings; others are keyed with their
+    # type so 1, 1.0 and True do not collapse into one block
+    if fields is None or all(type(value) is str for _, value in fields):
+        return fields
+    return tuple((name, type(value), value) for name, value in fields)
+
+
+class NodeTable:
+    """
+    Intern table for blocks.
+
+    Entries are weak: a block is dropped once no tree refers to it, so a
+    long-running process only holds the blocks of the trees it keeps.
+
+    Usage:
+        nodes = NodeTable()
+        leaf = nodes.block("essentials_var_get", fields=(("VAR", "x"),))
+        tree = nodes.intern(json.loads(text))
+        nodes.intern(json.loads(text)) is tree   # True
+        print(nodes.stats())
+    """
+
+    def __init__(self):
+        self._table: "weakref.WeakValueDictionary[Tuple, Block]" = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def block(
+        self,
+        type: str,
+        fields: Optional[Pairs] = None,
+        value_inputs: Optional[Tuple[Tuple[str, Block], ...]] = None,
+        statement_inputs: Optional[Tuple[Tuple[str, Block], ...]] = None,
+        next: Optional[Block] = None
+    ) -> Block:
+        """The shared block with these parts (children must come from this table)"""
+        # Children are keyed by identity: they are interned, so identity is structure
+        key = (
+            type,
+            _fields_key(fields),
+            tuple([(name, id(child)) for name, child in value_inputs]) if value_inputs is not None else None,
+            tuple([(name, id(child)) for name, child in statement_inputs]) if statement_inputs is not None else None,
+            id(next) if next is not None else None,
+        )
+        node = self._table.get(key)
+        if node is not None:
+            self.hits += 1
+            return node
+        with self._lock:
+            # Another thread may have created it meanwhile
+            node = self._table.get(key)
+            if node is None:
+                node = Block(type, fields, value_inputs, statement_inputs, next)
+                self._table[key] = node
+                self.misses += 1
+            return node
+
+    def intern(self, data: Any) -> Block:
+        """The shared Block for a block of another table or a JSON block tree."""
+        if isinstance(data, Block):
+            return self.block(
+                data.type,
+                data.fields,
+                self._inputs(data.value_inputs),
+                self._inputs(data.statement_inputs),
+                self.intern(data.next) if data.next is not None else None,
+            )
+        if not isinstance(data, dict) or not isinstance(data.get("type"), str):
+            raise ValueError(f"Not a block: {str(data)[:80]}")
+
+        fields = data.get("fields")
+        if fields is not None:
+            if not isinstance(fields, dict):
+                raise ValueError(f"Block '{data['type']}': fields must be an object")
+            if any(isinstance(v, (dict, list)) for v in fields.values()):
+                raise ValueError(f"Block '{data['type']}': field values must be scalars")
+            fields = tuple((sys.intern(name), sys.intern(v) if isinstance(v, str) else v) for name, v in fields.items())
+        next_block = data.get("next")
+        return self.block(
+            sys.intern(data["type"]),
+            fields,
+            self._inputs(data.get("value_inputs")),
+            self._inputs(data.get("statement_inputs")),
+            self.intern(next_block) if next_block is not None else None,
+        )
+
+    def _inputs(self, inputs: Any) -> Optional[Tuple[Tuple[str, Block], ...]]:
+        if inputs is None:
+            return None
+        if isinstance(inputs, dict):
+            inputs = inputs.items()
+        elif not isinstance(inputs, tuple):
+            raise ValueError(f"Inputs must be an object: {str(inputs)[:80]}")
+        return tuple((sys.intern(name), self.intern(child)) for name, child in inputs)
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "live_blocks": len(self._table),
+            "interned": self.hits,
+            "created": self.misses,
+            "share_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+# Shared by everything in the process unless given its own table
+NODES = NodeTable()
+
+
+def _unpickle(data: Dict[str, Any]) -> Block:
+    return NODES.intern(data)
@@ -0,0 +1,58 @@
+import os
+
+# ------------------------------
+# Per-problem token budget, passed to child processes like the deadline.
+# main.py sets it (already bounded by what is left of the run budget);
+# retry_loop.py checks it before every planner launch.
+# ------------------------------
+TOKEN_BUDGET_ENV = "PROBLEM_TOKEN_BUDGET"
+
+# Exit code of a script that stopped because the budget was used up
+EXIT_BUDGET = 125
+
+# Assumed size of one request until some have been seen
+DEFAULT_REQUEST_ESTIMATE = 2000
+
+
+class BudgetExceeded(RuntimeError):
+    pass
+
+
+def budget_env(tokens, env=None) -> dict:
+    """Environment for a child process that may spend `tokens` (None = unlimited)."""
+    env = dict(env if env is not None else os.environ)
+    env.pop(TOKEN_BUDGET_ENV, None)
+    if tokens is not None:
+        env[TOKEN_BUDGET_ENV] = str(int(tokens))
+    return env
+
+
+def budget():
+    """Tokens this process may spend, or None when there is no budget."""
+    value = os.getenv(TOKEN_BUDGET_ENV)
+    return int(value) if value else None
+
+
+def request_estimate(used: int, requests: int) -> float:
+    """Mean tokens per request so far."""
+    if not requests:
+        return DEFAULT_REQUEST_ESTIMATE
+    return used / requests
+
+
+def can_afford(used: int, requests: int, more: int = 1) -> bool:
+    """Whether `more` requests of average size still fit the budget."""
+    limit = budget()
+    return limit is None or limit - used >= more * request_estimate(used, requests)
+
+
+def check(used: int, requests: int, what: str):
+    """
+    Raise BudgetExceeded when the budget cannot pay for another request.
+    A request's size is only known once it returns, so the budget can
+    still be overrun by one request.
+    """
+    limit = budget()
+    needed = request_estimate(used, requests) if requests else 1
+    if limit is not None and limit - used < needed:
+        raise BudgetExceeded(f"{what}: token budget of {limit} used up ({used})")
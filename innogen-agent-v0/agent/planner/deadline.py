@@ -0,0 +1,96 @@
+import os
+import signal
+import subprocess
+import time
+
+# ------------------------------
+# Per-problem deadline, shared across processes as an absolute epoch time.
+# main.py sets it; retry_loop.py and planner.py inherit it.
+# ------------------------------
+DEADLINE_ENV = "PROBLEM_DEADLINE"
+
+# Exit code of a script that gave up because of the deadline (as timeout(1))
+EXIT_DEADLINE = 124
+
+
+class DeadlineExceeded(RuntimeError):
+    pass
+
+
+def deadline_env(seconds: float, env=None) -> dict:
+    """Environment for a child process that must finish within `seconds`."""
+    env = dict(env if env is not None else os.environ)
+    env[DEADLINE_ENV] = str(time.time() + seconds)
+    return env
+
+
+def remaining():
+    """Seconds left before the deadline, or None when there is none."""
+    value = os.getenv(DEADLINE_ENV)
+    if not value:
+        return None
+    return max(0.0, float(value) - time.time())
+
+
+def timeout(cap=None):
+    """Timeout for the next blocking call: the time left, optionally capped."""
+    left = remaining()
+    if left is None:
+        return cap
+    return left if cap is None else min(left, cap)
+
+
+def check(what: str):
+    if remaining() == 0.0:
+        raise DeadlineExceeded(f"{what}: problem deadline exceeded")
+
+
+# ------------------------------
+def run_with_deadline(cmd, cwd=None, env=None, input=None, capture_output=False, cap=None, tracker=None):
+    """
+    subprocess.run() bounded by the deadline (or `cap` seconds).
+    On timeout the whole process group is killed, so the browser or a
+    nested planner process does not outlive it. `tracker`, if given, is
+    told started(process) / finished(process) so it can kill the group early.
+    """
+    check(cmd[0])
+    limit = timeout(cap)
+
+    pipe = subprocess.PIPE if capture_output else None
+    process = subprocess.Popen(
+        cmd,
+        cwd=cwd,
+        env=env,
+        stdin=subprocess.PIPE if input is not None else None,
+        stdout=pipe,
+        stderr=pipe,
+        text=True,
+        start_new_session=True
+    )
+    if tracker is not None:
+        tracker.started(process)
+    try:
+        stdout, stderr = process.communicate(input=input, timeout=limit)
+    except subprocess.TimeoutExpired:
+        kill_group(process)
+        raise DeadlineExceeded(f"{' '.join(cmd[:2])}: killed after {limit:.1f}s")
+    except BaseException:
+        kill_group(process)
+        raise
+    finally:
+        if tracker is not None:
+            tracker.finished(process)
+
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
+
+def kill_group(process, grace: float = 2.0):
+    """SIGTERM the process group, then SIGKILL whatever is left."""
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=grace)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+    except ProcessLookupError:
+        pass
@@ -0,0 +1,111 @@
+import fcntl
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+import deadline
+
+# ------------------------------
+# Hedged LLM requests: if the first request has not answered by the
+# observed p90 latency, send an identical second one; first answer wins.
+# planner.py is a one-shot process, so latencies persist in a file.
+# ------------------------------
+LATENCY_PATH = Path(__file__).parent / "output" / "llm_latency.json"
+LATENCY_LOCK_PATH = LATENCY_PATH.with_suffix(".lock")
+
+WINDOW = 200
+QUANTILE = 0.9
+MIN_SAMPLES = 10
+DEFAULT_HEDGE_DELAY = 8.0
+
+
+def load_latencies():
+    try:
+        return json.loads(LATENCY_PATH.read_text())[-WINDOW:]
+    except (OSError, ValueError):
+        return []
+
+
+def record_latency(seconds: float):
+    """
+    Add a sample. Candidate planners record at the same time, so the
+    read-modify-write is serialised with a file lock and the file is
+    replaced atomically (readers never see it half-written).
+    """
+    LATENCY_PATH.parent.mkdir(exist_ok=True)
+    with open(LATENCY_LOCK_PATH, "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        samples = load_latencies() + [seconds]
+        tmp_path = LATENCY_PATH.with_name(f"{LATENCY_PATH.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(samples[-WINDOW:]))
+        os.replace(tmp_path, LATENCY_PATH)
+
+
+def hedge_delay() -> float:
+    samples = sorted(load_latencies())
+    if len(samples) < MIN_SAMPLES:
+        return DEFAULT_HEDGE_DELAY
+    return samples[min(len(samples) - 1, int(QUANTILE * len(samples)))]
+
+
+# ------------------------------
+def hedged_call(fn):
+    """
+    Call fn(), and once more if it is slower than the p90.
+    Returns (result, winner) where winner is "primary", "hedge" or None
+    when no hedge was sent. Raises DeadlineExceeded when time runs out.
+
+    The calls run on daemon threads: planner.py exits with the first
+    answer instead of waiting for the losing request at interpreter exit.
+    """
+    deadline.check("LLM request")
+    answers = queue.Queue()
+    started = {}
+
+    def launch(name):
+        def call():
+            try:
+                answers.put((name, fn(), None))
+            except Exception as e:
+                answers.put((name, None, e))
+
+        started[name] = time.perf_counter()
+        threading.Thread(target=call, name=f"llm-{name}", daemon=True).start()
+
+    launch("primary")
+    running = 1
+    delay = deadline.timeout(cap=hedge_delay())
+    hedged = False
+    last_error = None
+
+    while running:
+        try:
+            name, result, error = answers.get(timeout=delay)
+        except queue.Empty:
+            pass
+        else:
+            running -= 1
+            if error is None:
+                record_latency(time.perf_counter() - started[name])
+                return result, name if hedged else None
+            last_error = error
+
+        if not hedged and deadline.remaining() != 0.0:
+            hedged = True
+            launch("hedge")
+            running += 1
+            delay = deadline.timeout()
+            continue
+
+        if deadline.remaining() == 0.0:
+            raise deadline.DeadlineExceeded("LLM request: problem deadline exceeded")
+
+        if not running and last_error is not None:
+            raise last_error
+
+        delay = deadline.timeout()
+
+    raise last_error or deadline.DeadlineExceeded("LLM request: no response")
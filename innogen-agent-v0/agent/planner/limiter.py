@@ -0,0 +1,206 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Optional
+
+import deadline
+
+# ------------------------------
+# Adaptive LLM concurrency (same policy as v3 llm/limiter.py).
+# AIMD limit on requests in flight: +1 per window of successes, halved on
+# 429 / 5xx at most once per round trip, paused for Retry-After.
+# Errors are classified; only rate_limit and transient ones are retried.
+# ------------------------------
+
+RATE_LIMIT = "rate_limit"
+TRANSIENT = "transient"
+SEMANTIC = "semantic"
+
+RETRYABLE = {RATE_LIMIT, TRANSIENT}
+
+# Exception class names (openai / httpx) that mean the request never completed
+TRANSIENT_ERROR_NAMES = {
+    "APITimeoutError",
+    "APIConnectionError",
+    "InternalServerError",
+    "TimeoutException",
+    "ConnectError",
+    "ReadTimeout",
+    "RemoteProtocolError",
+}
+
+
+def status_code(exc: BaseException) -> Optional[int]:
+    code = getattr(exc, "status_code", None)
+    if code is None:
+        code = getattr(getattr(exc, "response", None), "status_code", None)
+    return code
+
+
+def classify_error(exc: BaseException) -> str:
+    """Map an exception from an LLM call to rate_limit, transient or semantic."""
+    # Already classified by a planner.py subprocess
+    if getattr(exc, "error_class", None):
+        return exc.error_class
+    code = status_code(exc)
+    if code == 429:
+        return RATE_LIMIT
+    if code is not None and (code >= 500 or code == 408):
+        return TRANSIENT
+    if code is not None:
+        return SEMANTIC
+    if type(exc).__name__ in TRANSIENT_ERROR_NAMES or isinstance(exc, (TimeoutError, ConnectionError)):
+        return TRANSIENT
+    return SEMANTIC
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), if any."""
+    if getattr(exc, "retry_after", None) is not None:
+        return exc.retry_after
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """Full-jitter exponential backoff for the given (0-based) retry."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class AIMDLimiter:
+    """
+    Usage:
+        limiter = AIMDLimiter(initial=4, max_limit=32)
+        limiter.acquire()
+        try:
+            ...
+            limiter.release(latency=elapsed)
+        except Exception as e:
+            limiter.release(error_class=classify_error(e), retry_after=retry_after(e))
+    """
+
+    def __init__(
+        self,
+        initial: float = 4,
+        min_limit: float = 1,
+        max_limit: float = 32,
+        backoff_ratio: float = 0.5,
+        latency_target: Optional[float] = None
+    ):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.rtt: Optional[float] = None  # smoothed latency of successful calls
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Block until a slot is free and no Retry-After pause is active."""
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                wait = None
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+
+                remaining = deadline.remaining()
+                if remaining is not None:
+                    if remaining <= 0:
+                        raise deadline.DeadlineExceeded("LLM request: problem deadline exceeded waiting for a slot")
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._condition.wait(timeout=wait)
+
+    def release(
+        self,
+        latency: Optional[float] = None,
+        error_class: Optional[str] = None,
+        retry_after: Optional[float] = None
+    ):
+        with self._condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+
+            if error_class in RETRYABLE:
+                # One decrease per round trip: the responses of requests
+                # already in flight describe the same overload
+                window = self.rtt if self.rtt is not None else 1.0
+                if now - self._last_decrease >= window:
+                    self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+                    self._last_decrease = now
+                if retry_after:
+                    self.paused_until = max(self.paused_until, now + retry_after)
+            elif error_class is None:
+                if latency is not None:
+                    self.rtt = latency if self.rtt is None else 0.8 * self.rtt + 0.2 * latency
+                slow = self.latency_target is not None and latency is not None and latency > self.latency_target
+                if not slow:
+                    self.limit = min(self.max_limit, self.limit + 1.0 / max(self.limit, 1.0))
+
+            self._condition.notify_all()
+
+    def snapshot(self) -> dict:
+        with self._condition:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "paused_for": round(max(0.0, self.paused_until - time.monotonic()), 2),
+            }
+
+
+def call_with_retries(
+    fn: Callable[[], Any],
+    limiter: AIMDLimiter,
+    max_attempts: int = 4,
+    on_retry: Optional[Callable[[str, float], None]] = None
+) -> Any:
+    """
+    Run fn under the limiter. Rate-limit and transient errors are retried
+    with jittered exponential backoff (never shorter than Retry-After).
+    Semantic errors, and retries that would overrun the deadline, raise.
+
+    on_retry is called with (error_class, delay) before each retry.
+    """
+    for attempt in range(max_attempts):
+        limiter.acquire()
+        start = time.perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            latency = time.perf_counter() - start
+            error_class = classify_error(e)
+            wait_hint = retry_after(e)
+            limiter.release(latency=latency, error_class=error_class, retry_after=wait_hint)
+
+            if error_class not in RETRYABLE or attempt == max_attempts - 1:
+                raise
+
+            delay = max(backoff_delay(attempt), wait_hint or 0.0)
+            remaining = deadline.remaining()
+            if remaining is not None and delay >= remaining:
+                raise
+
+            if on_retry:
+                on_retry(error_class, delay)
+            time.sleep(delay)
+            continue
+
+        limiter.release(latency=time.perf_counter() - start)
+        return result
@@ -77,13 +77,58 @@ import sys
 import json
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
 
+from backends import BackendError, estimate_tokens, get_backend
 from block_knowledge import BlockKnowledgeBase
 from prompt import system_prompt, user_prompt
+from stream_validator import StreamValidator
+from schemas import block_tree_schema, rejected, response_format, unsupported
+from profiling import profiled
+from hedging import hedged_call
+from limiter import AIMDLimiter, call_with_retries, classify_error, retry_after
+import deadline
 
 load_dotenv()
 
+# One process = one primary request plus at most one hedge
+LIMITER = AIMDLimiter(initial=2, max_limit=2)
+
+# Stream the completion and validate it as it arrives (PLANNER_STREAM=0: wait for all of it)
+STREAM = os.getenv("PLANNER_STREAM", "1") != "0"
+
+
+class Completion:
+    """Planner output, cut short with `errors` when streaming found a mistake"""
+
+    def __init__(self, text, errors=(), prompt_tokens=0, completion_tokens=0):
+        self.text = text
+        self.errors = list(errors)
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+
+def stream_tree(backend, messages, **options):
+    """
+    Stream the completion through a StreamValidator. At the first error
+    the stream is closed, which cancels the request, so a wrong attempt
+    only costs the tokens up to its first mistake. Token counts are
+    estimated; streamed responses carry no usage.
+    """
+    validator = StreamValidator()
+    text = []
+    chunks = backend.stream(messages, **options)
+    try:
+        for delta in chunks:
+            text.append(delta)
+            if validator.feed(delta):
+                break
+    finally:
+        chunks.close()
+
+    output = "".join(text).strip()
+    prompt = "".join(m["content"] for m in messages)
+    return Completion(output, validator.errors, estimate_tokens(prompt), estimate_tokens(output))
+
 
 # ------------------------------
 def main():
@@ -93,9 +138,17 @@ def main():
 
     problem_text = sys.argv[1]
 
-    api_key = os.getenv("OPENROUTER_API_KEY")
-    if not api_key:
-        print(json.dumps({"error": "OPENROUTER_API_KEY not set"}))
+    # Optional sampling temperature (used for multi-candidate sampling)
+    temperature = float(sys.argv[2]) if len(sys.argv) > 2 else 0
+
+    # Errors of the previous attempt, sent by retry_loop.py on stdin
+    repair = "" if sys.stdin.isatty() else sys.stdin.read().strip()
+
+    # LLM_BACKEND: openrouter (default), local or fake; see backends.py
+    try:
+        backend = get_backend()
+    except BackendError as e:
+        print(json.dumps({"error": str(e)}))
         sys.exit(1)
 
     # ------------------------------
@@ -105,6 +158,9 @@ def main():
     relevant_blocks = kb.retrieve_relevant_blocks(problem_text)
     formatted_blocks = kb.format_for_llm(relevant_blocks)
 
+    # Constrain decoding to trees over exactly these blocks
+    tree_format = response_format(block_tree_schema(relevant_blocks))
+
     # ------------------------------
     # 2️⃣ Build prompts
     # ------------------------------
@@ -113,40 +169,95 @@ def main():
         problem_text,
         json.dumps(formatted_blocks, indent=2)
     )
+    if repair:
+        usr_prompt += "\n" + repair
 
     # ------------------------------
-    # 3️⃣ Call OpenRouter (WITH TIMEOUT)
+    # 3️⃣ Call the LLM backend (WITH TIMEOUT, hedged past p90)
     # ------------------------------
-    client = OpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=api_key
-    )
+    messages = [
+        {"role": "system", "content": sys_prompt},
+        {"role": "user", "content": usr_prompt}
+    ]
+
+    def create(**options):
+        options = dict(
+            temperature=temperature,
+            timeout=deadline.timeout(cap=60),  # 🔥 CRITICAL FIX (bounded by the problem deadline)
+            **options
+        )
+        if STREAM:
+            return stream_tree(backend, messages, **options)
+
+        response = backend.chat(messages, **options)
+        usage = getattr(response, "usage", None)
+        return Completion(
+            response.choices[0].message.content.strip(),
+            prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            completion_tokens=getattr(usage, "completion_tokens", 0) or 0
+        )
+
+    def request():
+        if tree_format is None:
+            return create()
+        try:
+            return create(response_format=tree_format)
+        except Exception as e:
+            # Any 400/422 is tried once as a plain completion; only an error
+            # naming response_format turns it off for later planner runs
+            if not rejected(e):
+                raise
+            if unsupported(e):
+                print("RESPONSE_FORMAT rejected", file=sys.stderr)
+            return create()
+
+    def on_retry(error_class, delay):
+        print(f"RETRY {error_class} {delay:.2f}", file=sys.stderr)
 
     try:
-        response = client.chat.completions.create(
-            model="meta-llama/llama-3-8b-instruct",
-            messages=[
-                {"role": "system", "content": sys_prompt},
-                {"role": "user", "content": usr_prompt}
-            ],
-            temperature=0,
-            timeout=60  # 🔥 CRITICAL FIX
+        completion, hedge_winner = hedged_call(
+            lambda: call_with_retries(request, LIMITER, on_retry=on_retry)
         )
+    except deadline.DeadlineExceeded as e:
+        print(json.dumps({
+            "error": "deadline_exceeded",
+            "detail": str(e)
+        }))
+        sys.exit(1)
     except Exception as e:
+        # retry_loop.py decides from error_class whether to back off and retry
         print(json.dumps({
             "error": "llm_request_failed",
+            "error_class": classify_error(e),
+            "retry_after": retry_after(e),
             "detail": str(e)
         }))
         sys.exit(1)
 
-    output = response.choices[0].message.content.strip()
+    # Token usage goes to stderr so stdout stays pure JSON (read by retry_loop)
+    print("USAGE " + json.dumps({
+        "prompt_tokens": completion.prompt_tokens,
+        "completion_tokens": completion.completion_tokens
+    }), file=sys.stderr)
+    if hedge_winner:
+        print(f"HEDGE {hedge_winner}", file=sys.stderr)
+    print("BACKEND " + json.dumps(backend.report()), file=sys.stderr)
 
     # ------------------------------
     # 4️⃣ Output RAW JSON ONLY
     # ------------------------------
-    print(output)
+    if completion.errors:
+        # Stopped at the first mistake; retry_loop.py repairs from here
+        print(json.dumps({
+            "error": "invalid_partial",
+            "errors": completion.errors,
+            "partial": completion.text
+        }))
+        return
+    print(completion.text)
 
 
 # ------------------------------
 if __name__ == "__main__":
-    main()
+    with profiled("llm"):
+        main()
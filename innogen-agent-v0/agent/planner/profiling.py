@@ -0,0 +1,105 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+# ------------------------------
+# Set by main.py --profile; every planner script run with it set profiles itself
+# ------------------------------
+PROFILE_DIR_ENV = "INNOGEN_PROFILE_DIR"
+TOP_N = 15
+
+
+# ------------------------------
+@contextmanager
+def profiled(stage: str):
+    """
+    Run the block under cProfile + tracemalloc when INNOGEN_PROFILE_DIR is set.
+    Writes <dir>/<stage>.<os pid>.prof and the top allocation growth by line
+    (a planner run can happen several times per problem, hence the os pid).
+    """
+    out_dir = os.getenv(PROFILE_DIR_ENV)
+    if not out_dir:
+        yield
+        return
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    name = f"{stage}.{os.getpid()}"
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        profile.dump_stats(str(out_dir / f"{name}.prof"))
+
+        ignored = (tracemalloc.__file__, cProfile.__file__, __file__)
+        diffs = [
+            d for d in after.compare_to(before, "lineno")
+            if d.traceback[0].filename not in ignored
+        ][:TOP_N]
+
+        (out_dir / f"{name}_alloc.txt").write_text("\n".join(str(d) for d in diffs) + "\n")
+        (out_dir / f"{name}_alloc.json").write_text(json.dumps([
+            {
+                "location": f"{d.traceback[0].filename}:{d.traceback[0].lineno}",
+                "size_diff": d.size_diff,
+                "count_diff": d.count_diff
+            }
+            for d in diffs
+        ], indent=2))
+
+
+# ------------------------------
+def write_summary(out_dir: Path, wall: dict = None, top_n: int = TOP_N) -> Path:
+    """
+    Merge <out_dir>/<problem>/<stage>.<os pid>.prof and _alloc.json files
+    into <out_dir>/summary.txt and one merged <stage>.prof per stage.
+    """
+    out_dir = Path(out_dir)
+    profiles = defaultdict(list)
+    allocations = defaultdict(lambda: defaultdict(int))
+
+    for prof in sorted(out_dir.glob("*/*.prof")):
+        profiles[prof.name.split(".")[0]].append(str(prof))
+    for alloc in sorted(out_dir.glob("*/*_alloc.json")):
+        stage = alloc.name.split(".")[0]
+        for entry in json.loads(alloc.read_text()):
+            allocations[stage][entry["location"]] += entry["size_diff"]
+
+    report = io.StringIO()
+
+    # Node stages (assembler, browser) only have wall time
+    for stage, times in sorted((wall or {}).items()):
+        report.write(f"wall {stage}: total {sum(times):.3f}s, mean {sum(times) / len(times):.3f}s, max {max(times):.3f}s\n")
+    report.write("\n")
+
+    for stage in sorted(profiles):
+        runs = profiles[stage]
+        report.write(f"=== {stage} ({len(runs)} runs) ===\n")
+
+        stats = pstats.Stats(*runs, stream=report)
+        stats.dump_stats(str(out_dir / f"{stage}.prof"))
+        stats.sort_stats("cumulative").print_stats(top_n)
+
+        report.write(f"Top {top_n} allocation growth (summed over runs):\n")
+        ranked = sorted(allocations[stage].items(), key=lambda kv: abs(kv[1]), reverse=True)[:top_n]
+        for location, size in ranked:
+            report.write(f"  {size / 1024:10.1f} KiB  {location}\n")
+        report.write("\n")
+
+    summary = out_dir / "summary.txt"
+    summary.write_text(report.getvalue())
+    return summary
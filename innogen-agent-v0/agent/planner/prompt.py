@@ -139,3 +139,47 @@ RULES:
 
 Return ONLY the block tree JSON.
 """
+
+
+def repair_prompt(errors, previous_output: str = ""):
+    """Appended to the user prompt after a rejected attempt"""
+    listed = "\n".join(f"- {e}" for e in errors)
+    previous = f"\nPREVIOUS OUTPUT:\n{previous_output}\n" if previous_output else ""
+    return f"""
+The previous block tree was INVALID.
+{previous}
+Validator errors:
+{listed}
+
+Fix the block tree.
+Return ONLY the corrected block tree JSON.
+Do not explain anything.
+"""
+
+
+def batch_user_prompt(problems, available_blocks_json: str):
+    """Several problems in one request; the answer holds one tree per problem id"""
+    listed = "\n\n".join(f"[id: {pid}]\n{text.strip()}" for pid, text in problems.items())
+    return f"""
+You must now produce one block tree JSON for EACH problem below.
+
+PROBLEMS:
+{listed}
+
+You are NOT writing code.
+You are instantiating a STRICT grammar.
+
+AVAILABLE BLOCKS (schemas you MUST follow exactly, shared by all problems):
+{available_blocks_json}
+
+PROCESS (MANDATORY), for each problem on its own:
+1. Determine if the problem is expressible using ONLY the available blocks.
+2. If YES, construct ONE valid block tree that matches the schema exactly.
+3. If NO, use {{"error": "not_expressible"}} as its tree.
+
+OUTPUT (instead of a single block tree):
+{{"trees": [{{"id": "<problem id>", "tree": <block tree>}}, ...]}}
+with exactly one entry per problem, using the ids given above.
+
+Return ONLY this JSON object.
+"""
@@ -0,0 +1,238 @@
+import argparse
+import json
+import math
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+# ------------------------------
+# Retrieval benchmark for BlockKnowledgeBase.
+# "hybrid" is the fixed top-k merge, "adaptive" the score-thresholded
+# merge plus dependency closure that planner.py uses (--threshold).
+# Labels are (problem text -> block types its solution needs), mined from
+# existing outputs: v3 outputs/Problem_<pid>/block_tree.json or the block
+# types of v0 submissions/<pid>/*.xml, joined with problems.json.
+# For every backend and k it reports recall@k, how often every needed
+# block was retrieved, the prompt tokens of the retrieved blocks (as
+# planner.py sends them) and query latency.
+#
+#   python retrieval_bench.py --outputs ../../submissions --k 2,4,8,16,32
+#   python retrieval_bench.py --labels labels.jsonl --backends keyword
+#   python retrieval_bench.py --qdrant-path ./qdrant_local   # local index, see ingest_blocks --location
+# ------------------------------
+
+BASE_DIR = Path(__file__).parent
+PROJECT_ROOT = BASE_DIR.parent.parent
+OUTPUT_DIR = BASE_DIR / "output"
+
+BACKENDS = ["keyword", "semantic", "hybrid", "adaptive"]
+
+XML_BLOCK_RE = re.compile(r'<block\s+type="([^"]+)"')
+
+
+# ------------------------------
+# Labels
+# ------------------------------
+def load_problems(path: Path) -> Dict[str, str]:
+    """problem_id -> description (v0 list or v3 {"problems": [...]} layout)"""
+    data = json.loads(path.read_text(encoding="utf-8"))
+    problems = data.get("problems", []) if isinstance(data, dict) else data
+    return {p["problem_id"]: p["description"] for p in problems}
+
+
+def tree_types(node, found: Set[str]):
+    if isinstance(node, dict):
+        if isinstance(node.get("type"), str):
+            found.add(node["type"])
+        for key in ("value_inputs", "statement_inputs"):
+            for child in (node.get(key) or {}).values():
+                tree_types(child, found)
+        tree_types(node.get("next"), found)
+
+
+def solution_types(problem_dir: Path) -> Set[str]:
+    """Block types of a problem's solution (block tree, else its XML)"""
+    found: Set[str] = set()
+    tree_path = problem_dir / "block_tree.json"
+    if tree_path.exists():
+        try:
+            tree_types(json.loads(tree_path.read_text(encoding="utf-8")), found)
+        except json.JSONDecodeError:
+            pass
+    if not found:
+        for xml_path in problem_dir.glob("*.xml"):
+            if not xml_path.stem.endswith("_bug"):
+                found.update(XML_BLOCK_RE.findall(xml_path.read_text(encoding="utf-8")))
+    return found
+
+
+def mine_labels(outputs_dirs: List[Path], problems: Dict[str, str]) -> List[Dict]:
+    labels = []
+    for outputs_dir in outputs_dirs:
+        for problem_dir in sorted(p for p in outputs_dir.iterdir() if p.is_dir()):
+            pid = problem_dir.name.removeprefix("Problem_")
+            if pid not in problems:
+                continue
+            types = solution_types(problem_dir)
+            if types:  # failed problems leave an empty <xml></xml>
+                labels.append({"pid": pid, "problem": problems[pid], "types": sorted(types)})
+    return labels
+
+
+def load_labels(path: Path) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# ------------------------------
+# Measurement
+# ------------------------------
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)"""
+    return max(1, math.ceil(len(text) / 4))
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q
+    low = int(pos)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+
+def retrieve(kb, backend: str, problem: str, k: int, keyword_k: int, threshold: float) -> List[Dict]:
+    if backend == "keyword":
+        return kb._keyword_search(problem, k)
+    if backend == "semantic":
+        return kb._semantic_search(problem, k)
+    if backend == "hybrid":
+        return kb.retrieve_relevant_blocks(
+            problem, top_k_semantic=k, top_k_keyword=keyword_k, score_threshold=None, with_closure=False
+        )
+    return kb.retrieve_relevant_blocks(problem, top_k_semantic=k, top_k_keyword=keyword_k, score_threshold=threshold)
+
+
+def evaluate(kb, backend: str, labels: List[Dict], k: int, keyword_k: int, threshold: float) -> Dict:
+    recalls, tokens, latencies, retrieved = [], [], [], []
+    complete = 0
+    missed: Dict[str, int] = {}
+
+    for label in labels:
+        start = time.perf_counter()
+        blocks = retrieve(kb, backend, label["problem"], k, keyword_k, threshold)
+        latencies.append(time.perf_counter() - start)
+
+        got = {b.get("type") for b in blocks}
+        needed = set(label["types"])
+        hits = needed & got
+        recalls.append(len(hits) / len(needed))
+        complete += hits == needed
+        for block_type in needed - got:
+            missed[block_type] = missed.get(block_type, 0) + 1
+
+        # Same serialization planner.py puts in the prompt
+        tokens.append(estimate_tokens(json.dumps(kb.format_for_llm(blocks), indent=2)))
+        retrieved.append(len(blocks))
+
+    n = len(labels)
+    return {
+        "backend": backend,
+        "k": k,
+        "keyword_k": keyword_k if backend in {"hybrid", "adaptive"} else None,
+        "threshold": threshold if backend == "adaptive" else None,
+        "recall": round(sum(recalls) / n, 4),
+        "complete_rate": round(complete / n, 4),
+        "blocks": round(sum(retrieved) / n, 1),
+        "prompt_tokens": round(sum(tokens) / n, 1),
+        "prompt_tokens_p95": round(percentile(tokens, 0.95), 1),
+        "latency_ms_p50": round(1000 * percentile(latencies, 0.50), 3),
+        "latency_ms_p95": round(1000 * percentile(latencies, 0.95), 3),
+        "most_missed": sorted(missed.items(), key=lambda item: -item[1])[:5],
+    }
+
+
+def make_knowledge_base(qdrant_path: Optional[str], backends: List[str]):
+    from block_knowledge import BlockKnowledgeBase
+
+    if not qdrant_path or backends == ["keyword"]:
+        return BlockKnowledgeBase()
+    from qdrant_client import QdrantClient
+    return BlockKnowledgeBase(qdrant=QdrantClient(path=qdrant_path))
+
+
+# ------------------------------
+def main(argv=None):
+    from block_knowledge import SCORE_THRESHOLD, TOP_K_KEYWORD, TOP_K_SEMANTIC
+
+    parser = argparse.ArgumentParser(description="Recall / prompt size / latency of block retrieval")
+    parser.add_argument("--outputs", action="append",
+                        help="Directory of per-problem outputs to mine labels from (repeatable)")
+    parser.add_argument("--problems", default=str(PROJECT_ROOT / "problems.json"), help="problems.json for descriptions")
+    parser.add_argument("--labels", help="JSONL of {problem, types} labels instead of mining")
+    parser.add_argument("--save-labels", help="Write the mined labels here (JSONL)")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help=f"Comma list of {BACKENDS}")
+    parser.add_argument("--k", default="2,4,8,16,32", help="Comma list of k (semantic k for hybrid and adaptive)")
+    parser.add_argument("--keyword-k", type=int, default=TOP_K_KEYWORD, help="Keyword k used by hybrid and adaptive")
+    parser.add_argument("--threshold", type=float, default=SCORE_THRESHOLD, help="Semantic score threshold of adaptive")
+    parser.add_argument("--qdrant-path", help="Local Qdrant directory instead of the remote cluster")
+    parser.add_argument("--report", default=str(OUTPUT_DIR / "retrieval_bench.json"))
+    args = parser.parse_args(argv)
+
+    if args.labels:
+        labels = load_labels(Path(args.labels))
+    else:
+        outputs = [Path(p) for p in args.outputs or [PROJECT_ROOT / "submissions"]]
+        labels = mine_labels(outputs, load_problems(Path(args.problems)))
+        if args.save_labels:
+            Path(args.save_labels).write_text("".join(json.dumps(l) + "\n" for l in labels), encoding="utf-8")
+
+    if not labels:
+        raise SystemExit("No labeled problems found (need outputs with block trees or XML)")
+
+    backends = [b for b in args.backends.split(",") if b]
+    unknown = set(backends) - set(BACKENDS)
+    if unknown:
+        raise SystemExit(f"Unknown backends: {', '.join(sorted(unknown))}")
+    ks = [int(k) for k in args.k.split(",") if k]
+
+    kb = make_knowledge_base(args.qdrant_path, backends)
+    print(f"📚 {len(labels)} labeled problems, {len(kb.blocks)} catalog blocks")
+
+    results = []
+    for backend in backends:
+        for k in ks:
+            result = evaluate(kb, backend, labels, k, args.keyword_k, args.threshold)
+            results.append(result)
+            print(
+                f"{backend:>9} k={k:<3} recall {result['recall']:.3f}  complete {result['complete_rate']:.3f}  "
+                f"{result['prompt_tokens']:>8.0f} tokens  p50 {result['latency_ms_p50']:.2f}ms  "
+                f"p95 {result['latency_ms_p95']:.2f}ms"
+            )
+
+    # Smallest prompt that still retrieves every needed block for every problem
+    complete = [r for r in results if r["complete_rate"] == 1.0]
+    best = min(complete, key=lambda r: r["prompt_tokens"]) if complete else None
+
+    report = {
+        "labels": len(labels),
+        "current": {
+            "top_k_semantic": TOP_K_SEMANTIC,
+            "top_k_keyword": TOP_K_KEYWORD,
+            "score_threshold": SCORE_THRESHOLD,
+        },
+        "results": results,
+        "smallest_complete": best,
+    }
+    Path(args.report).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.report).write_text(json.dumps(report, indent=2))
+
+    if best:
+        print(f"\n✅ Smallest complete setting: {best['backend']} k={best['k']} ({best['prompt_tokens']:.0f} tokens)")
+    else:
+        print("\n⚠️ No setting retrieved every needed block for every problem")
+    print(f"📈 Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -95,13 +95,30 @@
 # -----------------------------------------------------------------------------------------------------------------------------------
 
 import json
-import subprocess
+import os
+import queue
 import sys
+import threading
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
+
+from profiling import profiled
+from prompt import repair_prompt
+from limiter import AIMDLimiter, call_with_retries
+from blocks import Block
+from tree_validator import validate_tree
+import budget
+import deadline
 
 MAX_RETRIES = 3
 
+# Each planner.py process already retries its own request; this bounds
+# how often a rate-limited or failing process is relaunched
+MAX_PLANNER_LAUNCHES = 2
+
+# Temperatures for concurrent candidates (first stays deterministic)
+CANDIDATE_TEMPERATURES = [0, 0.3, 0.6, 0.8, 1.0]
+
 # ------------------------------
 # Path Resolution (IMPORTANT)
 # ------------------------------
@@ -109,16 +126,144 @@ BASE_DIR = Path(__file__).parent
 PROJECT_ROOT = BASE_DIR.parent.parent
 
 PLANNER_SCRIPT = BASE_DIR / "planner.py"
-VALIDATOR_CLI = PROJECT_ROOT / "agent" / "validate_tree_cli.js"
 OUTPUT_DIR = BASE_DIR / "output"
 BLOCK_TREE_PATH = OUTPUT_DIR / "block_tree.json"
+STATS_PATH = OUTPUT_DIR / "planner_stats.json"
+
+# Per-run counters read by main.py for its metrics (candidates run in threads)
+STATS = {
+    "attempts": 0,
+    "llm_errors": 0,
+    "llm_retries": {},
+    "prompt_tokens": 0,
+    "completion_tokens": 0,
+    "hedges": {},
+    "downgrades": 0,
+    "response_format_rejected": 0,
+    "aborted_streams": 0,
+    "aborted_completion_tokens": 0,
+    "backend": {},
+    "calls": [],
+    "validation_errors": []
+}
+STATS_LOCK = threading.Lock()
+
+# Planner processes in flight: halved when they come back rate limited
+LIMITER = AIMDLimiter(initial=3, max_limit=len(CANDIDATE_TEMPERATURES))
+
+
+class PlannerCallError(RuntimeError):
+    """planner.py failed; error_class says whether relaunching can help."""
+
+    def __init__(self, message, error_class="semantic", retry_after=None):
+        super().__init__(message)
+        self.error_class = error_class
+        self.retry_after = retry_after
+
+
+class CandidateCancelled(RuntimeError):
+    """Another candidate already won; this one's planner was not (or no longer) run."""
+
+
+class CandidateRun:
+    """
+    Planner processes of one multi-candidate round. cancel() kills the
+    ones still running with their process groups and keeps new ones from
+    starting, so the winner does not wait for the slowest planner.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self.processes = set()
+        self._lock = threading.Lock()
+
+    def started(self, process):
+        with self._lock:
+            self.processes.add(process)
+            cancelled = self.cancelled
+        if cancelled:
+            deadline.kill_group(process, grace=0.5)
+
+    def finished(self, process):
+        with self._lock:
+            self.processes.discard(process)
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            processes = list(self.processes)
+        for process in processes:
+            deadline.kill_group(process, grace=0.5)
 
 
 # ------------------------------
-def export_tree(tree: Dict):
+def export_tree(tree: Block):
     OUTPUT_DIR.mkdir(exist_ok=True)
     with open(BLOCK_TREE_PATH, "w", encoding="utf-8") as f:
-        json.dump(tree, f, indent=2)
+        json.dump(tree.to_dict(), f, indent=2)
+
+def export_stats():
+    OUTPUT_DIR.mkdir(exist_ok=True)
+    with open(STATS_PATH, "w", encoding="utf-8") as f:
+        json.dump(STATS, f, indent=2)
+
+def record_usage(stderr: str) -> Dict:
+    """Add the planner's USAGE / HEDGE / RETRY / RESPONSE_FORMAT / BACKEND lines to STATS; returns its usage"""
+    usage = {"prompt_tokens": 0, "completion_tokens": 0}
+    for line in stderr.splitlines():
+        if line.startswith("USAGE "):
+            reported = json.loads(line[len("USAGE "):])
+            usage["prompt_tokens"] += reported.get("prompt_tokens", 0)
+            usage["completion_tokens"] += reported.get("completion_tokens", 0)
+            with STATS_LOCK:
+                STATS["prompt_tokens"] += reported.get("prompt_tokens", 0)
+                STATS["completion_tokens"] += reported.get("completion_tokens", 0)
+        elif line.startswith("HEDGE "):
+            winner = line[len("HEDGE "):].strip()
+            with STATS_LOCK:
+                STATS["hedges"][winner] = STATS["hedges"].get(winner, 0) + 1
+        elif line.startswith("RETRY "):
+            record_retry(line.split()[1])
+        elif line.startswith("RESPONSE_FORMAT rejected"):
+            with STATS_LOCK:
+                STATS["response_format_rejected"] += 1
+            # Later planner processes inherit this and skip structured output
+            os.environ["PLANNER_RESPONSE_FORMAT"] = "off"
+        elif line.startswith("BACKEND "):
+            record_backend(json.loads(line[len("BACKEND "):]))
+    return usage
+
+def record_backend(report: Dict):
+    """Accumulate latency and token throughput of the planner's LLM backend"""
+    with STATS_LOCK:
+        backend = STATS["backend"]
+        backend["backend"] = report.get("backend")
+        backend["model"] = report.get("model")
+        for key in ("requests", "errors", "seconds", "completion_tokens"):
+            backend[key] = round(backend.get(key, 0) + report.get(key, 0), 3)
+        backend["completion_tokens_per_s"] = (
+            round(backend["completion_tokens"] / backend["seconds"], 1) if backend["seconds"] else 0.0
+        )
+
+def check_budget(what: str):
+    with STATS_LOCK:
+        used = STATS["prompt_tokens"] + STATS["completion_tokens"]
+        requests = STATS["attempts"]
+    budget.check(used, requests, what)
+
+def can_afford(more: int) -> bool:
+    with STATS_LOCK:
+        used = STATS["prompt_tokens"] + STATS["completion_tokens"]
+        requests = STATS["attempts"]
+    return budget.can_afford(used, requests, more)
+
+def record_retry(error_class: str):
+    with STATS_LOCK:
+        STATS["llm_retries"][error_class] = STATS["llm_retries"].get(error_class, 0) + 1
+
+def record_validation_errors(errors: List[str]):
+    with STATS_LOCK:
+        STATS["validation_errors"].extend(errors)
 
 def extract_json(text: str) -> dict:
     start = text.find("{")
@@ -132,19 +277,49 @@ def extract_json(text: str) -> dict:
 last_tree = None
 
 # ------------------------------
-def call_planner(problem_text: str) -> Dict:
-    try:
-        result = subprocess.run(
-            ["python", str(PLANNER_SCRIPT), problem_text],
-            capture_output=True,
-            text=True,
-            # timeout=50
-        )
-    except subprocess.TimeoutExpired:
-        raise RuntimeError("Planner timed out (LLM took too long)")
-    
+def call_planner(problem_text: str, temperature: float = 0, repair: str = "", run: Optional[CandidateRun] = None) -> Dict:
+    if run is not None and run.cancelled:
+        raise CandidateCancelled("another candidate won")
+    check_budget("Planner call")
+
+    # Bounded by the problem deadline; a stuck planner is killed with its group.
+    # The repair instruction (possibly empty) goes to the planner's stdin.
+    result = deadline.run_with_deadline(
+        ["python", str(PLANNER_SCRIPT), problem_text, str(temperature)],
+        input=repair,
+        capture_output=True,
+        cap=120,
+        tracker=run
+    )
+    if run is not None and run.cancelled:
+        raise CandidateCancelled("another candidate won")
+
+    usage = record_usage(result.stderr)
+
+    # Per-attempt ledger entry (main.py adds the problem id)
+    with STATS_LOCK:
+        STATS["attempts"] += 1
+        if result.returncode != 0:
+            STATS["llm_errors"] += 1
+        STATS["calls"].append({
+            "attempt": STATS["attempts"],
+            "temperature": temperature,
+            "ok": result.returncode == 0,
+            **usage
+        })
+
     if result.returncode != 0:
-        raise RuntimeError(result.stderr)
+        try:
+            failure = extract_json(result.stdout)
+        except ValueError:
+            raise PlannerCallError(result.stderr)
+        if failure.get("error") == "deadline_exceeded":
+            raise deadline.DeadlineExceeded(failure.get("detail", "planner"))
+        raise PlannerCallError(
+            failure.get("detail") or result.stderr,
+            error_class=failure.get("error_class", "semantic"),
+            retry_after=failure.get("retry_after")
+        )
 
     try:
         return extract_json(result.stdout)
@@ -154,57 +329,187 @@ def call_planner(problem_text: str) -> Dict:
         )
 
 
-# ------------------------------
-def validate_with_node(tree: Dict) -> List[str]:
-    result = subprocess.run(
-        ["node", str(VALIDATOR_CLI)],
-        input=json.dumps(tree),
-        capture_output=True,
-        text=True
+def call_planner_with_backoff(problem_text: str, temperature: float = 0, repair: str = "",
+                              run: Optional[CandidateRun] = None) -> Dict:
+    """
+    call_planner() gated by LIMITER. A planner that gave up on 429 / 5xx is
+    relaunched after a jittered backoff (or its Retry-After); semantic
+    failures raise at once.
+    """
+    def on_retry(error_class, delay):
+        record_retry(error_class)
+        print(f"⏳ Planner {error_class}, retrying in {delay:.1f}s")
+
+    return call_with_retries(
+        lambda: call_planner(problem_text, temperature, repair, run),
+        LIMITER,
+        max_attempts=MAX_PLANNER_LAUNCHES,
+        on_retry=on_retry
     )
 
-    if not result.stdout.strip():
-        raise RuntimeError(
-            "Node validator returned empty output.\n"
-            f"STDERR:\n{result.stderr}"
-        )
 
+# ------------------------------
+def partial_errors(output: Dict) -> Optional[List[str]]:
+    """
+    Errors of a streamed completion the planner stopped at its first
+    mistake, or None for a complete tree.
+    """
+    if not (isinstance(output, dict) and output.get("error") == "invalid_partial"):
+        return None
+    partial = output.get("partial") or ""
+    with STATS_LOCK:
+        STATS["aborted_streams"] += 1
+        STATS["aborted_completion_tokens"] += max(1, len(partial) // 4)
+    return list(output.get("errors") or ["Malformed block tree: stopped early"])
+
+
+def validate(tree: Dict) -> Tuple[Optional[Block], List[str]]:
+    """Parse planner output into Blocks and validate it in-process."""
     try:
-        data = extract_json(result.stdout)
-    except json.JSONDecodeError:
-        raise RuntimeError(
-            "Node validator returned invalid JSON.\n"
-            f"STDOUT:\n{result.stdout}\n"
-            f"STDERR:\n{result.stderr}"
-        )
+        block = Block.from_dict(tree)
+    except ValueError as e:
+        return None, [f"Malformed block tree: {e}"]
+    return block, validate_tree(block)
+
+
+# ------------------------------
+def evaluate_candidate(problem_text: str, temperature: float, run: Optional[CandidateRun] = None) -> Dict:
+    """
+    Plan and validate one candidate.
+    Returns {"tree": ..., "errors": [...]}; errors is empty when valid.
+    """
+    try:
+        tree = call_planner_with_backoff(problem_text, temperature, run=run)
+    except (deadline.DeadlineExceeded, budget.BudgetExceeded):
+        # Both are RuntimeErrors, but they end the whole run, not a candidate
+        raise
+    except (RuntimeError, ValueError) as e:
+        return {"tree": None, "errors": [f"Planner failed: {e}"]}
+
+    if isinstance(tree, dict) and tree.get("error") == "not_expressible":
+        return {"tree": tree, "errors": ["not_expressible"]}
+
+    errors = partial_errors(tree)
+    if errors is not None:
+        record_validation_errors(errors)
+        return {"tree": None, "errors": errors, "output": tree.get("partial", "")}
+
+    block, errors = validate(tree)
+    record_validation_errors(errors)
+    return {"tree": block, "errors": errors, "output": json.dumps(tree)}
+
+
+def candidate_rank(candidate: Dict):
+    """Sort key: not_expressible after every expressible candidate, then fewest errors"""
+    return (candidate["errors"] == ["not_expressible"], len(candidate["errors"]))
+
+
+def generate_from_candidates(problem_text: str, num_candidates: int) -> Dict:
+    """
+    Sample num_candidates planner runs concurrently and validate each as
+    soon as it finishes. The first valid tree wins; otherwise the candidate
+    with the fewest validation errors is reported.
+
+    The candidates run on daemon threads and the losers' planner processes
+    are killed once a winner is found, so neither this call nor the exit
+    of retry_loop.py waits for the slowest planner.
+    """
+    best = None
+    run = CandidateRun()
+    results = queue.Queue()
+
+    def sample(temperature):
+        try:
+            results.put(evaluate_candidate(problem_text, temperature, run))
+        except BaseException as e:
+            results.put(e)
+
+    for i in range(num_candidates):
+        threading.Thread(
+            target=sample,
+            args=(CANDIDATE_TEMPERATURES[i % len(CANDIDATE_TEMPERATURES)],),
+            name=f"candidate-{i}",
+            daemon=True
+        ).start()
+
+    try:
+        for _ in range(num_candidates):
+            candidate = results.get()
+            if isinstance(candidate, BaseException):
+                raise candidate
+            if not candidate["errors"]:
+                return candidate
 
-    return data["errors"]
+            if best is None or candidate_rank(candidate) < candidate_rank(best):
+                best = candidate
+    finally:
+        run.cancel()
+
+    return best
 
 
 # ------------------------------
-def generate_valid_block_tree(problem_text: str) -> Dict:
+def generate_valid_block_tree(problem_text: str, num_candidates: int = 1) -> Block:
     last_errors: List[str] = []
+    last_output = ""
+
+    if num_candidates > 1 and not can_afford(num_candidates):
+        # Cheaper strategy: one planner call at a time
+        print(f"\n💸 Token budget too small for {num_candidates} candidates, planning serially")
+        with STATS_LOCK:
+            STATS["downgrades"] += 1
+        num_candidates = 1
+
+    if num_candidates > 1:
+        print(f"\n🎲 Sampling {num_candidates} candidates in parallel")
+        candidate = generate_from_candidates(problem_text, num_candidates)
+
+        if not candidate["errors"]:
+            print("✅ Valid block tree generated")
+            export_tree(candidate["tree"])
+            return candidate["tree"]
+
+        if candidate["errors"] == ["not_expressible"]:
+            raise RuntimeError("Problem is not expressible with current block grammar")
+
+        print("❌ No candidate passed validation, falling back to retries")
+        for e in candidate["errors"]:
+            print("  -", e)
+
+        last_errors = candidate["errors"]
+        last_output = candidate.get("output", "")
 
     for attempt in range(1, MAX_RETRIES + 1):
+        deadline.check("Planner retry")
         print(f"\n🔁 Planner attempt {attempt}")
 
-        tree = call_planner(problem_text)
+        # The previous attempt's mistakes go back to the planner to fix
+        repair = repair_prompt(last_errors, last_output) if last_errors else ""
+        tree = call_planner_with_backoff(problem_text, repair=repair)
         last_tree = tree
         if isinstance(tree, dict) and tree.get("error") == "not_expressible":
             raise RuntimeError("Problem is not expressible with current block grammar")
 
-        errors = validate_with_node(tree)
+        errors = partial_errors(tree)
+        if errors is not None:
+            # Stopped mid-stream at the first mistake
+            block, output = None, tree.get("partial", "")
+        else:
+            block, errors = validate(tree)
+            output = json.dumps(tree)
+        record_validation_errors(errors)
 
         if not errors:
             print("✅ Valid block tree generated")
-            export_tree(tree)
-            return tree
+            export_tree(block)
+            return block
 
         print("❌ Validation errors:")
         for e in errors:
             print("  -", e)
 
         last_errors = errors
+        last_output = output
 
     raise RuntimeError(
         "Failed to generate valid block tree.\n"
@@ -221,4 +526,15 @@ if __name__ == "__main__":
         sys.exit(1)
 
     problem_text = sys.argv[1]
-    generate_valid_block_tree(problem_text)
+    num_candidates = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    try:
+        with profiled("plan"):
+            generate_valid_block_tree(problem_text, num_candidates)
+    except deadline.DeadlineExceeded as e:
+        print(f"⏰ {e}")
+        sys.exit(deadline.EXIT_DEADLINE)
+    except budget.BudgetExceeded as e:
+        print(f"💸 {e}")
+        sys.exit(budget.EXIT_BUDGET)
+    finally:
+        export_stats()
@@ -0,0 +1,165 @@
+import os
+from typing import Dict, List, Optional
+
+from limiter import status_code
+from tree_validator import BlockSchema, context_error
+
+# ------------------------------
+# JSON Schema of a block tree over the retrieved blocks.
+# One definition per block type: its exact fields and inputs from the
+# catalog (the same rules tree_validator checks), value inputs taking
+# expression blocks and statement inputs statement blocks. Blocks the
+# catalog lists no inputs for get open input objects (any name, values
+# still blocks of the right context), as tree_validator accepts. Sent as the
+# OpenAI-compatible response_format so the backend only decodes trees of
+# that shape; planner output is still parsed and validated as before.
+#
+# PLANNER_RESPONSE_FORMAT: json_schema (default) | json_object | off
+# Not strict mode: it requires every property and forbids the union at
+# the root; constrained-decoding backends enforce the schema regardless.
+# ------------------------------
+
+MODES = ("json_schema", "json_object", "off")
+
+# A 400/422 on a request carrying response_format: it may be the cause
+REJECTED_STATUS = {400, 422}
+
+# ...and it is when the error body names the structured-output parameters
+FORMAT_TERMS = ("response_format", "json_schema")
+
+FIELD_VALUE = {"type": ["string", "number", "boolean"]}
+
+NOT_EXPRESSIBLE = {
+    "type": "object",
+    "properties": {"error": {"const": "not_expressible"}},
+    "required": ["error"],
+    "additionalProperties": False,
+}
+
+
+def _ref(name: str) -> Dict:
+    return {"$ref": f"#/$defs/{name}"}
+
+
+def _object(properties: Dict, required: List[str]) -> Dict:
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": required,
+        "additionalProperties": False,
+    }
+
+
+def _open_object(values: Dict) -> Dict:
+    return {"type": "object", "additionalProperties": values}
+
+
+def block_definition(block: Dict) -> Dict:
+    block_type = block["type"]
+    declared = BlockSchema(block)
+
+    # `next` chains statements; optional, as in Block.from_dict
+    properties = {"type": {"const": block_type}, "next": _ref("statement")}
+    required = ["type"]
+
+    # Every declared field and input is required, as in tree_validator
+    for key, names, schema in (
+        ("fields", list(declared.fields), FIELD_VALUE),
+        ("value_inputs", list(declared.value_inputs), _ref("expression")),
+        ("statement_inputs", list(declared.statement_inputs), _ref("statement")),
+    ):
+        if key != "fields" and not declared.declares_inputs:
+            properties[key] = _open_object(schema)
+        elif names:
+            properties[key] = _object({name: schema for name in names}, names)
+            required.append(key)
+        else:
+            properties[key] = _object({}, [])
+
+    return _object(properties, required)
+
+
+def block_tree_schema(blocks: List[Dict]) -> Dict:
+    """JSON Schema of a block tree (or not_expressible) using only `blocks`"""
+    definitions = {}
+    by_kind = {"expression": [], "statement": []}
+
+    for block in blocks:
+        name = f"block_{block['type']}"
+        if name in definitions:
+            continue
+        definitions[name] = block_definition(block)
+        # The same context rule as tree_validator (untrusted kinds fit either)
+        for context in by_kind:
+            if context_error(block["type"], BlockSchema(block), context) is None:
+                by_kind[context].append(name)
+
+    every = list(definitions)
+    for context, names in by_kind.items():
+        # An empty union matches nothing; fall back to any retrieved block
+        definitions[context] = {"anyOf": [_ref(n) for n in names or every]}
+    definitions["not_expressible"] = NOT_EXPRESSIBLE
+
+    return {
+        "anyOf": [_ref(n) for n in every] + [_ref("not_expressible")],
+        "$defs": definitions,
+    }
+
+
+def batch_tree_schema(blocks: List[Dict]) -> Dict:
+    """{"trees": [{"id": ..., "tree": <block tree>}]} over `blocks` (batch planning)"""
+    single = block_tree_schema(blocks)
+    return {
+        "type": "object",
+        "properties": {
+            "trees": {
+                "type": "array",
+                "items": _object({"id": {"type": "string"}, "tree": {"anyOf": single["anyOf"]}}, ["id", "tree"]),
+            }
+        },
+        "required": ["trees"],
+        "additionalProperties": False,
+        "$defs": single["$defs"],
+    }
+
+
+# ------------------------------
+# response_format
+# ------------------------------
+def mode() -> str:
+    value = os.getenv("PLANNER_RESPONSE_FORMAT", "json_schema")
+    return value if value in MODES else "json_schema"
+
+
+def response_format(schema: Dict, name: str = "block_tree") -> Optional[Dict]:
+    selected = mode()
+    if selected == "off":
+        return None
+    if selected == "json_object":
+        return {"type": "json_object"}
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": name, "schema": schema, "strict": False},
+    }
+
+
+def rejected(exc: BaseException) -> bool:
+    """True if the request may have failed on its response_format (a 400/422)"""
+    return status_code(exc) in REJECTED_STATUS
+
+
+def unsupported(exc: BaseException) -> bool:
+    """True if the error says the backend does not take response_format"""
+    if not rejected(exc):
+        return False
+    text = _error_text(exc).lower()
+    return any(term in text for term in FORMAT_TERMS)
+
+
+def _error_text(exc: BaseException) -> str:
+    parts = [str(exc), str(getattr(exc, "body", None) or "")]
+    try:
+        parts.append(getattr(getattr(exc, "response", None), "text", None) or "")
+    except Exception:
+        pass  # a streamed response that was never read
+    return " ".join(parts)
@@ -0,0 +1,367 @@
+import json
+from typing import Any, List, Optional, Tuple
+
+from tree_validator import context_error, schemas
+
+# ------------------------------
+# Incremental validation of a block tree while it is being generated.
+# JsonEvents turns text chunks into JSON events (keys, scalars, object
+# and array boundaries) as soon as each token is complete. StreamValidator
+# follows the block structure over those events and checks every block's
+# type, field names and input names against the catalog the moment they
+# are known, with the rules and messages tree_validator uses (input names
+# only for blocks whose catalog entry declares inputs). Every error it
+# reports is final (no later token can undo it), so planner.py stops the
+# completion at the first one.
+# ------------------------------
+
+ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+LITERALS = {"true": True, "false": False, "null": None}
+SCALAR_END = set(",]}: \t\r\n")
+
+START_OBJECT = "start_object"
+END_OBJECT = "end_object"
+START_ARRAY = "start_array"
+END_ARRAY = "end_array"
+KEY = "key"
+SCALAR = "scalar"
+
+
+class JsonSyntaxError(ValueError):
+    pass
+
+
+class JsonEvents:
+    """
+    Push parser for one JSON object. Text before its first `{` (prose,
+    code fences) and after its closing `}` is skipped, as extract_json does.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.done = False
+        self.stack: List[str] = []   # "object" / "array"
+        self.expect = "value"        # value | key | colon | comma
+        self.string: Optional[List[str]] = None
+        self.escape = None           # None, "" after a backslash, or \u hex digits
+        self.scalar: Optional[List[str]] = None
+        self._just_opened = False    # an empty object / array may close here
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        events: List[Tuple[str, Any]] = []
+        for char in text:
+            if self.done:
+                break
+            if not self.started:
+                if char != "{":
+                    continue
+                self.started = True
+            self._char(char, events)
+        return events
+
+    def _char(self, char: str, events: List):
+        if self.string is not None:
+            self._string_char(char, events)
+            return
+
+        if self.scalar is not None:
+            if char not in SCALAR_END:
+                self.scalar.append(char)
+                return
+            self._end_scalar(events)
+
+        if char in " \t\r\n":
+            return
+
+        if self.expect == "colon":
+            if char != ":":
+                raise JsonSyntaxError(f"Expected ':' but got {char!r}")
+            self.expect = "value"
+        elif self.expect == "comma":
+            if char == ",":
+                self.expect = "key" if self.stack[-1] == "object" else "value"
+            elif char == "}" and self.stack[-1] == "object":
+                self._close(END_OBJECT, events)
+            elif char == "]" and self.stack[-1] == "array":
+                self._close(END_ARRAY, events)
+            else:
+                raise JsonSyntaxError(f"Expected ',' or a closing bracket but got {char!r}")
+        elif self.expect == "key":
+            if char == '"':
+                self.string = []
+            elif char == "}" and self._just_opened:
+                self._close(END_OBJECT, events)
+            else:
+                raise JsonSyntaxError(f"Expected a key but got {char!r}")
+        else:  # value
+            if char == "{":
+                self.stack.append("object")
+                self.expect = "key"
+                self._just_opened = True
+                events.append((START_OBJECT, None))
+                return
+            if char == "[":
+                self.stack.append("array")
+                self._just_opened = True
+                events.append((START_ARRAY, None))
+                return
+            if char == "]" and self.stack and self.stack[-1] == "array" and self._just_opened:
+                self._close(END_ARRAY, events)
+            elif char == '"':
+                self.string = []
+            elif char == "-" or char.isdigit() or char in "tfn":
+                self.scalar = [char]
+            else:
+                raise JsonSyntaxError(f"Unexpected {char!r}")
+        self._just_opened = False
+
+    def _string_char(self, char: str, events: List):
+        if self.escape is not None:
+            if self.escape == "" and char != "u":
+                if char not in ESCAPES:
+                    raise JsonSyntaxError(f"Invalid escape \\{char}")
+                self.string.append(ESCAPES[char])
+                self.escape = None
+            elif self.escape == "":
+                self.escape = "u"
+            else:
+                self.escape += char
+                if len(self.escape) == 5:
+                    self.string.append(chr(int(self.escape[1:], 16)))
+                    self.escape = None
+            return
+        if char == "\\":
+            self.escape = ""
+            return
+        if char != '"':
+            self.string.append(char)
+            return
+
+        text = "".join(self.string)
+        self.string = None
+        if self.expect == "key":
+            events.append((KEY, text))
+            self.expect = "colon"
+        else:
+            events.append((SCALAR, text))
+            self.expect = "comma"
+
+    def _end_scalar(self, events: List):
+        token = "".join(self.scalar)
+        self.scalar = None
+        if token in LITERALS:
+            value = LITERALS[token]
+        else:
+            try:
+                value = json.loads(token)
+            except json.JSONDecodeError:
+                raise JsonSyntaxError(f"Invalid value {token!r}")
+        events.append((SCALAR, value))
+        self.expect = "comma"
+
+    def _close(self, event: str, events: List):
+        self.stack.pop()
+        events.append((event, None))
+        self.expect = "comma"
+        if not self.stack:
+            self.done = True
+
+
+# ------------------------------
+# Block structure over the events
+# ------------------------------
+SECTIONS = {
+    "fields": ("field", None),
+    "value_inputs": ("value input", "expression"),
+    "statement_inputs": ("statement input", "statement"),
+}
+
+
+class BlockFrame:
+    __slots__ = ("context", "type", "schema", "key", "names", "closed", "answer")
+
+    def __init__(self, context: str):
+        self.context = context
+        self.type: Optional[str] = None
+        self.schema = None
+        self.key: Optional[str] = None
+        self.names = {"field": [], "value input": [], "statement input": []}
+        self.closed = set()  # sections whose object has ended
+        self.answer = False  # {"error": ...} at the root instead of a block
+
+
+class SectionFrame:
+    __slots__ = ("block", "what", "child_context", "key")
+
+    def __init__(self, block: BlockFrame, what: str, child_context: Optional[str]):
+        self.block = block
+        self.what = what
+        self.child_context = child_context
+        self.key: Optional[str] = None
+
+
+class SkipFrame:
+    """A value nobody validates (`next`, unknown keys); only its depth matters"""
+    __slots__ = ("depth",)
+
+    def __init__(self):
+        self.depth = 1
+
+
+class StreamValidator:
+    """
+    feed() text chunks; it returns the errors found so far (empty while
+    the tree is still valid). After the first error it stops parsing.
+    """
+
+    def __init__(self):
+        self.events = JsonEvents()
+        self.stack: List[Any] = []
+        self.errors: List[str] = []
+
+    @property
+    def complete(self) -> bool:
+        return self.events.done
+
+    def feed(self, text: str) -> List[str]:
+        if self.errors or self.events.done:
+            return self.errors
+        try:
+            for event, value in self.events.feed(text):
+                self._event(event, value)
+                if self.errors:
+                    break
+        except JsonSyntaxError as e:
+            self.errors.append(f"Malformed block tree: {e}")
+        return self.errors
+
+    # ------------------------------
+    def _error(self, message: str):
+        if not self.errors:
+            self.errors.append(message)
+
+    def _declared(self, block: BlockFrame, what: str) -> bool:
+        return what == "field" or block.schema.declares_inputs
+
+    def _required(self, block: BlockFrame, what: str) -> Tuple[str, ...]:
+        schema = block.schema
+        if what == "field":
+            return schema.fields
+        return schema.value_inputs if what == "value input" else schema.statement_inputs
+
+    def _check_name(self, block: BlockFrame, what: str, name: str):
+        if self._declared(block, what) and name not in self._required(block, what):
+            self._error(f"Invalid {what} '{name}' in block '{block.type}'")
+
+    def _check_missing(self, block: BlockFrame, what: str):
+        if not self._declared(block, what):
+            return
+        for name in self._required(block, what):
+            if name not in block.names[what]:
+                self._error(f"Missing {what} '{name}' in block '{block.type}'")
+
+    def _set_type(self, block: BlockFrame, block_type: Any):
+        if not isinstance(block_type, str):
+            self._error(f"Malformed block tree: Not a block: type {block_type!r}")
+            return
+        block.type = block_type
+        block.schema = schemas().get(block_type)
+        if block.schema is None:
+            self._error(f"Unknown block type: {block_type}")
+            return
+
+        # Names that arrived before the type
+        for what, names in block.names.items():
+            for name in names:
+                self._check_name(block, what, name)
+            if what in block.closed:
+                self._check_missing(block, what)
+
+        error = context_error(block_type, block.schema, block.context)
+        if error:
+            self._error(error)
+
+    def _start_value(self, event: str, value: Any):
+        """A value begins (or, for scalars, is complete) under the top frame"""
+        if not self.stack:
+            if event != START_OBJECT:
+                self._error("Malformed block tree: the root must be an object")
+            else:
+                self.stack.append(BlockFrame("root"))
+            return
+
+        top = self.stack[-1]
+        opens = event in (START_OBJECT, START_ARRAY)
+
+        if isinstance(top, SkipFrame):
+            if opens:
+                top.depth += 1
+            return
+
+        if isinstance(top, BlockFrame):
+            key = top.key
+            if key == "type":
+                if opens:
+                    self._error("Malformed block tree: Not a block: type must be a string")
+                else:
+                    self._set_type(top, value)
+            elif key in SECTIONS:
+                what, child_context = SECTIONS[key]
+                if event == START_OBJECT:
+                    self.stack.append(SectionFrame(top, what, child_context))
+                elif event == START_ARRAY or value is not None:
+                    detail = "fields must be an object" if what == "field" else "Inputs must be an object"
+                    self._error(f"Malformed block tree: {detail}")
+            elif key == "error" and top.context == "root" and top.type is None:
+                top.answer = True
+                if opens:
+                    self.stack.append(SkipFrame())
+            elif opens:
+                # `next` (not checked by tree_validator either) and unknown keys
+                self.stack.append(SkipFrame())
+            return
+
+        # SectionFrame: the value of one field or input
+        if top.what == "field":
+            if opens:
+                self._error("Malformed block tree: field values must be scalars")
+        elif event == START_OBJECT:
+            self.stack.append(BlockFrame(top.child_context))
+        else:
+            self._error(f"Malformed block tree: Not a block: {json.dumps(value) if not opens else '[...]'}")
+
+    def _event(self, event: str, value: Any):
+        if event == KEY:
+            top = self.stack[-1]
+            if isinstance(top, BlockFrame):
+                top.key = value
+            elif isinstance(top, SectionFrame):
+                top.key = value
+                block = top.block
+                block.names[top.what].append(value)
+                if block.schema is not None:
+                    self._check_name(block, top.what, value)
+            return
+
+        if event in (END_OBJECT, END_ARRAY):
+            top = self.stack[-1]
+            if isinstance(top, SkipFrame):
+                top.depth -= 1
+                if top.depth == 0:
+                    self.stack.pop()
+                return
+            self.stack.pop()
+            if isinstance(top, SectionFrame):
+                top.block.closed.add(top.what)
+                if top.block.schema is not None:
+                    self._check_missing(top.block, top.what)
+            elif isinstance(top, BlockFrame) and not top.answer:
+                if top.type is None:
+                    self._error("Malformed block tree: Not a block: no type")
+                elif top.schema is not None:
+                    for what in top.names:
+                        if what not in top.closed:
+                            self._check_missing(top, what)
+            return
+
+        self._start_value(event, value)
@@ -0,0 +1,204 @@
+import glob
+import json
+import unittest
+from pathlib import Path
+
+from blocks import Block
+from stream_validator import END_OBJECT, KEY, SCALAR, START_ARRAY, START_OBJECT, JsonEvents, JsonSyntaxError, StreamValidator
+from tree_validator import validate_tree
+
+# ------------------------------
+# StreamValidator: push parser events and verdicts must not depend on how
+# the completion is chunked, must agree with tree_validator on whole
+# trees, and the stream must stop at the first error.
+#
+#   python -m unittest test_stream_validator
+# ------------------------------
+
+CHUNK_SIZES = (1, 3, None)  # None: the whole string at once
+
+V3_TREES = sorted(glob.glob(str(Path(__file__).parents[3] / "innogen-agent-v3" / "outputs" / "*" / "block_tree.json")))
+
+IF_WITH_ASSIGNMENT = {
+    "type": "control_if_truthy",
+    "value_inputs": {"IF0": {"type": "essentials_var_get", "fields": {"VAR": "ok"}}},
+    "statement_inputs": {
+        "DO0": {
+            "type": "essentials_var_set",
+            "fields": {"VAR": "total"},
+            "value_inputs": {"VALUE": {"type": "essentials_num_literal", "fields": {"NUM": 3}}},
+            "next": {"type": "text_print", "value_inputs": {"TEXT": {"type": "text_literal", "fields": {"TEXT": "a \"b\" é"}}}},
+        }
+    },
+}
+
+INVALID = {
+    "unknown type": (
+        {"type": "text_print", "value_inputs": {"TEXT": {"type": "no_such_block"}}},
+        "Unknown block type: no_such_block",
+    ),
+    "invalid input of a declared block": (
+        {"type": "text_print", "value_inputs": {"MESSAGE": {"type": "text_literal", "fields": {"TEXT": "x"}}}},
+        "Invalid value input 'MESSAGE' in block 'text_print'",
+    ),
+    "missing input of a declared block": (
+        {"type": "text_print", "value_inputs": {}},
+        "Missing value input 'TEXT' in block 'text_print'",
+    ),
+    "invalid field": (
+        {"type": "essentials_var_get", "fields": {"NAME": "x"}},
+        "Invalid field 'NAME' in block 'essentials_var_get'",
+    ),
+    "statement in expression context": (
+        {"type": "essentials_var_set", "fields": {"VAR": "x"}, "value_inputs": {"VALUE": {"type": "text_print"}}},
+        "Statement block 'text_print' used in expression context",
+    ),
+    "names before the type": (
+        {"value_inputs": {"MESSAGE": {"type": "text_literal", "fields": {"TEXT": "x"}}}, "type": "text_print"},
+        "Invalid value input 'MESSAGE' in block 'text_print'",
+    ),
+}
+
+
+def chunks(text, size):
+    if size is None:
+        return [text]
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def stream(text, size):
+    validator = StreamValidator()
+    for chunk in chunks(text, size):
+        validator.feed(chunk)
+    return validator
+
+
+class JsonEventsTest(unittest.TestCase):
+    def events(self, text, size):
+        parser = JsonEvents()
+        events = []
+        for chunk in chunks(text, size):
+            events.extend(parser.feed(chunk))
+        return parser, events
+
+    def test_events_do_not_depend_on_chunking(self):
+        text = json.dumps(IF_WITH_ASSIGNMENT, indent=2)
+        _, expected = self.events(text, None)
+        for size in CHUNK_SIZES:
+            with self.subTest(size=size):
+                self.assertEqual(self.events(text, size)[1], expected)
+
+    def test_scalars_and_escapes(self):
+        text = '{"s": "a\\"b\\u00e9\\n", "n": -1.5e2, "t": true, "f": false, "z": null, "e": {}, "a": []}'
+        for size in CHUNK_SIZES:
+            with self.subTest(size=size):
+                parser, events = self.events(text, size)
+                self.assertTrue(parser.done)
+                scalars = [value for event, value in events if event == SCALAR]
+                self.assertEqual(scalars, ["a\"bé\n", -150.0, True, False, None])
+                self.assertEqual(events[-4:], [(KEY, "a"), (START_ARRAY, None), ("end_array", None), (END_OBJECT, None)])
+
+    def test_text_around_the_object_is_skipped(self):
+        parser, events = self.events('Here is the tree:\n```json\n{"type": "x"}\n```\n{"ignored": 1}', 3)
+        self.assertTrue(parser.done)
+        self.assertEqual(events, [(START_OBJECT, None), (KEY, "type"), (SCALAR, "x"), (END_OBJECT, None)])
+
+    def test_syntax_errors(self):
+        for text in ('{"a" 1}', '{"a": 1 "b": 2}', '{"a": [1,]}', '{"a": "\\x"}', "{'a': 1}", '{"a": tru}'):
+            with self.subTest(text=text):
+                with self.assertRaises(JsonSyntaxError):
+                    self.events(text, None)
+
+
+class StreamValidatorTest(unittest.TestCase):
+    def test_valid_trees_pass_at_every_chunk_size(self):
+        trees = [IF_WITH_ASSIGNMENT] + [json.loads(Path(p).read_text()) for p in V3_TREES]
+        for tree in trees:
+            text = json.dumps(tree, indent=2)
+            for size in CHUNK_SIZES:
+                with self.subTest(tree=tree["type"], size=size):
+                    validator = stream(text, size)
+                    self.assertEqual(validator.errors, [])
+                    self.assertTrue(validator.complete)
+
+    def test_invalid_trees_fail_at_every_chunk_size(self):
+        for name, (tree, error) in INVALID.items():
+            text = json.dumps(tree)
+            for size in CHUNK_SIZES:
+                with self.subTest(name, size=size):
+                    self.assertEqual(stream(text, size).errors, [error])
+
+    def test_agrees_with_tree_validator(self):
+        trees = [IF_WITH_ASSIGNMENT] + [tree for tree, _ in INVALID.values()]
+        for tree in trees:
+            with self.subTest(tree=json.dumps(tree)[:60]):
+                # Same verdict; the stream reports whichever error it reaches first
+                expected = validate_tree(Block.from_dict(tree))
+                errors = stream(json.dumps(tree), 3).errors
+                self.assertEqual(bool(errors), bool(expected))
+                self.assertTrue(set(errors) <= set(expected))
+
+    def test_not_expressible_answer(self):
+        self.assertEqual(stream('{"error": "not_expressible"}', 1).errors, [])
+
+    def test_malformed(self):
+        self.assertEqual(stream('{"type": "text_print", "value_inputs": ["x"]}', 1).errors,
+                         ["Malformed block tree: Inputs must be an object"])
+        self.assertTrue(stream('{"type": "text_print",, }', 1).errors[0].startswith("Malformed block tree:"))
+
+    def test_stops_at_the_first_error(self):
+        tree, error = INVALID["unknown type"]
+        text = json.dumps(tree)
+        cut = text.index("no_such_block") + len("no_such_block") + 1  # the closing quote completes the value
+
+        validator = StreamValidator()
+        self.assertEqual(validator.feed(text[:cut - 1]), [])
+        self.assertEqual(validator.feed(text[cut - 1:cut]), [error])
+        # Nothing after the first error is parsed, not even invalid JSON
+        self.assertEqual(validator.feed('"MORE": {"type": "also_unknown"}}}} garbage'), [error])
+        self.assertFalse(validator.complete)
+
+
+class StreamTreeTest(unittest.TestCase):
+    """planner.stream_tree cancels the completion at the first error"""
+
+    class Backend:
+        def __init__(self, text, size):
+            self.parts = chunks(text, size)
+            self.sent = 0
+            self.closed = False
+
+        def stream(self, messages, **options):
+            try:
+                for part in self.parts:
+                    self.sent += 1
+                    yield part
+            finally:
+                self.closed = True
+
+    def setUp(self):
+        from planner import stream_tree
+        self.stream_tree = stream_tree
+        self.messages = [{"role": "user", "content": "problem"}]
+
+    def test_invalid_completion_is_cut_short(self):
+        tree, error = INVALID["unknown type"]
+        text = json.dumps(tree) + " " * 200
+        backend = self.Backend(text, 3)
+        completion = self.stream_tree(backend, self.messages)
+        self.assertEqual(completion.errors, [error])
+        self.assertTrue(backend.closed)
+        self.assertLess(backend.sent, len(backend.parts))
+        self.assertTrue(completion.text.endswith('"no_such_block"'))
+
+    def test_valid_completion_is_read_to_the_end(self):
+        text = json.dumps(IF_WITH_ASSIGNMENT)
+        backend = self.Backend(text, 3)
+        completion = self.stream_tree(backend, self.messages)
+        self.assertEqual(completion.errors, [])
+        self.assertEqual(json.loads(completion.text), IF_WITH_ASSIGNMENT)
+        self.assertTrue(backend.closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from blocks import Block
+
+# ------------------------------
+# In-process port of agent/validator.js, over Block trees.
+# Same rules and messages: known type, exact fields, value and statement
+# inputs (recursing into them) and expression / statement context.
+# `next` is not followed, as in validator.js.
+#
+# Unlike validator.js, input and kind rules only come from catalog
+# entries that declare them. normalized_blocks.json lists inputs only
+# where they were connected when it was scraped (text_print, hardly
+# anything else), and "expression" is the scraper's fallback kind
+# (essentials_var_set, controls_for). A block with no declared inputs
+# takes inputs of any name; the blocks in them are still validated.
+# ------------------------------
+
+BLOCKS_DB_PATH = Path(__file__).parent.parent / "data" / "normalized_blocks.json"
+
+
+class BlockSchema:
+    __slots__ = ("kind", "fields", "value_inputs", "statement_inputs", "declares_inputs")
+
+    def __init__(self, entry: Dict):
+        # Tuples keep the catalog order, so errors come out as validator.js orders them
+        self.kind = entry.get("kind")
+        self.fields = tuple(entry.get("fields") or ())
+        self.value_inputs = tuple(entry.get("value_inputs") or ())
+        self.statement_inputs = tuple(entry.get("statement_inputs") or ())
+        self.declares_inputs = bool(self.value_inputs or self.statement_inputs)
+
+
+_SCHEMAS: Optional[Dict[str, BlockSchema]] = None
+
+
+def schemas() -> Dict[str, BlockSchema]:
+    """Block type -> schema, loaded once per process"""
+    global _SCHEMAS
+    if _SCHEMAS is None:
+        if not BLOCKS_DB_PATH.exists():
+            raise FileNotFoundError(f"normalized_blocks.json not found at {BLOCKS_DB_PATH}")
+        with open(BLOCKS_DB_PATH, "r", encoding="utf-8") as f:
+            _SCHEMAS = {b["type"]: BlockSchema(b) for b in json.load(f)}
+    return _SCHEMAS
+
+
+def context_error(block_type: str, schema: BlockSchema, context: str) -> Optional[str]:
+    """Why a block of this schema cannot stand in `context`, or None"""
+    if context == "expression" and schema.kind == "statement":
+        return f"Statement block '{block_type}' used in expression context"
+    # Only a fully described entry's "expression" kind is trusted
+    if context == "statement" and schema.kind == "expression" and schema.declares_inputs:
+        return f"Expression block '{block_type}' used in statement context"
+    return None
+
+
+def _check_inputs(block: Block, what: str, required: Tuple[str, ...], provided: Tuple, context: Optional[str],
+                  errors: List[str], declared: bool = True):
+    """provided: (name, value) pairs; known inputs are validated in `context`.
+    Undeclared (declared=False): any names, only the values are validated."""
+    names = [name for name, _ in provided]
+    for name in required if declared else ():
+        if name not in names:
+            errors.append(f"Missing {what} '{name}' in block '{block.type}'")
+    for name, child in provided:
+        if declared and name not in required:
+            errors.append(f"Invalid {what} '{name}' in block '{block.type}'")
+        elif context is not None:
+            errors.extend(validate_tree(child, context))
+
+
+def validate_tree(block: Block, context: str = "root") -> List[str]:
+    """Validation errors for a block tree; empty when it is valid"""
+    errors: List[str] = []
+
+    schema = schemas().get(block.type)
+    if schema is None:
+        errors.append(f"Unknown block type: {block.type}")
+        return errors
+
+    _check_inputs(block, "field", schema.fields, block.fields or (), None, errors)
+    _check_inputs(block, "value input", schema.value_inputs, block.value_inputs or (), "expression", errors,
+                  schema.declares_inputs)
+    _check_inputs(block, "statement input", schema.statement_inputs, block.statement_inputs or (), "statement", errors,
+                  schema.declares_inputs)
+
+    error = context_error(block.type, schema, context)
+    if error:
+        errors.append(error)
+
+    return errors
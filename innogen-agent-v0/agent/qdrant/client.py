@@ -1,12 +1,30 @@
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient, QdrantClient
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# location: None for the QDRANT_URL server, ":memory:" for an in-process
+# store, or a directory path for a local on-disk store (offline testing)
 
-def get_qdrant_client():
+
+def get_qdrant_client(location=None):
+    if location == ":memory:":
+        return QdrantClient(location=":memory:")
+    if location:
+        return QdrantClient(path=location)
     return QdrantClient(
         url=os.getenv("QDRANT_URL"),
         api_key=os.getenv("QDRANT_API_KEY"),
     )
+
+
+def get_async_qdrant_client(location=None):
+    if location == ":memory:":
+        return AsyncQdrantClient(location=":memory:")
+    if location:
+        return AsyncQdrantClient(path=location)
+    return AsyncQdrantClient(
+        url=os.getenv("QDRANT_URL"),
+        api_key=os.getenv("QDRANT_API_KEY"),
+    )
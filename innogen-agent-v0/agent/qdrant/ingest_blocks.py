@@ -1,4 +1,9 @@
+import argparse
+import asyncio
 import json
+import queue
+import threading
+import time
 import uuid
 from pathlib import Path
 
@@ -6,7 +11,7 @@ from dotenv import load_dotenv
 from sentence_transformers import SentenceTransformer
 from qdrant_client.models import PointStruct, Distance, VectorParams
 
-from agent.qdrant.client import get_qdrant_client
+from agent.qdrant.client import get_async_qdrant_client
 
 # -------------------------
 # Env setup
@@ -19,10 +24,30 @@ COLLECTION_NAME = "block_grammar"
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
 EMBEDDING_DIM = 384  # all-MiniLM-L6-v2 output size
 
+BLOCKS_PATH = Path(__file__).resolve().parents[2] / "agent" / "data" / "normalized_blocks.json"
+
+# -------------------------
+# Pipeline settings
+# -------------------------
+# One thread encodes batches while earlier ones are upserted concurrently,
+# so a re-index takes about as long as the slower of the two stages.
+BATCH_SIZE = 100       # points per encode call and per upsert
+MAX_UPLOADS = 4        # upserts in flight
+QUEUE_SIZE = 4         # encoded batches waiting for upload (bounds memory)
+UPLOAD_RETRIES = 3     # attempts per batch
+RETRY_BASE_DELAY = 0.5  # seconds, doubled after each failed attempt
+
 # -------------------------
-# Load embedding model (ONCE)
+# Load embedding model (ONCE, on first use)
 # -------------------------
-embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+embedding_model = None
+
+
+def get_embedding_model() -> SentenceTransformer:
+    global embedding_model
+    if embedding_model is None:
+        embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    return embedding_model
 
 # -------------------------
 # Embedding helper (FREE & SAFE)
@@ -35,13 +60,23 @@ def embed(text: str) -> list[float]:
     if not text:
         raise ValueError("Embedding input text is empty")
 
-    vector = embedding_model.encode(
+    vector = get_embedding_model().encode(
         text,
         normalize_embeddings=True  # cosine similarity friendly
     )
 
     return vector.tolist()
 
+
+def embed_batch(texts: list[str]) -> list[list[float]]:
+    """One encode call for a whole batch (much faster than text by text)."""
+    vectors = get_embedding_model().encode(
+        texts,
+        batch_size=min(len(texts), 64),
+        normalize_embeddings=True
+    )
+    return vectors.tolist()
+
 # -------------------------
 # Block → Semantic Text
 # -------------------------
@@ -61,71 +96,225 @@ Statement inputs: {', '.join(statement_inputs) if statement_inputs else 'none'}.
 """.strip()
 
 # -------------------------
-# Main Ingestion
+# Pipeline
 # -------------------------
-def main():
-    qdrant = get_qdrant_client()
+class IngestStats:
+    """Counters shared by the encoder thread and the upload loop."""
 
-    # Create collection (idempotent)
-    try:
-        qdrant.create_collection(
-            collection_name=COLLECTION_NAME,
-            vectors_config=VectorParams(
-                size=EMBEDDING_DIM,
-                distance=Distance.COSINE,
-            ),
-        )
-        print("✅ Collection created")
-    except Exception:
-        print("ℹ️ Collection already exists")
+    def __init__(self, total: int):
+        self.total = total
+        self.encoded = 0
+        self.uploaded = 0
+        self.skipped = 0
+        self.batches = 0
+        self.retries = 0
+        self.failed_batches: list[int] = []
+        self.encode_seconds = 0.0
+        self.upload_seconds = 0.0  # summed over concurrent upserts
+        self.started = time.perf_counter()
+        self.error = None  # exception that stopped the encoder
 
-    # Load normalized blocks
-    BASE_DIR = Path(__file__).resolve().parents[2]
-    BLOCKS_PATH = BASE_DIR / "agent" / "data" / "normalized_blocks.json"
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
 
-    if not BLOCKS_PATH.exists():
-        raise FileNotFoundError(f"Blocks file not found: {BLOCKS_PATH}")
+    def report(self) -> dict:
+        wall = self.elapsed()
+        return {
+            "blocks": self.total,
+            "encoded": self.encoded,
+            "uploaded": self.uploaded,
+            "skipped": self.skipped,
+            "batches": self.batches,
+            "retries": self.retries,
+            "failed_batches": self.failed_batches,
+            "encode_seconds": round(self.encode_seconds, 3),
+            "upload_seconds": round(self.upload_seconds, 3),
+            "wall_seconds": round(wall, 3),
+            "encode_per_second": round(self.encoded / self.encode_seconds, 1) if self.encode_seconds else None,
+            "points_per_second": round(self.uploaded / wall, 1) if wall else None,
+        }
 
-    with open(BLOCKS_PATH, "r", encoding="utf-8") as f:
-        blocks = json.load(f)
 
-    points = []
-    skipped = 0
+def encode_batches(blocks: list[dict], batch_size: int, out: queue.Queue, stats: IngestStats):
+    """
+    Producer (runs in a thread): encode the blocks batch by batch and put
+    (batch number, points) on `out`, which blocks while uploads lag
+    behind. Always ends with None.
+    """
+    try:
+        for start in range(0, len(blocks), batch_size):
+            kept, texts = [], []
+            for block in blocks[start : start + batch_size]:
+                try:
+                    text = block_to_text(block).strip()
+                    if not text:
+                        raise ValueError("Embedding input text is empty")
+                    kept.append(block)
+                    texts.append(text)
+                except Exception as e:
+                    stats.skipped += 1
+                    print(f"⚠️ Skipping block {block.get('type')} → {e}")
 
-    for block in blocks:
-        try:
-            text = block_to_text(block)
-            vector = embed(text)
+            if not texts:
+                continue
+
+            t0 = time.perf_counter()
+            vectors = embed_batch(texts)
+            stats.encode_seconds += time.perf_counter() - t0
 
-            points.append(
+            points = [
                 PointStruct(
                     id=str(uuid.uuid4()),
                     vector=vector,
                     payload=block,  # full grammar payload
                 )
-            )
+                for block, vector in zip(kept, vectors)
+            ]
+            stats.encoded += len(points)
+            stats.batches += 1
+            out.put((stats.batches, points))
+    except BaseException as e:
+        stats.error = e
+    finally:
+        out.put(None)
 
-        except Exception as e:
-            skipped += 1
-            print(f"⚠️ Skipping block {block.get('type')} → {e}")
 
-    if not points:
-        raise RuntimeError("No valid blocks were embedded. Aborting upsert.")
+async def upload_batch(qdrant, number: int, points: list, stats: IngestStats, slots: asyncio.Semaphore):
+    """Upsert one batch, retrying with exponential backoff."""
+    try:
+        for attempt in range(1, UPLOAD_RETRIES + 1):
+            t0 = time.perf_counter()
+            try:
+                await qdrant.upsert(
+                    collection_name=COLLECTION_NAME,
+                    points=points,
+                )
+            except Exception as e:
+                if attempt == UPLOAD_RETRIES:
+                    stats.failed_batches.append(number)
+                    print(f"❌ Batch {number} failed after {attempt} attempts → {e}")
+                    return
+                delay = RETRY_BASE_DELAY * 2 ** (attempt - 1)
+                stats.retries += 1
+                print(f"🔁 Batch {number} upload failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            else:
+                stats.upload_seconds += time.perf_counter() - t0
+                stats.uploaded += len(points)
+                rate = stats.uploaded / stats.elapsed()
+                print(f"⬆️ Uploaded batch {number} ({stats.uploaded}/{stats.total} points, {rate:.0f} points/s)")
+                return
+    finally:
+        slots.release()
+
 
-    BATCH_SIZE = 100  # safe default
+async def upload_batches(qdrant, batches: queue.Queue, stats: IngestStats, max_uploads: int):
+    """Consumer: start an upsert per encoded batch, at most max_uploads at a time."""
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(max_uploads)
+    tasks = []
 
-    for i in range(0, len(points), BATCH_SIZE):
-        batch = points[i : i + BATCH_SIZE]
-        qdrant.upsert(
-            collection_name=COLLECTION_NAME,
-            points=batch,
+    while True:
+        item = await loop.run_in_executor(None, batches.get)
+        if item is None:
+            break
+        await slots.acquire()
+        tasks.append(asyncio.create_task(upload_batch(qdrant, *item, stats, slots)))
+
+    await asyncio.gather(*tasks)
+
+
+async def ingest(
+    blocks: list[dict],
+    location=None,
+    batch_size: int = BATCH_SIZE,
+    max_uploads: int = MAX_UPLOADS,
+    queue_size: int = QUEUE_SIZE,
+) -> dict:
+    """
+    Encode and upsert `blocks` with encoding and uploads overlapped.
+    location: None (QDRANT_URL), ":memory:" or a local directory.
+    Returns the throughput report.
+    """
+    get_embedding_model()  # load before the clock starts
+    qdrant = get_async_qdrant_client(location)
+
+    try:
+        # Create collection (idempotent)
+        try:
+            await qdrant.create_collection(
+                collection_name=COLLECTION_NAME,
+                vectors_config=VectorParams(
+                    size=EMBEDDING_DIM,
+                    distance=Distance.COSINE,
+                ),
+            )
+            print("✅ Collection created")
+        except Exception:
+            print("ℹ️ Collection already exists")
+
+        stats = IngestStats(len(blocks))
+        batches = queue.Queue(maxsize=queue_size)
+        encoder = threading.Thread(
+            target=encode_batches,
+            args=(blocks, batch_size, batches, stats),
+            name="block-encoder",
+            daemon=True,
         )
-        print(f"⬆️ Uploaded batch {i // BATCH_SIZE + 1}")
+        encoder.start()
+        await upload_batches(qdrant, batches, stats, max_uploads)
+        encoder.join()
+    finally:
+        await qdrant.close()
+
+    if stats.error is not None:
+        raise stats.error
+    return stats.report()
+
+# -------------------------
+# Main Ingestion
+# -------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Embed normalized blocks and upsert them into Qdrant")
+    parser.add_argument("--location", default=None,
+                        help="':memory:' or a local directory instead of QDRANT_URL (offline runs)")
+    parser.add_argument("--blocks", default=str(BLOCKS_PATH), help="normalized_blocks.json to index")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--max-uploads", type=int, default=MAX_UPLOADS, help="upserts in flight")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE, help="encoded batches buffered")
+    parser.add_argument("--report", default=None, help="write the throughput report to this JSON file")
+    args = parser.parse_args(argv)
+
+    blocks_path = Path(args.blocks)
+    if not blocks_path.exists():
+        raise FileNotFoundError(f"Blocks file not found: {blocks_path}")
+
+    with open(blocks_path, "r", encoding="utf-8") as f:
+        blocks = json.load(f)
+
+    report = asyncio.run(ingest(
+        blocks,
+        location=args.location,
+        batch_size=args.batch_size,
+        max_uploads=args.max_uploads,
+        queue_size=args.queue_size,
+    ))
 
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2))
 
-    print(f"✅ Uploaded {len(points)} blocks to Qdrant")
-    if skipped:
-        print(f"⚠️ Skipped {skipped} invalid blocks")
+    if not report["encoded"]:
+        raise RuntimeError("No valid blocks were embedded. Aborting upsert.")
+
+    print(
+        f"✅ Uploaded {report['uploaded']} blocks to Qdrant in {report['wall_seconds']}s "
+        f"({report['points_per_second']} points/s; encode {report['encode_seconds']}s, "
+        f"upload {report['upload_seconds']}s)"
+    )
+    if report["skipped"]:
+        print(f"⚠️ Skipped {report['skipped']} invalid blocks")
+    if report["failed_batches"]:
+        raise RuntimeError(f"Upload failed for batches {report['failed_batches']}")
 
 # -------------------------
 # Entry
@@ -1,14 +1,65 @@
+import argparse
 import json
+import os
 import subprocess
 import shutil
+import time
+from collections import defaultdict
 from pathlib import Path
 
+from agent.metrics import (
+    REGISTRY,
+    STAGE_SECONDS,
+    STAGE_OUTCOMES,
+    LLM_REQUESTS,
+    LLM_TOKENS,
+    PLANNER_RETRIES,
+    BATCH_PLANS,
+    VALIDATION_FAILURES,
+    BROWSER_LAUNCH_SECONDS,
+    DEADLINE_EXCEEDED,
+    BUDGET_EXCEEDED,
+    BUDGET_DOWNGRADES,
+    LLM_HEDGES,
+    LLM_RETRIES,
+    PAGE_READY_SECONDS,
+    reason_label,
+    start_metrics_server,
+)
+from agent.planner.profiling import PROFILE_DIR_ENV, write_summary
+from agent.planner.deadline import (
+    DEADLINE_ENV,
+    EXIT_DEADLINE,
+    DeadlineExceeded,
+    deadline_env,
+    run_with_deadline,
+)
+from agent.planner.budget import EXIT_BUDGET, BudgetExceeded, budget_env
+
 # ------------------------------
 # CONFIG
 # ------------------------------
 TEAM_ID = "TEAM_ID0602"
 ROLE = "TL"
 
+# Planner candidates sampled concurrently per attempt (1 = serial retries only)
+PLANNER_CANDIDATES = 1
+
+# Problems planned per LLM request by batch_planner.py (1 = one request per problem)
+PLAN_BATCH = int(os.getenv("PLAN_BATCH", "1"))
+
+# Each problem (planner retries, XML generation, browser) must finish within this
+PROBLEM_DEADLINE_SECONDS = float(os.getenv("PROBLEM_DEADLINE_SECONDS", "300"))
+
+# Prometheus text metrics; set METRICS_PORT to also serve /metrics during the run
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0")) or None
+
+# Token budgets (0 = unlimited); prices are USD per million tokens, for the usage report
+PROBLEM_TOKEN_LIMIT = int(os.getenv("PROBLEM_TOKEN_LIMIT", "0")) or None
+RUN_TOKEN_LIMIT = int(os.getenv("RUN_TOKEN_LIMIT", "0")) or None
+TOKEN_PRICE_IN = float(os.getenv("TOKEN_PRICE_IN", "0"))
+TOKEN_PRICE_OUT = float(os.getenv("TOKEN_PRICE_OUT", "0"))
+
 ROOT = Path(__file__).parent
 AGENT_DIR = ROOT / "agent"
 ASSEMBLER_DIR = ROOT / "assembler"
@@ -16,6 +67,7 @@ SCRAPPER_DIR = ROOT / "scrapper"
 SUBMISSIONS_DIR = ROOT / "submissions"
 
 PLANNER_SCRIPT = AGENT_DIR / "planner" / "retry_loop.py"
+BATCH_PLANNER_SCRIPT = AGENT_DIR / "planner" / "batch_planner.py"
 GENERATE_XML_SCRIPT = ASSEMBLER_DIR / "generate_xml.js"
 EXECUTE_XML_SCRIPT = SCRAPPER_DIR / "runner_execute.js"
 
@@ -25,12 +77,40 @@ PROGRAM_XML_PATH = ASSEMBLER_DIR / "output" / "program.xml"
 RESULT_XML = SCRAPPER_DIR / "output" / "result.xml"
 RESULT_TXT = SCRAPPER_DIR / "output" / "result.txt"
 
+PLANNER_STATS = AGENT_DIR / "planner" / "output" / "planner_stats.json"
+BATCH_PROBLEMS = AGENT_DIR / "planner" / "output" / "batch_problems.json"
+BATCH_TREES_DIR = AGENT_DIR / "planner" / "output" / "batch"
+BATCH_STATS = AGENT_DIR / "planner" / "output" / "batch_stats.json"
+RUNNER_TIMINGS = SCRAPPER_DIR / "output" / "timings.json"
+METRICS_FILE = SUBMISSIONS_DIR / "metrics.prom"
+PROFILE_DIR = SUBMISSIONS_DIR / "profile"
+USAGE_LEDGER = SUBMISSIONS_DIR / "usage_ledger.jsonl"
+USAGE_REPORT = SUBMISSIONS_DIR / "usage_report.json"
+
+# Wall time of every stage run, for the --profile summary
+STAGE_WALL = defaultdict(list)
+
+# pid -> token usage of its planner run
+USAGE = {}
+
 # ------------------------------
 # Helpers
 # ------------------------------
-def run(cmd, cwd=None):
+def run(cmd, cwd=None, env=None):
     print(f"▶ Running: {' '.join(cmd)}")
-    subprocess.run(cmd, cwd=cwd, check=True)
+
+    # Killed with its process group once the problem deadline in env passes
+    cap = None
+    if env and DEADLINE_ENV in env:
+        cap = max(0.0, float(env[DEADLINE_ENV]) - time.time())
+
+    result = run_with_deadline(cmd, cwd=cwd, env=env, cap=cap)
+    if result.returncode == EXIT_DEADLINE:
+        raise DeadlineExceeded(f"{' '.join(cmd[:2])}: gave up at the problem deadline")
+    if result.returncode == EXIT_BUDGET:
+        raise BudgetExceeded(f"{' '.join(cmd[:2])}: token budget used up")
+    if result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, cmd)
 
 
 def safe_copy(src, dst):
@@ -38,10 +118,178 @@ def safe_copy(src, dst):
         shutil.copy(src, dst)
 
 
+def run_stage(stage, cmd, cwd=None, env=None):
+    start = time.perf_counter()
+    try:
+        run(cmd, cwd=cwd, env=env)
+    except Exception:
+        STAGE_OUTCOMES.inc(stage=stage, outcome="error")
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        STAGE_WALL[stage].append(elapsed)
+    STAGE_OUTCOMES.inc(stage=stage, outcome="ok")
+
+
+def read_json(path):
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def record_planner_stats(pid):
+    stats = read_json(PLANNER_STATS)
+    if not stats:
+        return
+    record_usage(pid, stats)
+    BUDGET_DOWNGRADES.inc(stats.get("downgrades", 0))
+    LLM_REQUESTS.inc(stats["attempts"] - stats["llm_errors"], outcome="ok")
+    LLM_REQUESTS.inc(stats["llm_errors"], outcome="error")
+    LLM_TOKENS.inc(stats["prompt_tokens"], direction="in")
+    LLM_TOKENS.inc(stats["completion_tokens"], direction="out")
+    PLANNER_RETRIES.inc(max(stats["attempts"] - 1, 0))
+    for winner, count in stats.get("hedges", {}).items():
+        LLM_HEDGES.inc(count, winner=winner)
+    for error_class, count in stats.get("llm_retries", {}).items():
+        LLM_RETRIES.inc(count, error_class=error_class)
+    for error in stats["validation_errors"]:
+        VALIDATION_FAILURES.inc(reason=reason_label(error))
+
+
+def record_batch_stats():
+    stats = read_json(BATCH_STATS)
+    if not stats or not stats["problems"]:
+        return
+    pids = stats["problems"]
+    BATCH_PLANS.inc(len(stats["planned"]), outcome="planned")
+    BATCH_PLANS.inc(len(pids) - len(stats["planned"]), outcome="fallback")
+    LLM_REQUESTS.inc(stats["attempts"] - stats["llm_errors"], outcome="ok")
+    LLM_REQUESTS.inc(stats["llm_errors"], outcome="error")
+    LLM_TOKENS.inc(stats["prompt_tokens"], direction="in")
+    LLM_TOKENS.inc(stats["completion_tokens"], direction="out")
+    for error_class, count in stats.get("llm_retries", {}).items():
+        LLM_RETRIES.inc(count, error_class=error_class)
+    for error in stats["validation_errors"]:
+        VALIDATION_FAILURES.inc(reason=reason_label(error))
+
+    # Tokens are split evenly between the problems; the requests count once
+    count = len(pids)
+    with open(USAGE_LEDGER, "a", encoding="utf-8") as f:
+        for i, pid in enumerate(pids):
+            share = {
+                key: stats[key] // count + (stats[key] % count if i == 0 else 0)
+                for key in ("prompt_tokens", "completion_tokens")
+            }
+            usage = USAGE.setdefault(pid, new_usage())
+            usage["requests"] += stats["attempts"] if i == 0 else 0
+            usage["prompt_tokens"] += share["prompt_tokens"]
+            usage["completion_tokens"] += share["completion_tokens"]
+            f.write(json.dumps({"pid": pid, "kind": "batch", **share, "cost": round(token_cost(share), 6)}) + "\n")
+
+
+def new_usage():
+    return {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "budget_exceeded": None}
+
+
+def record_usage(pid, stats):
+    usage = USAGE.setdefault(pid, new_usage())
+    usage["requests"] += stats["attempts"]
+    usage["prompt_tokens"] += stats["prompt_tokens"]
+    usage["completion_tokens"] += stats["completion_tokens"]
+
+    # One ledger line per planner attempt
+    with open(USAGE_LEDGER, "a", encoding="utf-8") as f:
+        for call in stats.get("calls", []):
+            f.write(json.dumps({"pid": pid, **call, "cost": round(token_cost(call), 6)}) + "\n")
+
+
+def token_cost(usage):
+    return (usage["prompt_tokens"] * TOKEN_PRICE_IN + usage["completion_tokens"] * TOKEN_PRICE_OUT) / 1_000_000
+
+
+def total_tokens(usage):
+    return usage["prompt_tokens"] + usage["completion_tokens"]
+
+
+def run_tokens():
+    return sum(total_tokens(u) for u in USAGE.values())
+
+
+def problem_token_budget():
+    """Tokens the next problem may spend: its own limit, bounded by what is left of the run's."""
+    limits = [PROBLEM_TOKEN_LIMIT] if PROBLEM_TOKEN_LIMIT else []
+    if RUN_TOKEN_LIMIT:
+        limits.append(max(0, RUN_TOKEN_LIMIT - run_tokens()))
+    return min(limits) if limits else None
+
+
+def report_usage(top_n=5):
+    totals = {
+        "prompt_tokens": sum(u["prompt_tokens"] for u in USAGE.values()),
+        "completion_tokens": sum(u["completion_tokens"] for u in USAGE.values()),
+    }
+    ranked = sorted(USAGE.items(), key=lambda item: total_tokens(item[1]), reverse=True)
+    report = {
+        "requests": sum(u["requests"] for u in USAGE.values()),
+        **totals,
+        "total_tokens": total_tokens(totals),
+        "cost": round(token_cost(totals), 4),
+        "run_budget": RUN_TOKEN_LIMIT,
+        "problem_budget": PROBLEM_TOKEN_LIMIT,
+        "problems": len(USAGE),
+        "over_budget": sorted(pid for pid, u in USAGE.items() if u["budget_exceeded"]),
+        "top_problems": [
+            {
+                "pid": pid,
+                "requests": u["requests"],
+                "tokens": total_tokens(u),
+                "cost": round(token_cost(u), 4),
+                "budget_exceeded": u["budget_exceeded"],
+            }
+            for pid, u in ranked[:top_n]
+        ],
+    }
+
+    print(f"\n💰 LLM usage: {report['total_tokens']} tokens in {report['requests']} requests (${report['cost']})")
+    for entry in report["top_problems"]:
+        print(f"   {entry['pid']}: {entry['tokens']} tokens, {entry['requests']} requests")
+    if report["over_budget"]:
+        print(f"   Over budget: {', '.join(report['over_budget'])}")
+
+    with open(USAGE_REPORT, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+
+def record_runner_timings():
+    timings = read_json(RUNNER_TIMINGS)
+    if not timings:
+        return
+    if "browser_launch_ms" in timings:
+        BROWSER_LAUNCH_SECONDS.observe(timings["browser_launch_ms"] / 1000)
+    if "page_ready_ms" in timings:
+        PAGE_READY_SECONDS.observe(timings["page_ready_ms"] / 1000)
+
+
 # ------------------------------
 # Main Orchestrator
 # ------------------------------
 def main():
+    parser = argparse.ArgumentParser(description="Innogen Agent v0")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile the planner scripts (cProfile + tracemalloc) into submissions/profile/"
+    )
+    parser.add_argument(
+        "--plan-batch",
+        type=int,
+        default=PLAN_BATCH,
+        help="Problems planned per LLM request; a problem the batch misses is planned alone (1 = no batching)"
+    )
+    args = parser.parse_args()
+
     problems_path = ROOT / "problems.json"
 
     if not problems_path.exists():
@@ -51,67 +299,169 @@ def main():
         problems = json.load(f)
 
     SUBMISSIONS_DIR.mkdir(exist_ok=True)
+    USAGE_LEDGER.write_text("")
 
-    for problem in problems:
-        pid = problem["problem_id"]
-        description = problem["description"]
-
-        print(f"\n==============================")
-        print(f"🚀 Solving {pid}")
-        print(f"==============================")
-
-        # ------------------------------
-        # 1️⃣ Planner (LLM + Retry)
-        # ------------------------------
-        run(
-            ["python", str(PLANNER_SCRIPT), description],
-            cwd=ROOT
-        )
-
-        if not BLOCK_TREE_PATH.exists():
-            raise RuntimeError("Planner failed: block_tree.json missing")
-
-        # ------------------------------
-        # 2️⃣ Generate XML
-        # ------------------------------
-        run(
-            ["node", str(GENERATE_XML_SCRIPT)],
-            cwd=ASSEMBLER_DIR
-        )
-
-        if not PROGRAM_XML_PATH.exists():
-            raise RuntimeError("XML generation failed")
-
-        # ------------------------------
-        # 3️⃣ Execute in CodeAsthram
-        # ------------------------------
-        run(
-            ["node", str(EXECUTE_XML_SCRIPT)],
-            cwd=SCRAPPER_DIR
-        )
-
-        # ------------------------------
-        # 4️⃣ Create Submission Folder
-        # ------------------------------
-        problem_dir = SUBMISSIONS_DIR / pid
-        problem_dir.mkdir(exist_ok=True)
-
-        xml_name = f"{TEAM_ID}_{ROLE}_{pid}.xml"
-        txt_name = f"{TEAM_ID}_{ROLE}_{pid}.txt"
-        bug_name = f"{TEAM_ID}_{ROLE}_{pid}_bug.txt"
-
-        safe_copy(PROGRAM_XML_PATH, problem_dir / xml_name)
-        safe_copy(RESULT_TXT, problem_dir / txt_name)
-
-        # Optional bug file
-        if RESULT_XML.exists():
-            safe_copy(RESULT_XML, problem_dir / bug_name)
-
-        print(f"✅ {pid} completed")
+    if METRICS_PORT:
+        start_metrics_server(REGISTRY, METRICS_PORT)
+        print(f"📡 Metrics on http://127.0.0.1:{METRICS_PORT}/metrics")
+
+    try:
+        solve_all(problems, profile=args.profile, plan_batch=args.plan_batch)
+    finally:
+        report_usage()
+        REGISTRY.write_textfile(str(METRICS_FILE))
+        print(f"📈 Metrics written to {METRICS_FILE}")
+        if args.profile:
+            print(f"🔬 Profile summary: {write_summary(PROFILE_DIR, STAGE_WALL)}")
 
     print("\n🏁 ALL PROBLEMS SOLVED")
 
 
+def solve_all(problems, profile=False, plan_batch=1):
+    for start in range(0, len(problems), max(1, plan_batch)):
+        chunk = problems[start:start + max(1, plan_batch)]
+        if len(chunk) > 1:
+            plan_batch_of(chunk, profile)
+
+        for problem in chunk:
+            try:
+                solve_problem(problem, profile)
+            except DeadlineExceeded as e:
+                # The stuck stage was killed; move on to the next problem
+                DEADLINE_EXCEEDED.inc()
+                print(f"⏰ {problem['problem_id']} stopped: {e}")
+            except BudgetExceeded as e:
+                print(f"💸 {problem['problem_id']} stopped: {e}")
+
+
+def batch_token_budget(count):
+    """Tokens one batch of `count` problems may spend: their limits together, bounded by the run's."""
+    limits = [PROBLEM_TOKEN_LIMIT * count] if PROBLEM_TOKEN_LIMIT else []
+    if RUN_TOKEN_LIMIT:
+        limits.append(max(0, RUN_TOKEN_LIMIT - run_tokens()))
+    return min(limits) if limits else None
+
+
+def plan_batch_of(problems, profile=False):
+    """
+    Plan the problems with one batch_planner.py request. Their valid trees
+    land in BATCH_TREES_DIR, where solve_problem picks them up; the rest
+    are planned alone. A failed batch only costs the request.
+    """
+    shutil.rmtree(BATCH_TREES_DIR, ignore_errors=True)
+    BATCH_STATS.unlink(missing_ok=True)
+
+    tokens = batch_token_budget(len(problems))
+    if tokens == 0:
+        return
+
+    BATCH_PROBLEMS.parent.mkdir(parents=True, exist_ok=True)
+    BATCH_PROBLEMS.write_text(json.dumps(problems))
+    env = budget_env(tokens, deadline_env(PROBLEM_DEADLINE_SECONDS))
+    if profile:
+        env[PROFILE_DIR_ENV] = str(PROFILE_DIR / f"batch_{problems[0]['problem_id']}")
+
+    print(f"\n📦 Planning {', '.join(p['problem_id'] for p in problems)} in one request")
+    try:
+        run_stage("plan_batch", ["python", str(BATCH_PLANNER_SCRIPT), str(BATCH_PROBLEMS)], cwd=ROOT, env=env)
+    except (DeadlineExceeded, subprocess.CalledProcessError) as e:
+        print(f"⚠️  Batch planning failed, planning one by one: {e}")
+    finally:
+        record_batch_stats()
+
+
+def solve_problem(problem, profile=False):
+    pid = problem["problem_id"]
+    description = problem["description"]
+
+    # Once the run budget is spent the remaining problems are skipped
+    tokens = problem_token_budget()
+    scope = "problem" if tokens == PROBLEM_TOKEN_LIMIT else "run"
+    if tokens == 0:
+        BUDGET_EXCEEDED.inc(scope="run")
+        raise BudgetExceeded(f"run token budget of {RUN_TOKEN_LIMIT} used up")
+
+    # Child scripts read the deadline and token budget (and profile themselves when asked)
+    env = budget_env(tokens, deadline_env(PROBLEM_DEADLINE_SECONDS))
+    if profile:
+        env[PROFILE_DIR_ENV] = str(PROFILE_DIR / pid)
+
+    print(f"\n==============================")
+    print(f"🚀 Solving {pid}")
+    print(f"==============================")
+
+    # ------------------------------
+    # 1️⃣ Planner (LLM + Retry), unless the batch planner already solved it
+    # ------------------------------
+    batch_tree = BATCH_TREES_DIR / f"{pid}.json"
+    if batch_tree.exists():
+        print("📦 Using the tree from the batch request")
+        BLOCK_TREE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(batch_tree), str(BLOCK_TREE_PATH))
+    else:
+        PLANNER_STATS.unlink(missing_ok=True)
+        try:
+            run_stage(
+                "plan",
+                ["python", str(PLANNER_SCRIPT), description, str(PLANNER_CANDIDATES)],
+                cwd=ROOT,
+                env=env
+            )
+        except BudgetExceeded:
+            BUDGET_EXCEEDED.inc(scope=scope)
+            USAGE.setdefault(pid, new_usage())["budget_exceeded"] = scope
+            raise
+        finally:
+            record_planner_stats(pid)
+
+    if not BLOCK_TREE_PATH.exists():
+        raise RuntimeError("Planner failed: block_tree.json missing")
+
+    # ------------------------------
+    # 2️⃣ Generate XML
+    # ------------------------------
+    run_stage(
+        "assemble",
+        ["node", str(GENERATE_XML_SCRIPT)],
+        cwd=ASSEMBLER_DIR,
+        env=env
+    )
+
+    if not PROGRAM_XML_PATH.exists():
+        raise RuntimeError("XML generation failed")
+
+    # ------------------------------
+    # 3️⃣ Execute in CodeAsthram
+    # ------------------------------
+    RUNNER_TIMINGS.unlink(missing_ok=True)
+    run_stage(
+        "execute",
+        ["node", str(EXECUTE_XML_SCRIPT)],
+        cwd=SCRAPPER_DIR,
+        env=env
+    )
+    record_runner_timings()
+
+    # ------------------------------
+    # 4️⃣ Create Submission Folder
+    # ------------------------------
+    problem_dir = SUBMISSIONS_DIR / pid
+    problem_dir.mkdir(exist_ok=True)
+
+    xml_name = f"{TEAM_ID}_{ROLE}_{pid}.xml"
+    txt_name = f"{TEAM_ID}_{ROLE}_{pid}.txt"
+    bug_name = f"{TEAM_ID}_{ROLE}_{pid}_bug.txt"
+
+    safe_copy(PROGRAM_XML_PATH, problem_dir / xml_name)
+    safe_copy(RESULT_TXT, problem_dir / txt_name)
+
+    # Optional bug file
+    if RESULT_XML.exists():
+        safe_copy(RESULT_XML, problem_dir / bug_name)
+
+    print(f"✅ {pid} completed")
+
+
 # ------------------------------
 if __name__ == "__main__":
     main()
@@ -85,3 +85,43 @@ window.executeXML = async function (xmlText) {
     python: pythonCode,
   };
 };
+
+/**
+ * Many programs in one page.evaluate call. Each item is an XML string or
+ * {id, xml}; items run one after another through executeXML, so every
+ * program starts from a cleared workspace. An item that throws is
+ * reported as "exception" and the batch goes on.
+ *
+ * Returns {results: [{id, status, python, error, ms}], total_ms}.
+ */
+window.executeXMLBatch = async function (xmls) {
+  const batchStart = performance.now();
+  const results = [];
+
+  for (let i = 0; i < xmls.length; i++) {
+    const item = typeof xmls[i] === "string" ? { id: String(i), xml: xmls[i] } : xmls[i];
+    const start = performance.now();
+    let result;
+    try {
+      result = await window.executeXML(item.xml);
+    } catch (e) {
+      result = { status: "exception", error: String(e) };
+    }
+    results.push({
+      id: item.id,
+      status: result.status,
+      python: result.python || "",
+      error: result.error || "",
+      ms: Math.round(performance.now() - start),
+    });
+  }
+
+  // Leave nothing behind for the next batch
+  try {
+    Blockly.getMainWorkspace().clear();
+  } catch (e) {
+    // workspace problems were already reported per item
+  }
+
+  return { results, total_ms: Math.round(performance.now() - batchStart) };
+};
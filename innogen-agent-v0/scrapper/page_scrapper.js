@@ -5,7 +5,9 @@
  * Requires Blockly + Python generator to be already loaded.
  *
  * Exposes:
- *   window.scrapeBlock(blockMeta)
+ *   window.scrapeBlock(blockMeta, { render })
+ *   window.scrapePageVersion()
+ *   window.blockFingerprints(types)
  */
 
 (function () {
@@ -49,9 +51,64 @@
   }
 
   /**
-   * Core scraper
+   * Utility: FNV-1a hash of a string, as 8 hex chars
    */
-  window.scrapeBlock = async function ({ type, category, module }) {
+  function hashText(text) {
+    let hash = 0x811c9dc5;
+    for (let i = 0; i < text.length; i++) {
+      hash ^= text.charCodeAt(i);
+      hash = Math.imul(hash, 0x01000193);
+    }
+    return (hash >>> 0).toString(16).padStart(8, "0");
+  }
+
+  /**
+   * Version of the loaded site: Blockly version plus the (hashed) bundle URLs
+   */
+  window.scrapePageVersion = function () {
+    const scripts = Array.from(document.scripts)
+      .map((s) => s.src)
+      .filter(Boolean)
+      .sort();
+    const blocklyVersion = (window.Blockly && Blockly.VERSION) || "unknown";
+    return `${blocklyVersion}-${hashText(scripts.join("|"))}`;
+  };
+
+  /**
+   * Fingerprint of each block's definition and Python generator, so a
+   * refresh can skip blocks the site update did not touch.
+   * Returns { type: hash } (null for types the page does not define).
+   */
+  window.blockFingerprints = function (types) {
+    const describe = (value) =>
+      typeof value === "function" ? value.toString() : JSON.stringify(value);
+    const result = {};
+
+    for (const type of types) {
+      const definition = window.Blockly && Blockly.Blocks[type];
+      if (!definition) {
+        result[type] = null;
+        continue;
+      }
+
+      const parts = Object.keys(definition)
+        .sort()
+        .map((key) => `${key}:${describe(definition[key])}`);
+
+      const generator =
+        window.Python && ((Python.forBlock && Python.forBlock[type]) || Python[type]);
+      parts.push(`python:${generator ? generator.toString() : ""}`);
+
+      result[type] = hashText(parts.join("\n"));
+    }
+    return result;
+  };
+
+  /**
+   * Core scraper. render=false skips initSvg/render: XML and Python
+   * generation do not need the block drawn.
+   */
+  window.scrapeBlock = async function ({ type, category, module }, { render = true } = {}) {
     if (!window.Blockly || !window.Python) {
       return {
         type,
@@ -77,8 +134,10 @@
     let block;
     try {
       block = ws.newBlock(type);
-      block.initSvg();
-      block.render();
+      if (render) {
+        block.initSvg();
+        block.render();
+      }
     } catch (e) {
       return {
         type,
@@ -1,36 +1,162 @@
 import { chromium } from "playwright";
 import fs from "fs";
 
-const catalog = JSON.parse(
-  fs.readFileSync("block_catalog.json", "utf-8")
-);
+// --------------------
+// Usage:
+//   node runner.js [--workers=4] [--render] [--headed] [--force]
+//
+// Scrapes block_catalog.json across N headless pages (one browser context
+// each). Every result is appended to output/blocks_db.jsonl as soon as it
+// is scraped, keyed by block type and page version, with a fingerprint of
+// the block's definition. On the next run, blocks whose fingerprint is
+// unchanged are skipped, so a refresh after a site update only scrapes new
+// or changed blocks. output/blocks_db.json (read by normalize_blocks.js)
+// is rebuilt from the JSONL at the end.
+// --------------------
+const SITE_URL = "https://hackpy.tarcin.in/";
+const CATALOG_PATH = "block_catalog.json";
+const OUTPUT_DIR = "output";
+const JSONL_PATH = `${OUTPUT_DIR}/blocks_db.jsonl`;
+const DB_PATH = `${OUTPUT_DIR}/blocks_db.json`;
+const CHANGED_PATH = `${OUTPUT_DIR}/changed_blocks.json`;
 
-(async () => {
-  const browser = await chromium.launch({ headless: false });
-  const page = await browser.newPage();
+const args = process.argv.slice(2);
+const option = (name, fallback) => {
+  const arg = args.find((a) => a.startsWith(`--${name}=`));
+  return arg ? arg.split("=")[1] : fallback;
+};
+
+const WORKERS = Math.max(1, Number(option("workers", 4)));
+const RENDER = args.includes("--render"); // XML and Python do not need drawing
+const HEADED = args.includes("--headed");
+const FORCE = args.includes("--force");
+
+const catalog = JSON.parse(fs.readFileSync(CATALOG_PATH, "utf-8"));
+
+// --------------------
+// Previous results: last record per block type
+// --------------------
+function loadRecords() {
+  const records = new Map();
+  if (!fs.existsSync(JSONL_PATH)) return records;
+
+  for (const line of fs.readFileSync(JSONL_PATH, "utf-8").split("\n")) {
+    if (!line.trim()) continue;
+    try {
+      const record = JSON.parse(line);
+      records.set(record.type, record);
+    } catch {
+      // A line cut short by an interrupted run
+    }
+  }
+  return records;
+}
 
-  await page.goto("https://hackpy.tarcin.in/");
-  await page.waitForTimeout(5000);
+async function openPage(browser) {
+  const context = await browser.newContext();
+  const page = await context.newPage();
 
+  await page.goto(SITE_URL);
+  await page.waitForFunction(
+    () => window.Blockly && window.Python && window.Blockly.getMainWorkspace(),
+    null,
+    { timeout: 30000 }
+  );
   await page.addScriptTag({ path: "page_scrapper.js" });
+  return page;
+}
+
+(async () => {
+  const started = performance.now();
+  const records = loadRecords();
 
-  const results = [];
+  const browser = await chromium.launch({ headless: !HEADED });
+  const pages = await Promise.all(
+    Array.from({ length: Math.min(WORKERS, catalog.length) }, () => openPage(browser))
+  );
+
+  const pageVersion = await pages[0].evaluate(() => window.scrapePageVersion());
+  const fingerprints = await pages[0].evaluate(
+    (types) => window.blockFingerprints(types),
+    catalog.map((b) => b.type)
+  );
 
-  for (const block of catalog) {
-    const data = await page.evaluate(
-      (block) => window.scrapeBlock(block),
-      block
+  const isCurrent = (block) => {
+    const record = records.get(block.type);
+    return (
+      record &&
+      !record.error &&
+      record.fingerprint !== null &&
+      record.fingerprint === fingerprints[block.type]
     );
+  };
+  const todo = FORCE ? catalog : catalog.filter((block) => !isCurrent(block));
 
-    console.log("Scraped:", block.type);
-    results.push(data);
+  console.log(
+    `Page ${pageVersion}: ${todo.length} of ${catalog.length} blocks to scrape ` +
+      `(${WORKERS} pages${RENDER ? ", rendering" : ""})`
+  );
+
+  fs.mkdirSync(OUTPUT_DIR, { recursive: true });
+
+  // Workers pull from a shared index (Node is single-threaded, so no locking)
+  let next = 0;
+  let done = 0;
+  let failed = 0;
+
+  async function worker(page) {
+    while (next < todo.length) {
+      const block = todo[next++];
+      let data;
+      try {
+        data = await page.evaluate(
+          ([block, options]) => window.scrapeBlock(block, options),
+          [block, { render: RENDER }]
+        );
+      } catch (e) {
+        // Recorded as an error, so the next run retries it
+        data = { ...block, error: "Scrape failed", details: String(e) };
+      }
+
+      const record = {
+        ...data,
+        page_version: pageVersion,
+        fingerprint: fingerprints[block.type] ?? null,
+      };
+      fs.appendFileSync(JSONL_PATH, JSON.stringify(record) + "\n");
+      records.set(block.type, record);
+
+      done++;
+      if (record.error) failed++;
+      const rate = done / ((performance.now() - started) / 1000);
+      console.log(
+        `Scraped: ${block.type} (${done}/${todo.length}, ${rate.toFixed(1)} blocks/s)` +
+          (record.error ? ` ⚠️ ${record.error}` : "")
+      );
+    }
   }
 
-  fs.mkdirSync("output", { recursive: true });
-  fs.writeFileSync(
-    "output/blocks_db.json",
-    JSON.stringify(results, null, 2)
-  );
+  try {
+    await Promise.all(pages.map(worker));
+  } finally {
+    await browser.close();
+  }
+
+  // --------------------
+  // Compact the JSONL and rebuild blocks_db.json in catalog order
+  // --------------------
+  const latest = catalog.map((block) => records.get(block.type)).filter(Boolean);
 
-  await browser.close();
+  const tmpPath = `${JSONL_PATH}.tmp`;
+  fs.writeFileSync(tmpPath, latest.map((r) => JSON.stringify(r)).join("\n") + "\n");
+  fs.renameSync(tmpPath, JSONL_PATH);
+
+  fs.writeFileSync(DB_PATH, JSON.stringify(latest, null, 2));
+  fs.writeFileSync(CHANGED_PATH, JSON.stringify(todo.map((b) => b.type), null, 2));
+
+  const seconds = (performance.now() - started) / 1000;
+  console.log(
+    `✅ ${done} scraped, ${catalog.length - todo.length} unchanged, ${failed} failed ` +
+      `in ${seconds.toFixed(1)}s`
+  );
 })();
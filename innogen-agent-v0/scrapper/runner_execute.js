@@ -70,6 +70,10 @@ const EXECUTE_XML_SCRIPT = path.resolve(__dirname, "execute_xml.js");
 const OUTPUT_DIR = path.resolve(__dirname, "output");
 const RESULT_XML = path.join(OUTPUT_DIR, "result.xml");
 const RESULT_TXT = path.join(OUTPUT_DIR, "result.txt");
+const TIMINGS_JSON = path.join(OUTPUT_DIR, "timings.json"); // read by main.py for metrics
+
+// Problem deadline (epoch seconds, set by main.py): close the browser before it passes
+const DEADLINE_MS = Number(process.env.PROBLEM_DEADLINE || 0) * 1000;
 
 // --------------------
 // Read XML generated by assembler
@@ -85,17 +89,36 @@ const xmlText = fs.readFileSync(XML_INPUT_PATH, "utf-8");
 // Execute in Chromium
 // --------------------
 (async () => {
+  const timings = {};
+
+  let phaseStart = performance.now();
   const browser = await chromium.launch({ headless: false });
   const page = await browser.newPage();
-
+  timings.browser_launch_ms = Math.round(performance.now() - phaseStart);
+
+  let watchdog = null;
+  if (DEADLINE_MS) {
+    const left = DEADLINE_MS - Date.now();
+    page.setDefaultTimeout(Math.max(left, 1));
+    watchdog = setTimeout(async () => {
+      console.error("⏰ Deadline reached - closing browser");
+      await browser.close().catch(() => {});
+      process.exit(124);
+    }, Math.max(left - 1000, 0));
+  }
+
+  phaseStart = performance.now();
   await page.goto("https://hackpy.tarcin.in/");
   await page.waitForTimeout(6000); // wait for Blockly to load
+  timings.page_ready_ms = Math.round(performance.now() - phaseStart);
 
   // Inject execute_xml.js into page
   await page.addScriptTag({ path: EXECUTE_XML_SCRIPT });
 
   // Execute XML inside browser context
+  phaseStart = performance.now();
   const result = await page.evaluate((xml) => window.executeXML(xml), xmlText);
+  timings.execute_ms = Math.round(performance.now() - phaseStart);
 
   // --------------------
   // Save outputs
@@ -103,9 +126,11 @@ const xmlText = fs.readFileSync(XML_INPUT_PATH, "utf-8");
   fs.mkdirSync(OUTPUT_DIR, { recursive: true });
   fs.writeFileSync(RESULT_XML, xmlText, "utf-8");
   fs.writeFileSync(RESULT_TXT, result?.python || "", "utf-8");
+  fs.writeFileSync(TIMINGS_JSON, JSON.stringify(timings, null, 2), "utf-8");
 
   console.log("✅ Execution completed");
   console.log("Python output saved:", RESULT_TXT);
 
+  clearTimeout(watchdog);
   await browser.close();
 })();
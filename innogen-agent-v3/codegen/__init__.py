@@ -0,0 +1 @@
+# Codegen Module
\ No newline at end of file
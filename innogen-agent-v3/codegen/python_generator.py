@@ -0,0 +1,671 @@
+"""
+Offline Python Code Generator
+
+Turns block trees (v0 and v3 share the same format) into Python without a
+browser. Each block type gets a template compiled from its `python_sample`
+and `xml_template` in normalized_blocks.json: field defaults become field
+slots, default literals become value slots and `pass` becomes a statement
+slot. Rendering mirrors the Blockly Python generator: safe variable names,
+a `name = None` declaration header and operator-precedence parentheses.
+
+The browser stays the authoritative run. The differential mode compares
+this output with captured browser output (execution_output/result.txt) to
+flag where the two disagree.
+
+Usage:
+    python -m codegen.python_generator outputs/Problem_PID-0006/block_tree.json
+    python -m codegen.python_generator TREE.json --compare result.txt
+    python -m codegen.python_generator --outputs outputs
+"""
+
+import argparse
+import difflib
+import html
+import json
+import re
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+from urllib.parse import quote
+
+from semantic.blocks import Block
+
+DEFAULT_CATALOG = Path(__file__).parent.parent / "data" / "normalized_blocks.json"
+
+# Blockly Python operator precedence (python_generator.Order)
+ORDER_ATOMIC = 0
+ORDER_COLLECTION = 1
+ORDER_MEMBER = 2.1
+ORDER_FUNCTION_CALL = 2.2
+ORDER_EXPONENTIATION = 3
+ORDER_UNARY_SIGN = 4
+ORDER_MULTIPLICATIVE = 5
+ORDER_ADDITIVE = 6
+ORDER_BITWISE_SHIFT = 7
+ORDER_BITWISE_AND = 8
+ORDER_BITWISE_XOR = 9
+ORDER_BITWISE_OR = 10
+ORDER_RELATIONAL = 11
+ORDER_LOGICAL_NOT = 12
+ORDER_LOGICAL_AND = 13
+ORDER_LOGICAL_OR = 14
+ORDER_CONDITIONAL = 15
+ORDER_LAMBDA = 16
+ORDER_NONE = 99
+
+# Pairs (outer, inner) that never need parentheses
+ORDER_OVERRIDES = {
+    (ORDER_FUNCTION_CALL, ORDER_MEMBER),
+    (ORDER_FUNCTION_CALL, ORDER_FUNCTION_CALL),
+    (ORDER_MEMBER, ORDER_MEMBER),
+    (ORDER_MEMBER, ORDER_FUNCTION_CALL),
+    (ORDER_LOGICAL_NOT, ORDER_LOGICAL_NOT),
+    (ORDER_LOGICAL_AND, ORDER_LOGICAL_AND),
+    (ORDER_LOGICAL_OR, ORDER_LOGICAL_OR),
+}
+
+# Binary operator precedence, strongest last wins when scanning a template
+OPERATOR_ORDER = {
+    "or": ORDER_LOGICAL_OR,
+    "and": ORDER_LOGICAL_AND,
+    "==": ORDER_RELATIONAL, "!=": ORDER_RELATIONAL, "<": ORDER_RELATIONAL,
+    "<=": ORDER_RELATIONAL, ">": ORDER_RELATIONAL, ">=": ORDER_RELATIONAL,
+    "in": ORDER_RELATIONAL, "is": ORDER_RELATIONAL,
+    "|": ORDER_BITWISE_OR,
+    "^": ORDER_BITWISE_XOR,
+    "&": ORDER_BITWISE_AND,
+    "<<": ORDER_BITWISE_SHIFT, ">>": ORDER_BITWISE_SHIFT,
+    "+": ORDER_ADDITIVE, "-": ORDER_ADDITIVE,
+    "*": ORDER_MULTIPLICATIVE, "/": ORDER_MULTIPLICATIVE,
+    "//": ORDER_MULTIPLICATIVE, "%": ORDER_MULTIPLICATIVE,
+    "**": ORDER_EXPONENTIATION,
+}
+
+# OP field values used by the catalog and the compilers
+OPERATOR_SYMBOLS = {
+    "ADD": "+", "MINUS": "-", "MULTIPLY": "*", "DIVIDE": "/",
+    "POWER": "**", "MODULO": "%", "FLOOR_DIVIDE": "//",
+    "EQ": "==", "NEQ": "!=", "LT": "<", "LTE": "<=", "GT": ">", "GTE": ">=",
+    "AND": "and", "OR": "or",
+}
+
+STATEMENT_KEYWORDS = {"if", "elif", "while", "for", "return", "raise", "assert",
+                      "del", "with", "try", "def", "class", "import", "from",
+                      "global", "nonlocal", "break", "continue", "pass"}
+
+# Reserved words of the Blockly Python generator (keywords and builtins)
+RESERVED_WORDS = set((
+    "False,None,True,and,as,assert,break,class,continue,def,del,elif,else,"
+    "except,exec,finally,for,from,global,if,import,in,is,lambda,nonlocal,not,"
+    "or,pass,print,raise,return,try,while,with,yield,NotImplemented,Ellipsis,"
+    "__debug__,quit,exit,copyright,license,credits,ArithmeticError,"
+    "AssertionError,AttributeError,BaseException,BlockingIOError,"
+    "BrokenPipeError,BufferError,BytesWarning,ChildProcessError,"
+    "ConnectionAbortedError,ConnectionError,ConnectionRefusedError,"
+    "ConnectionResetError,DeprecationWarning,EOFError,EnvironmentError,"
+    "Exception,FileExistsError,FileNotFoundError,FloatingPointError,"
+    "FutureWarning,GeneratorExit,IOError,ImportError,ImportWarning,"
+    "IndentationError,IndexError,InterruptedError,IsADirectoryError,KeyError,"
+    "KeyboardInterrupt,LookupError,MemoryError,ModuleNotFoundError,NameError,"
+    "NotADirectoryError,NotImplementedError,OSError,OverflowError,"
+    "PendingDeprecationWarning,PermissionError,ProcessLookupError,"
+    "RecursionError,ReferenceError,ResourceWarning,RuntimeError,"
+    "RuntimeWarning,StandardError,StopAsyncIteration,StopIteration,"
+    "SyntaxError,SyntaxWarning,SystemError,SystemExit,TabError,TimeoutError,"
+    "TypeError,UnboundLocalError,UnicodeDecodeError,UnicodeEncodeError,"
+    "UnicodeError,UnicodeTranslateError,UnicodeWarning,UserWarning,ValueError,"
+    "Warning,ZeroDivisionError,_,__build_class__,__doc__,__import__,"
+    "__loader__,__name__,__package__,__spec__,abs,all,any,apply,ascii,"
+    "basestring,bin,bool,buffer,bytearray,bytes,callable,chr,classmethod,cmp,"
+    "coerce,compile,complex,delattr,dict,dir,divmod,enumerate,eval,execfile,"
+    "file,filter,float,format,frozenset,getattr,globals,hasattr,hash,help,hex,"
+    "id,input,int,intern,isinstance,issubclass,iter,len,list,locals,long,map,"
+    "max,memoryview,min,next,object,oct,open,ord,pow,property,range,raw_input,"
+    "reduce,reload,repr,reversed,round,set,setattr,slice,sorted,staticmethod,"
+    "str,sum,super,tuple,type,unichr,unicode,vars,xrange,zip,"
+    "math,random,Number"
+).split(","))
+
+TOKEN_RE = re.compile(r"""
+     (?P<string>'(?:\\.|[^'\\])*'|"(?:\\.|[^"\\])*")
+    |(?P<number>\d+(?:\.\d+)?)
+    |(?P<name>[A-Za-z_]\w*)
+    |(?P<op>\*\*|//|==|!=|<=|>=|<<|>>|[-+*/%<>=&|^~.,:;@])
+    |(?P<open>[(\[{])
+    |(?P<close>[)\]}])
+    |(?P<newline>\n)
+    |(?P<space>[ \t]+)
+    |(?P<other>.)
+""", re.X)
+
+FIELD_RE = re.compile(r'<field name="([^"]+)"[^>]*>(.*?)</field>', re.S)
+
+DEFAULT_LITERALS = {"None", "False", "True"}
+
+# Input names confirmed against captured browser output. The scraped
+# catalog only lists inputs that were connected when it was scraped, so
+# most blocks have no input names there.
+CONFIRMED_INPUTS = {
+    "essentials_var_set": ["VALUE"],
+    "essentials_num_arithmetic": ["A", "B"],
+    "essentials_compare": ["A", "B"],
+    "essentials_logic_and": ["A", "B"],
+    "essentials_logic_or": ["A", "B"],
+    "control_if_truthy": ["EXPR"],
+}
+
+
+class CodegenError(Exception):
+    """Raised when a block tree cannot be rendered."""
+
+
+class Slot:
+    """A hole in a block template."""
+
+    __slots__ = ("kind", "key", "order", "indent", "default")
+
+    def __init__(self, kind: str, key, order: float = ORDER_NONE, indent: str = "", default: str = ""):
+        self.kind = kind        # field | value | statement
+        self.key = key          # field name, or positional index for inputs
+        self.order = order      # precedence the slot imposes on its content
+        self.indent = indent    # indentation of a statement slot
+        self.default = default  # catalog text used when nothing fills the slot
+
+
+class BlockTemplate:
+    """Compiled python_sample of one block type."""
+
+    def __init__(self, block_type: str, parts: List[Any], order: float,
+                 imports: List[str], field_kinds: Dict[str, str], known_inputs: List[str]):
+        self.block_type = block_type
+        self.known_inputs = known_inputs
+        self.parts = parts
+        self.order = order
+        self.imports = imports
+        self.field_kinds = field_kinds
+        self.value_slots = sum(1 for p in parts if isinstance(p, Slot) and p.kind == "value")
+        self.statement_slots = sum(1 for p in parts if isinstance(p, Slot) and p.kind == "statement")
+
+
+# -------------------------
+# Template compilation
+# -------------------------
+def _tokenize(text: str) -> List[Tuple[str, str]]:
+    return [(m.lastgroup, m.group()) for m in TOKEN_RE.finditer(text)]
+
+
+def _split_definitions(sample: str) -> Tuple[List[str], str]:
+    """Separate the definitions header (imports, declarations) from the code."""
+    if "\n\n\n" not in sample:
+        return [], sample.strip("\n")
+    header, body = sample.split("\n\n\n", 1)
+    imports = [line for line in header.splitlines()
+               if re.match(r"^(from\s+\S+\s+)?import\s+\S+", line)]
+    return imports, body.strip("\n")
+
+
+def _expression_order(tokens: List[Tuple[str, str]], skip: set) -> float:
+    """Precedence of an expression from its depth-0 tokens."""
+    significant = [(i, kind, text) for i, (kind, text) in enumerate(tokens)
+                   if kind not in {"space", "newline"}]
+    if not significant:
+        return ORDER_ATOMIC
+
+    depth = 0
+    weakest = None
+    previous = None
+    wrapped = significant[0][1] == "open"
+
+    for position, (i, kind, text) in enumerate(significant):
+        if kind == "close":
+            depth -= 1
+            if depth == 0 and position != len(significant) - 1:
+                wrapped = False
+        if depth == 0 and i not in skip:
+            if text == "lambda":
+                return ORDER_LAMBDA
+            if kind == "name" and text == "if" and previous is not None:
+                weakest = max(weakest or 0, ORDER_CONDITIONAL)
+            elif kind in {"op", "name"} and text in OPERATOR_ORDER:
+                # A sign after nothing or after another operator is unary
+                unary = text in {"-", "+"} and (previous is None or previous[0] == "op")
+                if not unary:
+                    weakest = max(weakest or 0, OPERATOR_ORDER[text])
+        if depth == 0:
+            previous = (kind, text)
+        if kind == "open":
+            depth += 1
+
+    if weakest is not None:
+        return weakest
+
+    first_kind, first = significant[0][1:]
+    last_kind, last = significant[-1][1:]
+    if first == "not":
+        return ORDER_LOGICAL_NOT
+    if first in {"-", "+", "~"}:
+        return ORDER_UNARY_SIGN
+    if last_kind == "close" and not wrapped:
+        return ORDER_FUNCTION_CALL if last == ")" else ORDER_MEMBER
+    if any(kind == "op" and text == "." for kind, text in tokens):
+        return ORDER_MEMBER
+    return ORDER_ATOMIC
+
+
+def compile_template(block: Dict[str, Any]) -> BlockTemplate:
+    """Compile one catalog entry into a BlockTemplate."""
+    imports, body = _split_definitions(block.get("python_sample") or "")
+    tokens = _tokenize(body)
+
+    fields = [(name, html.unescape(default))
+              for name, default in FIELD_RE.findall(block.get("xml_template") or "")]
+
+    claimed: Dict[int, Slot] = {}
+    field_kinds: Dict[str, str] = {}
+
+    # 1. Field slots: locate each field's default value in the sample
+    for name, default in fields:
+        symbol = OPERATOR_SYMBOLS.get(default)
+        for i, (kind, text) in enumerate(tokens):
+            if i in claimed:
+                continue
+            if symbol is not None and text == symbol and kind in {"op", "name"}:
+                field_kinds[name] = "operator"
+            elif default and text == default and kind in {"name", "number"}:
+                field_kinds[name] = "variable" if name == "VAR" else ("number" if kind == "number" else "raw")
+            elif not default and kind == "string" and text in {"''", '""'}:
+                field_kinds[name] = "string"
+            else:
+                continue
+            claimed[i] = Slot("field", name, default=text)
+            break
+
+    # 2. Value and statement slots: remaining default literals and `pass`
+    parts: List[Any] = []
+    value_index = 0
+    statement_index = 0
+    depth = 0
+    line_indent = ""
+    is_statement_line = False
+    assignment_seen = False
+    at_line_start = True
+    i = 0
+
+    block_order = _expression_order(tokens, set(claimed))
+
+    while i < len(tokens):
+        kind, text = tokens[i]
+
+        if kind == "newline":
+            at_line_start = True
+            line_indent = ""
+            is_statement_line = False
+            assignment_seen = False
+            parts.append(text)
+            i += 1
+            continue
+
+        if at_line_start and kind == "space":
+            line_indent = text
+            parts.append(text)
+            i += 1
+            continue
+
+        if at_line_start:
+            is_statement_line = kind == "name" and text in STATEMENT_KEYWORDS
+            at_line_start = False
+
+        if depth == 0 and kind == "op" and text == "=":
+            assignment_seen = True
+
+        if i in claimed:
+            parts.append(claimed[i])
+            i += 1
+            continue
+
+        empty_collection = (kind == "open" and i + 1 < len(tokens) and tokens[i + 1][0] == "close")
+        is_literal = (
+            (kind == "name" and text in DEFAULT_LITERALS)
+            or kind in {"number", "string"}
+            or empty_collection
+        )
+
+        if kind == "name" and text == "pass":
+            parts.append(Slot("statement", statement_index, indent=line_indent, default="pass"))
+            statement_index += 1
+            i += 1
+            continue
+
+        if is_literal:
+            if depth > 0 or is_statement_line:
+                slot_order = ORDER_NONE
+            elif assignment_seen:
+                # Blockly-on-page wraps assigned values unless atomic
+                # (captured output: "total = (a + b)", "x = y")
+                slot_order = ORDER_ATOMIC
+            else:
+                slot_order = block_order
+            default = text + tokens[i + 1][1] if empty_collection else text
+            parts.append(Slot("value", value_index, order=slot_order, default=default))
+            value_index += 1
+            i += 2 if empty_collection else 1
+            continue
+
+        if kind == "open":
+            depth += 1
+        elif kind == "close":
+            depth -= 1
+
+        parts.append(text)
+        i += 1
+
+    known_inputs = list(dict.fromkeys(
+        CONFIRMED_INPUTS.get(block["type"], [])
+        + list(block.get("value_inputs") or {})
+        + list(block.get("statement_inputs") or {})
+    ))
+
+    return BlockTemplate(block["type"], parts, block_order, imports, field_kinds, known_inputs)
+
+
+# -------------------------
+# Rendering
+# -------------------------
+def needs_parens(outer: float, inner: float) -> bool:
+    """Blockly's valueToCode parenthesization rule."""
+    if outer > inner:
+        return False
+    if outer == inner and outer in {ORDER_ATOMIC, ORDER_NONE}:
+        return False
+    return (outer, inner) not in ORDER_OVERRIDES
+
+
+def quote_python(text: str) -> str:
+    """Blockly's Python string quoting."""
+    text = text.replace("\\", "\\\\").replace("\n", "\\\n")
+    quote_char = "'"
+    if "'" in text:
+        if '"' not in text:
+            quote_char = '"'
+        else:
+            text = text.replace("'", "\\'")
+    return quote_char + text + quote_char
+
+
+def format_number(text: str) -> str:
+    try:
+        value = float(text)
+    except (TypeError, ValueError):
+        return str(text)
+    if value.is_integer() and "e" not in str(text).lower():
+        return str(int(value))
+    return repr(value)
+
+
+class VariableNames:
+    """Blockly-style safe, distinct variable names."""
+
+    def __init__(self):
+        self.by_name: Dict[str, str] = {}
+        self.used: set = set()
+
+    def get(self, name: str) -> str:
+        if name in self.by_name:
+            return self.by_name[name]
+
+        safe = quote(str(name).replace(" ", "_"), safe=";,/?:@&=+$-_.!~*'()#")
+        safe = re.sub(r"[^\w]", "_", safe, flags=re.ASCII) or "unnamed"
+        if safe[0].isdigit():
+            safe = "my_" + safe
+
+        candidate, suffix = safe, 1
+        while candidate in self.used or candidate in RESERVED_WORDS:
+            suffix += 1
+            candidate = f"{safe}{suffix}"
+
+        self.used.add(candidate)
+        self.by_name[name] = candidate
+        return candidate
+
+
+class PythonGenerator:
+    """
+    Renders block trees to Python using templates compiled from the catalog.
+
+    In strict mode, inputs whose names are not known for the block are
+    dropped, as Blockly does when loading XML; use it when comparing with
+    the browser. Otherwise inputs fill slots positionally, which previews
+    what the tree intends.
+
+    Usage:
+        generator = PythonGenerator()
+        result = generator.generate(block_tree)
+        print(result["python"])
+    """
+
+    def __init__(self, catalog_path: Optional[str] = None, strict_inputs: bool = False):
+        self.strict_inputs = strict_inputs
+        path = Path(catalog_path) if catalog_path else DEFAULT_CATALOG
+        if not path.exists():
+            raise FileNotFoundError(f"Blocks file not found: {path}")
+        with path.open("r", encoding="utf-8") as f:
+            blocks = json.load(f)
+        self.templates = {b["type"]: compile_template(b) for b in blocks}
+
+    def generate(self, tree: Union[Block, Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Args:
+            tree: Block tree, as a Block or its JSON dict
+
+        Returns:
+            {"python": str, "warnings": [str, ...]}
+        """
+        state = {
+            "names": VariableNames(),
+            "statement_vars": [],
+            "expression_vars": [],
+            "imports": [],
+            "warnings": [],
+        }
+        if isinstance(tree, Block):
+            tree = tree.to_dict()
+        code = self._statements(tree, state)
+
+        # Declarations: variables set by statements first, then the rest
+        declared = []
+        for name in state["statement_vars"] + state["expression_vars"]:
+            safe = state["names"].get(name)
+            if safe not in declared:
+                declared.append(safe)
+
+        definitions = "\n".join(f"{name} = None" for name in declared)
+        header = "\n".join(dict.fromkeys(state["imports"]))
+        if header or definitions:
+            header = (header + "\n\n" + definitions).strip("\n")
+            header = re.sub(r"\n\n+", "\n\n", header) + "\n\n\n"
+
+        return {"python": header + code, "warnings": state["warnings"]}
+
+    def _template(self, node: Dict[str, Any]) -> BlockTemplate:
+        if not isinstance(node, dict) or not node.get("type"):
+            raise CodegenError(f"Invalid block node: {node!r}")
+        template = self.templates.get(node["type"])
+        if template is None:
+            raise CodegenError(f"Unknown block type: {node['type']}")
+        return template
+
+    def _statements(self, node: Optional[Dict[str, Any]], state: Dict[str, Any]) -> str:
+        """Render a `next` chain in statement context."""
+        code = ""
+        while node:
+            text, _ = self._render(node, state, statement=True)
+            code += text.rstrip("\n") + "\n"
+            node = node.get("next")
+        return code
+
+    def _render(self, node: Dict[str, Any], state: Dict[str, Any], statement: bool) -> Tuple[str, float]:
+        template = self._template(node)
+        state["imports"].extend(template.imports)
+
+        fields = node.get("fields") or {}
+        values = self._inputs(node, template, "value_inputs", state)
+        statements = self._inputs(node, template, "statement_inputs", state)
+
+        for name, _ in values[template.value_slots:]:
+            state["warnings"].append(
+                f"{node['type']}: value input '{name}' has no slot in the catalog sample (dropped)")
+        for name, _ in statements[template.statement_slots:]:
+            state["warnings"].append(
+                f"{node['type']}: statement input '{name}' has no slot in the catalog sample (dropped)")
+
+        order = template.order
+        out = []
+        for part in template.parts:
+            if not isinstance(part, Slot):
+                out.append(part)
+            elif part.kind == "field":
+                text, op_order = self._field(template, part, fields, state, statement)
+                if op_order is not None:
+                    order = op_order
+                out.append(text)
+            elif part.kind == "value":
+                if part.key < len(values):
+                    child_code, child_order = self._render(values[part.key][1], state, statement=False)
+                    if needs_parens(part.order, child_order):
+                        child_code = f"({child_code})"
+                    out.append(child_code)
+                else:
+                    out.append(part.default)
+            else:
+                body = ""
+                if part.key < len(statements):
+                    body = self._statements(statements[part.key][1], state).rstrip("\n")
+                lines = (body or "pass").split("\n")
+                out.append(("\n" + part.indent).join(lines))
+
+        return "".join(out), order
+
+    def _inputs(self, node: Dict[str, Any], template: BlockTemplate,
+                key: str, state: Dict[str, Any]) -> List[Tuple[str, Any]]:
+        """Inputs in slot order; known names first in their catalog order."""
+        inputs = list((node.get(key) or {}).items())
+        known = template.known_inputs
+
+        if self.strict_inputs:
+            for name, _ in inputs:
+                if name not in known:
+                    kind = key.split("_")[0]
+                    state["warnings"].append(
+                        f"{node['type']}: {kind} input '{name}' is not a known input (dropped)")
+            inputs = [(name, child) for name, child in inputs if name in known]
+
+        return sorted(inputs, key=lambda item: known.index(item[0]) if item[0] in known else len(known))
+
+    def _field(self, template: BlockTemplate, slot: Slot, fields: Dict[str, Any],
+               state: Dict[str, Any], statement: bool) -> Tuple[str, Optional[float]]:
+        kind = template.field_kinds.get(slot.key, "raw")
+        if slot.key not in fields:
+            return slot.default, None
+
+        value = str(fields[slot.key])
+        if kind == "variable":
+            state["statement_vars" if statement else "expression_vars"].append(value)
+            return state["names"].get(value), None
+        if kind == "operator":
+            symbol = OPERATOR_SYMBOLS.get(value, value)
+            return symbol, OPERATOR_ORDER.get(symbol)
+        if kind == "string":
+            return quote_python(value), None
+        if kind == "number":
+            return format_number(value), None
+        return value, None
+
+
+# -------------------------
+# Differential mode
+# -------------------------
+def normalize_output(text: str) -> List[str]:
+    """Lines with trailing whitespace and blank edges removed."""
+    return [line.rstrip() for line in text.strip("\n").splitlines()]
+
+
+def compare_with_browser(generated: str, captured: str) -> Dict[str, Any]:
+    """Compare offline output with captured browser output."""
+    ours = normalize_output(generated)
+    theirs = normalize_output(captured)
+    diff = list(difflib.unified_diff(theirs, ours, "browser", "offline", lineterm=""))
+    return {"match": not diff, "diff": diff}
+
+
+def diff_outputs_dir(generator: PythonGenerator, outputs_dir: Path) -> List[Dict[str, Any]]:
+    """Run the differential check over every Problem_*/block_tree.json."""
+    results = []
+    for tree_path in sorted(outputs_dir.glob("*/block_tree.json")):
+        captured = tree_path.parent / "execution_output" / "result.txt"
+        entry = {"problem": tree_path.parent.name}
+        try:
+            generated = generator.generate(json.loads(tree_path.read_text()))
+        except CodegenError as e:
+            entry.update(status="error", error=str(e))
+            results.append(entry)
+            continue
+
+        entry["warnings"] = generated["warnings"]
+        if not captured.exists():
+            entry["status"] = "no_capture"
+        else:
+            comparison = compare_with_browser(generated["python"], captured.read_text())
+            entry["status"] = "match" if comparison["match"] else "mismatch"
+            entry["diff"] = comparison["diff"]
+        results.append(entry)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline Python generator for block trees")
+    parser.add_argument("tree", nargs="?", help="block_tree.json to render")
+    parser.add_argument("--catalog", default=None, help="normalized_blocks.json (defaults to v3 data/)")
+    parser.add_argument("--compare", default=None, help="Captured browser result.txt to diff against")
+    parser.add_argument("--outputs", default=None, help="Diff every Problem_*/ under this outputs directory")
+    parser.add_argument("--strict", action="store_true", help="Drop inputs not known for a block, like the browser")
+    args = parser.parse_args()
+
+    # Comparisons with the browser need its input-dropping behavior
+    generator = PythonGenerator(args.catalog, strict_inputs=bool(args.outputs or args.compare or args.strict))
+
+    if args.outputs:
+        results = diff_outputs_dir(generator, Path(args.outputs))
+        for entry in results:
+            icon = {"match": "✅", "mismatch": "❌", "no_capture": "➖", "error": "💥"}[entry["status"]]
+            print(f"{icon} {entry['problem']}: {entry['status']}")
+            for warning in entry.get("warnings", []):
+                print(f"   ⚠️ {warning}")
+            for line in entry.get("diff", []):
+                print(f"   {line}")
+            if entry.get("error"):
+                print(f"   {entry['error']}")
+        matched = sum(1 for e in results if e["status"] == "match")
+        print(f"\n📊 {matched}/{len(results)} problems match the browser output")
+        sys.exit(0 if matched == len(results) else 1)
+
+    if not args.tree:
+        parser.error("either a block tree path or --outputs is required")
+
+    tree = json.loads(Path(args.tree).read_text())
+    result = generator.generate(tree)
+    print(result["python"], end="")
+    for warning in result["warnings"]:
+        print(f"⚠️ {warning}", file=sys.stderr)
+
+    if args.compare:
+        comparison = compare_with_browser(result["python"], Path(args.compare).read_text())
+        if comparison["match"]:
+            print("✅ Matches browser output", file=sys.stderr)
+        else:
+            print("❌ Differs from browser output:", file=sys.stderr)
+            print("\n".join(comparison["diff"]), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
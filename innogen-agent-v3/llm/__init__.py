@@ -0,0 +1 @@
+# LLM Module
\ No newline at end of file
@@ -0,0 +1,317 @@
+"""
+LLM Backends
+
+One interface for every chat-completion provider the planner can use:
+
+    chat(messages, **options)     one completion (OpenAI ChatCompletion)
+    stream(messages, **options)   the completion's text, chunk by chunk
+    batch(conversations, ...)     many completions, concurrently
+
+Implementations:
+    openrouter  the OpenRouter API (OPENROUTER_API_KEY, OPENROUTER_BASE_URL)
+    local       any OpenAI-compatible server, e.g. llama.cpp's llama-server
+                running a small quantized model on CPU (LLM_BASE_URL)
+    fake        in-process synthetic plans (see llm/stub_server.py); no
+                network, no key, for tests and offline load runs
+
+Selected with LLM_BACKEND (default openrouter); LLM_MODEL and LLM_BASE_URL
+override the backend's model and endpoint. Every backend keeps its own
+latency and token-throughput figures (backend.report()).
+
+Usage:
+    llama-server -m qwen2.5-1.5b-instruct-q4_k_m.gguf --parallel 4 --port 8080
+    LLM_BACKEND=local python main.py --pipeline --plan-workers 4
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+
+from openai import OpenAI
+from openai.types.chat import ChatCompletion
+
+from llm.stub_server import (
+    STREAM_CHUNK_CHARS,
+    SyntheticPlanner,
+    completion_response,
+    estimate_tokens,
+    prompt_hash,
+)
+
+DEFAULT_MODEL = "meta-llama/llama-3-8b-instruct"
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+# llama-server's default port; --parallel sets how many requests it decodes at once
+LOCAL_BASE_URL = "http://127.0.0.1:8080/v1"
+LOCAL_PARALLEL = 4
+
+BATCH_WORKERS = 8
+
+
+class BackendError(Exception):
+    """Raised when a backend is unknown or not configured."""
+
+
+class BackendStats:
+    """Latency and token throughput of one backend's requests."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.first_token_seconds = 0.0
+        self.streams = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, prompt_tokens: int = 0, completion_tokens: int = 0,
+               first_token: Optional[float] = None):
+        with self._lock:
+            self.requests += 1
+            self.seconds += seconds
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            if first_token is not None:
+                self.streams += 1
+                self.first_token_seconds += first_token
+
+    def record_error(self, seconds: float):
+        with self._lock:
+            self.errors += 1
+            self.seconds += seconds
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            answered = max(1, self.requests)
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "latency_mean_s": round(self.seconds / max(1, self.requests + self.errors), 3),
+                "first_token_mean_s": round(self.first_token_seconds / self.streams, 3) if self.streams else None,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                # Per request in flight; concurrent requests add up
+                "completion_tokens_per_s": round(self.completion_tokens / self.seconds, 1) if self.seconds else 0.0,
+                "completion_tokens_per_request": round(self.completion_tokens / answered, 1),
+            }
+
+
+class ChatBackend:
+    """Base class: subclasses implement _complete and _stream."""
+
+    name = "base"
+
+    def __init__(self, model: str):
+        self.model = model
+        self.stats = BackendStats()
+
+    @property
+    def key(self) -> str:
+        """Identifies the endpoint (e.g. for remembering rejected options)"""
+        return f"{self.name}:{self.model}"
+
+    def chat(self, messages: List[Dict[str, Any]], **options) -> ChatCompletion:
+        start = time.perf_counter()
+        try:
+            response = self._complete(messages, **options)
+        except Exception:
+            self.stats.record_error(time.perf_counter() - start)
+            raise
+        usage = getattr(response, "usage", None)
+        self.stats.record(
+            time.perf_counter() - start,
+            getattr(usage, "prompt_tokens", 0) or 0,
+            getattr(usage, "completion_tokens", 0) or 0,
+        )
+        return response
+
+    def stream(self, messages: List[Dict[str, Any]], **options) -> Iterator[str]:
+        """Closing the generator early cancels the request."""
+        start = time.perf_counter()
+        first_token = None
+        text = []
+        failed = False
+        chunks = self._stream(messages, **options)
+        try:
+            for delta in chunks:
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                text.append(delta)
+                yield delta
+        except Exception:
+            failed = True
+            self.stats.record_error(time.perf_counter() - start)
+            raise
+        finally:
+            chunks.close()
+            if not failed:
+                prompt = "".join(str(m.get("content", "")) for m in messages)
+                self.stats.record(
+                    time.perf_counter() - start,
+                    estimate_tokens(prompt),
+                    estimate_tokens("".join(text)),
+                    first_token=first_token or 0.0,
+                )
+
+    def batch(self, conversations: List[List[Dict[str, Any]]], max_workers: Optional[int] = None,
+              **options) -> List[Any]:
+        """
+        Completions for many conversations, in order. A failed conversation
+        gets its exception in place of a completion, so one error does not
+        discard the rest of the batch.
+        """
+        def one(messages):
+            try:
+                return self.chat(messages, **options)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=max_workers or self.batch_workers) as pool:
+            return list(pool.map(one, conversations))
+
+    @property
+    def batch_workers(self) -> int:
+        return BATCH_WORKERS
+
+    def report(self) -> Dict[str, Any]:
+        return {"backend": self.name, "model": self.model, **self.stats.report()}
+
+    def _complete(self, messages: List[Dict[str, Any]], **options) -> ChatCompletion:
+        raise NotImplementedError
+
+    def _stream(self, messages: List[Dict[str, Any]], **options) -> Iterator[str]:
+        raise NotImplementedError
+
+
+class OpenAICompatibleBackend(ChatBackend):
+    """Any server speaking the OpenAI chat-completions API."""
+
+    name = "openai"
+
+    def __init__(self, base_url: str, api_key: str, model: str):
+        super().__init__(model)
+        self.base_url = base_url
+        # Retries are handled by llm.limiter.call_with_retries
+        self.client = OpenAI(base_url=base_url, api_key=api_key, max_retries=0)
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}:{self.base_url}"
+
+    def _complete(self, messages: List[Dict[str, Any]], **options) -> ChatCompletion:
+        return self.client.chat.completions.create(model=self.model, messages=messages, **options)
+
+    def _stream(self, messages: List[Dict[str, Any]], **options) -> Iterator[str]:
+        chunks = self.client.chat.completions.create(
+            model=self.model, messages=messages, stream=True, **options
+        )
+        try:
+            for chunk in chunks:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            chunks.close()  # drops the connection, so the server stops generating
+
+
+class OpenRouterBackend(OpenAICompatibleBackend):
+    name = "openrouter"
+
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 model: Optional[str] = None):
+        api_key = api_key or os.getenv("OPENROUTER_API_KEY")
+        if not api_key:
+            raise BackendError("OPENROUTER_API_KEY not set")
+        super().__init__(
+            base_url or os.getenv("OPENROUTER_BASE_URL", OPENROUTER_BASE_URL),
+            api_key,
+            model or DEFAULT_MODEL
+        )
+
+
+class LocalBackend(OpenAICompatibleBackend):
+    """
+    A self-hosted OpenAI-compatible server (llama.cpp, vLLM, Ollama).
+    No key is needed; batches are sized to the server's parallel slots.
+    """
+
+    name = "local"
+
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 model: Optional[str] = None, parallel: Optional[int] = None):
+        super().__init__(
+            base_url or LOCAL_BASE_URL,
+            api_key or os.getenv("LLM_API_KEY", "local"),
+            # llama-server answers with whatever model it loaded
+            model or "local"
+        )
+        self.parallel = parallel or int(os.getenv("LLM_PARALLEL", LOCAL_PARALLEL))
+
+    @property
+    def batch_workers(self) -> int:
+        return self.parallel
+
+
+class FakeBackend(ChatBackend):
+    """In-process synthetic completions with an optional fixed latency."""
+
+    name = "fake"
+
+    def __init__(self, model: Optional[str] = None, latency: float = 0.0,
+                 samples: Optional[List[str]] = None):
+        super().__init__(model or "fake")
+        self.latency = latency
+        self.planner = SyntheticPlanner(samples)
+
+    def _contents(self, messages: List[Dict[str, Any]], n: int) -> List[str]:
+        if self.latency:
+            time.sleep(self.latency)
+        key = prompt_hash(messages)
+        return [self.planner.plan_for(messages, key, i) for i in range(n)]
+
+    def _complete(self, messages: List[Dict[str, Any]], **options) -> ChatCompletion:
+        contents = self._contents(messages, max(1, int(options.get("n") or 1)))
+        prompt = "".join(str(m.get("content", "")) for m in messages)
+        return ChatCompletion.model_validate(completion_response(self.model, contents, prompt))
+
+    def _stream(self, messages: List[Dict[str, Any]], **options) -> Iterator[str]:
+        content = self._contents(messages, 1)[0]
+        for i in range(0, len(content), STREAM_CHUNK_CHARS):
+            yield content[i:i + STREAM_CHUNK_CHARS]
+
+
+BACKENDS = {
+    "openrouter": OpenRouterBackend,
+    "local": LocalBackend,
+    "fake": FakeBackend,
+}
+
+_instances: Dict[tuple, ChatBackend] = {}
+_instances_lock = threading.Lock()
+
+
+def get_backend(name: Optional[str] = None, base_url: Optional[str] = None,
+                model: Optional[str] = None) -> ChatBackend:
+    """
+    The configured backend. Arguments override LLM_BACKEND, LLM_BASE_URL
+    and LLM_MODEL. One instance per configuration, so its stats cover the
+    whole run.
+    """
+    name = name or os.getenv("LLM_BACKEND", "openrouter")
+    if name not in BACKENDS:
+        raise BackendError(f"Unknown LLM backend: {name} (choose from {', '.join(BACKENDS)})")
+    base_url = base_url or os.getenv("LLM_BASE_URL")
+    if name == "openrouter":
+        base_url = base_url or os.getenv("OPENROUTER_BASE_URL", OPENROUTER_BASE_URL)
+    model = model or os.getenv("LLM_MODEL")
+
+    config = (name, base_url, model)
+    with _instances_lock:
+        if config not in _instances:
+            if name == "fake":
+                _instances[config] = FakeBackend(model)
+            else:
+                _instances[config] = BACKENDS[name](base_url=base_url, model=model)
+        return _instances[config]
@@ -0,0 +1,133 @@
+"""
+Hedged LLM Requests
+
+Tail latency of hosted models is dominated by the occasional stuck
+request. A hedged call sends the request, waits until the observed p90
+latency has passed, then sends an identical second request. Whichever
+answers first wins. The loser is left to finish or time out on its own,
+since an in-flight HTTP request cannot be cancelled from another thread.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Optional
+
+from pipeline.deadline import Deadline, DeadlineExceeded
+
+
+class LatencyTracker:
+    """
+    Rolling window of successful request latencies.
+
+    The hedge delay is the window's p90. Until min_samples latencies have
+    been seen, default_delay is used. With a path the window is persisted,
+    so one-shot processes share their history.
+    """
+
+    def __init__(
+        self,
+        window: int = 200,
+        quantile: float = 0.9,
+        min_samples: int = 10,
+        default_delay: float = 8.0,
+        path: Optional[str] = None
+    ):
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.path = Path(path) if path else None
+        self.samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+        if self.path and self.path.exists():
+            try:
+                self.samples.extend(json.loads(self.path.read_text()))
+            except (ValueError, TypeError):
+                pass  # unreadable history: start fresh
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+            if self.path:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self.path.write_text(json.dumps(list(self.samples)))
+
+    def hedge_delay(self) -> float:
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return self.default_delay
+            ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(self.quantile * len(ordered)))
+        return ordered[index]
+
+
+def hedged_call(
+    fn: Callable[[], Any],
+    tracker: LatencyTracker,
+    deadline: Optional[Deadline] = None,
+    on_hedge: Optional[Callable[[str], None]] = None
+) -> Any:
+    """
+    Call fn, and call it again if it has not answered within the tracker's
+    p90. Returns the first successful result.
+
+    on_hedge is called with "primary" or "hedge" (the winner) whenever a
+    second request was sent.
+
+    Raises:
+        DeadlineExceeded if neither request answers in time, otherwise the
+        error of the last request to fail
+    """
+    deadline = deadline or Deadline.none()
+    deadline.check("LLM request")
+
+    pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="hedge")
+    started: Dict[Any, float] = {}
+    names: Dict[Any, str] = {}
+
+    def submit(name: str):
+        future = pool.submit(fn)
+        started[future] = time.perf_counter()
+        names[future] = name
+        return future
+
+    try:
+        pending = {submit("primary")}
+        delay = deadline.timeout(cap=tracker.hedge_delay())
+        hedged = False
+        last_error: Optional[BaseException] = None
+
+        while pending:
+            done, pending = wait(pending, timeout=delay, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                if future.exception() is None:
+                    tracker.record(time.perf_counter() - started[future])
+                    if hedged and on_hedge:
+                        on_hedge(names[future])
+                    return future.result()
+                last_error = future.exception()
+
+            if not hedged and not deadline.expired():
+                # Primary is slow (or failed fast): send the hedge
+                hedged = True
+                pending.add(submit("hedge"))
+                delay = deadline.timeout()
+                continue
+
+            if deadline.expired():
+                raise DeadlineExceeded(f"LLM request: deadline of {deadline.seconds}s exceeded")
+
+            if not pending and last_error is not None:
+                raise last_error
+
+            delay = deadline.timeout()
+
+        raise last_error or DeadlineExceeded("LLM request: no response")
+    finally:
+        # Do not block on the losing request
+        pool.shutdown(wait=False)
@@ -0,0 +1,87 @@
+"""
+Structured Output
+
+Builds the OpenAI-compatible `response_format` that asks the backend to
+decode against a JSON Schema, and remembers which backends reject it.
+A 400/422 on such a request is retried once without the schema; only an
+error that names response_format / json_schema marks the backend.
+
+LLM_RESPONSE_FORMAT selects the mode:
+    json_schema  (default) constrained decoding against the schema
+    json_object  any JSON object (for backends without schema support)
+    off          plain completion; output is parsed as before
+
+The schema is not sent in strict mode: strict mode requires every
+property and forbids a union at the root, which the plan and block-tree
+schemas need. Constrained-decoding backends (vLLM, llama.cpp, most
+OpenRouter providers) enforce the schema either way. The caller's parser
+and validator stay in place for backends that only treat it as a hint.
+"""
+
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from llm.limiter import status_code
+
+MODES = ("json_schema", "json_object", "off")
+
+# A 400/422 on a request carrying response_format: it may be the cause
+REJECTED_STATUS = {400, 422}
+
+# ...and it is when the error body names the structured-output parameters
+FORMAT_TERMS = ("response_format", "json_schema")
+
+_rejected_lock = threading.Lock()
+_rejected = set()
+
+
+def mode() -> str:
+    value = os.getenv("LLM_RESPONSE_FORMAT", "json_schema")
+    return value if value in MODES else "json_schema"
+
+
+def response_format(name: str, schema: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The response_format for `schema` under the current mode, or None"""
+    selected = mode()
+    if selected == "off":
+        return None
+    if selected == "json_object":
+        return {"type": "json_object"}
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": name, "schema": schema, "strict": False},
+    }
+
+
+def supported(base_url: str) -> bool:
+    with _rejected_lock:
+        return base_url not in _rejected
+
+
+def rejected(exc: BaseException) -> bool:
+    """True if the request may have failed on its response_format (a 400/422)"""
+    return status_code(exc) in REJECTED_STATUS
+
+
+def unsupported(exc: BaseException) -> bool:
+    """True if the error says the backend does not take response_format"""
+    if not rejected(exc):
+        return False
+    text = _error_text(exc).lower()
+    return any(term in text for term in FORMAT_TERMS)
+
+
+def _error_text(exc: BaseException) -> str:
+    parts = [str(exc), str(getattr(exc, "body", None) or "")]
+    try:
+        parts.append(getattr(getattr(exc, "response", None), "text", None) or "")
+    except Exception:
+        pass  # a streamed response that was never read
+    return " ".join(parts)
+
+
+def mark_rejected(base_url: str):
+    """Stop sending response_format to this backend for the rest of the process"""
+    with _rejected_lock:
+        _rejected.add(base_url)
@@ -0,0 +1,515 @@
+"""
+Local OpenRouter-Compatible Stub Server
+
+Serves the OpenAI chat-completions API on localhost so the planners can be
+load-tested and benchmarked offline, without paid tokens.
+
+Modes:
+    replay     Answer from recorded responses keyed by prompt hash
+    record     Forward to the real upstream and store every response
+    synthetic  Generate plans locally (optionally from sample_*.json files)
+
+Requests with "stream": true get the same answer as server-sent
+chat.completion.chunk events.
+
+Usage:
+    python -m llm.stub_server --mode synthetic --latency lognormal:-1,0.5 \\
+        --error-rate 0.01 --rate-limit-rate 0.02 --port 8787
+
+    OPENROUTER_BASE_URL=http://127.0.0.1:8787/api/v1 python main.py
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from semantic.schema import validate_semantic_plan
+
+UPSTREAM_BASE_URL = "https://openrouter.ai/api/v1"
+
+# Characters per chunk when a client asks for a streamed response
+STREAM_CHUNK_CHARS = 16
+
+# One problem of a batch planning prompt (semantic.prompt.batch_user_prompt)
+BATCH_PROBLEM_RE = re.compile(r"^\[id: (.+?)\]\n(.*?)(?=\n\n\[id: |\Z)", re.M | re.S)
+
+
+class StubError(Exception):
+    """Raised for invalid stub server configuration."""
+
+
+def prompt_hash(messages: List[Dict[str, Any]]) -> str:
+    """Stable key for a chat request: hash of the canonical message list."""
+    canonical = json.dumps(
+        [{"role": m.get("role"), "content": m.get("content")} for m in messages],
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    Parse a latency distribution spec into a sampler (seconds).
+
+    Supported: "0", "fixed:0.5", "uniform:0.2,1.5", "exp:0.8",
+    "lognormal:MU,SIGMA" (parameters of the underlying normal).
+    """
+    kind, _, params = spec.partition(":")
+    if not params:
+        kind, params = "fixed", kind
+
+    try:
+        values = [float(v) for v in params.split(",") if v]
+    except ValueError:
+        raise StubError(f"Invalid latency spec: {spec}")
+
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "exp" and len(values) == 1:
+        return lambda rng: rng.expovariate(1 / values[0]) if values[0] > 0 else 0.0
+    if kind == "lognormal" and len(values) == 2:
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+
+    raise StubError(f"Invalid latency spec: {spec}")
+
+
+def _operand(value: Any) -> str:
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def _condition_text(node: Any) -> Optional[str]:
+    """Structured condition of a sample ({"op": "and", "conditions": [...]},
+    {"left": ..., "op": ..., "right": ...}) as a v3 condition string"""
+    if node is None or isinstance(node, str):
+        return node
+    if not isinstance(node, dict):
+        return _operand(node)
+    if "conditions" in node:
+        op = node.get("op", "and")
+        parts = [_operand(node["left"])] if "left" in node else []
+        parts += [text for text in map(_condition_text, node["conditions"]) if text]
+        # v3 conditions have no parentheses: nested groups must share the operator
+        other = " or " if op == "and" else " and "
+        if len(parts) > 1 and any(other in part for part in parts):
+            raise ValueError("mixed and / or groups")
+        return f" {op} ".join(parts) or None
+    return f"{_operand(node['left'])} {node['op']} {_operand(node['right'])}"
+
+
+def to_semantic_plan(sample: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a structured sample plan (sample_*.json: {name, type} inputs,
+    {name, expression} derived values, a condition tree, {type, value}
+    actions) to the v3 semantic plan format. Parts already in that
+    format are kept as they are.
+    """
+    if not isinstance(sample, dict):
+        return sample
+
+    def derived(entry):
+        if not isinstance(entry, dict):
+            return entry
+        expression = entry["expression"]
+        if isinstance(expression, dict):
+            expression = f" {expression['op']} ".join(_operand(arg) for arg in expression["args"])
+        return f"{entry['name']} = {expression}"
+
+    def action(entry):
+        if not isinstance(entry, dict):
+            return entry
+        return f"{entry.get('type', 'print')} {entry.get('value', '')}".strip()
+
+    actions = sample.get("actions")
+    return {
+        "inputs": [i["name"] if isinstance(i, dict) else i for i in sample.get("inputs", [])],
+        "derived": [derived(entry) for entry in sample.get("derived", [])],
+        "condition": _condition_text(sample.get("condition")),
+        "actions": {
+            branch: [action(entry) for entry in actions.get(branch, [])]
+            for branch in ("then", "else")
+        } if isinstance(actions, dict) else actions
+    }
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)."""
+    return max(1, math.ceil(len(text or "") / 4))
+
+
+# -------------------------
+# Response sources
+# -------------------------
+class RecordingStore:
+    """JSONL file of recorded responses keyed by prompt hash."""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.responses: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+        if self.path.exists():
+            with self.path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.responses[entry["key"]] = entry["response"]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.responses.get(key)
+
+    def put(self, key: str, response: Dict[str, Any]):
+        with self._lock:
+            self.responses[key] = response
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "response": response}) + "\n")
+
+
+class SyntheticPlanner:
+    """
+    Produces plausible plans without a model.
+
+    With sample files, the sample is picked by prompt hash so the same
+    prompt always gets the same plan. Samples are converted to the v3
+    plan format when loaded; one that still fails validate_semantic_plan
+    is rejected with a StubError. Without samples, a v3 semantic plan
+    is built from the numbers mentioned in the problem text. A batch
+    prompt gets {"plans": [...]} with one plan per problem id.
+    """
+
+    def __init__(self, sample_paths: Optional[List[str]] = None):
+        self.samples: List[str] = []
+        for path in sample_paths or []:
+            with open(path, "r", encoding="utf-8") as f:
+                sample = json.load(f)
+            try:
+                plan = to_semantic_plan(sample)
+            except (KeyError, TypeError, AttributeError, ValueError) as e:
+                raise StubError(f"Sample {path} cannot be converted to a v3 semantic plan: {e!r}")
+            if not validate_semantic_plan(plan):
+                raise StubError(f"Sample {path} is not a valid v3 semantic plan")
+            self.samples.append(json.dumps(plan))
+
+    def plan_for(self, messages: List[Dict[str, Any]], key: str, index: int = 0) -> str:
+        problem = messages[-1].get("content", "") if messages else ""
+        batch = BATCH_PROBLEM_RE.findall(problem)
+        if batch:
+            return json.dumps({
+                "plans": [
+                    {"id": pid, "plan": json.loads(self._plan(text, hashlib.sha256(text.encode()).hexdigest(), index))}
+                    for pid, text in batch
+                ]
+            })
+        return self._plan(problem, key, index)
+
+    def _plan(self, problem: str, key: str, index: int) -> str:
+        if self.samples:
+            return self.samples[(int(key[:8], 16) + index) % len(self.samples)]
+
+        numbers = re.findall(r"\d+(?:\.\d+)?", problem)[:3] or ["0"]
+        inputs = [f"value_{i + 1}" for i in range(len(numbers))]
+        condition = " and ".join(f"{name} >= {num}" for name, num in zip(inputs, numbers))
+
+        return json.dumps({
+            "inputs": inputs,
+            "derived": [],
+            "condition": condition,
+            "actions": {"then": ["print yes"], "else": ["print no"]}
+        })
+
+
+# -------------------------
+# Server
+# -------------------------
+class StubConfig:
+    """Runtime behavior of the stub server."""
+
+    def __init__(
+        self,
+        mode: str = "synthetic",
+        recordings: Optional[str] = None,
+        samples: Optional[List[str]] = None,
+        upstream: str = UPSTREAM_BASE_URL,
+        latency: str = "0",
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: float = 1.0,
+        fallback_synthetic: bool = True,
+        seed: Optional[int] = None,
+    ):
+        if mode not in {"replay", "record", "synthetic"}:
+            raise StubError(f"Unknown mode: {mode}")
+        if mode in {"replay", "record"} and not recordings:
+            raise StubError(f"--recordings is required in {mode} mode")
+
+        self.mode = mode
+        self.store = RecordingStore(recordings) if recordings else None
+        self.synthetic = SyntheticPlanner(samples)
+        self.upstream = upstream.rstrip("/")
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.fallback_synthetic = fallback_synthetic
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+
+        self.stats = {"requests": 0, "replayed": 0, "recorded": 0, "synthetic": 0,
+                      "misses": 0, "errors_injected": 0, "rate_limited": 0}
+        self.stats_lock = threading.Lock()
+
+    def count(self, key: str):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    def draw(self) -> Dict[str, float]:
+        """Sample latency and fault injection for one request."""
+        with self.rng_lock:
+            return {
+                "latency": max(0.0, self.sample_latency(self.rng)),
+                "fault": self.rng.random(),
+            }
+
+
+def completion_response(model: str, contents: List[str], prompt_text: str) -> Dict[str, Any]:
+    """Build an OpenAI-style chat completion body."""
+    completion_tokens = sum(estimate_tokens(c) for c in contents)
+    prompt_tokens = estimate_tokens(prompt_text)
+    return {
+        "id": f"stub-{hashlib.sha1((prompt_text + str(time.time())).encode()).hexdigest()[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": i,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+            for i, content in enumerate(contents)
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def make_handler(config: StubConfig):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass  # keep load tests quiet
+
+        def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _send_stream(self, body: Dict[str, Any], include_usage: bool = False):
+            """Send a completion body as server-sent chat.completion.chunk events."""
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            def event(choices: List[Dict[str, Any]], usage: Optional[Dict[str, Any]] = None):
+                chunk = {
+                    "id": body.get("id", "stub"),
+                    "object": "chat.completion.chunk",
+                    "created": body.get("created", int(time.time())),
+                    "model": body.get("model", "stub"),
+                    "choices": choices,
+                }
+                if usage is not None:
+                    chunk["usage"] = usage
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            for choice in body.get("choices", []):
+                content = (choice.get("message") or {}).get("content") or ""
+                index = choice.get("index", 0)
+                for i in range(0, len(content), STREAM_CHUNK_CHARS):
+                    event([{"index": index, "delta": {"content": content[i:i + STREAM_CHUNK_CHARS]}, "finish_reason": None}])
+                event([{"index": index, "delta": {}, "finish_reason": choice.get("finish_reason", "stop")}])
+            if include_usage:
+                event([], body.get("usage"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def _send_completion(self, request: Dict[str, Any], status: int, body: Dict[str, Any]):
+            if status == 200 and request.get("stream"):
+                include_usage = bool((request.get("stream_options") or {}).get("include_usage"))
+                self._send_stream(body, include_usage)
+            else:
+                self._send_json(status, body)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/stats"):
+                with config.stats_lock:
+                    self._send_json(200, dict(config.stats))
+                return
+            if self.path.rstrip("/").endswith("/models"):
+                self._send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+                return
+            self._send_json(404, {"error": {"message": f"Unknown path: {self.path}"}})
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": f"Unknown path: {self.path}"}})
+                return
+
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                request = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                self._send_json(400, {"error": {"message": "Request body is not JSON"}})
+                return
+
+            config.count("requests")
+            draw = config.draw()
+            time.sleep(draw["latency"])
+
+            # Fault injection: 429 first, then generic 5xx
+            if draw["fault"] < config.rate_limit_rate:
+                config.count("rate_limited")
+                self._send_json(
+                    429,
+                    {"error": {"message": "Rate limit exceeded (stub)", "code": 429}},
+                    {"Retry-After": str(config.retry_after)}
+                )
+                return
+            if draw["fault"] < config.rate_limit_rate + config.error_rate:
+                config.count("errors_injected")
+                self._send_json(500, {"error": {"message": "Injected upstream error (stub)", "code": 500}})
+                return
+
+            messages = request.get("messages", [])
+            key = prompt_hash(messages)
+            model = request.get("model", "stub")
+            n = max(1, int(request.get("n") or 1))
+
+            if config.mode == "record":
+                # Recorded whole; a streaming client gets the recording as chunks
+                status, body = self._forward({k: v for k, v in request.items() if k not in {"stream", "stream_options"}})
+                if status == 200:
+                    config.store.put(key, body)
+                    config.count("recorded")
+                self._send_completion(request, status, body)
+                return
+
+            if config.mode == "replay":
+                recorded = config.store.get(key)
+                if recorded is not None:
+                    config.count("replayed")
+                    self._send_completion(request, 200, recorded)
+                    return
+                config.count("misses")
+                if not config.fallback_synthetic:
+                    self._send_json(404, {"error": {"message": f"No recording for prompt {key[:12]}"}})
+                    return
+
+            config.count("synthetic")
+            contents = [config.synthetic.plan_for(messages, key, i) for i in range(n)]
+            prompt_text = "".join(m.get("content") or "" for m in messages)
+            self._send_completion(request, 200, completion_response(model, contents, prompt_text))
+
+        def _forward(self, request: Dict[str, Any]):
+            """Send the request to the real upstream (record mode)."""
+            upstream = urllib.request.Request(
+                f"{config.upstream}/chat/completions",
+                data=json.dumps(request).encode("utf-8"),
+                headers={
+                    "Content-Type": "application/json",
+                    "Authorization": self.headers.get("Authorization", ""),
+                },
+                method="POST"
+            )
+            try:
+                with urllib.request.urlopen(upstream, timeout=120) as resp:
+                    return resp.status, json.loads(resp.read())
+            except urllib.error.HTTPError as e:
+                return e.code, {"error": {"message": e.read().decode("utf-8", "replace")}}
+            except urllib.error.URLError as e:
+                return 502, {"error": {"message": f"Upstream unreachable: {e.reason}"}}
+
+    return StubHandler
+
+
+def start_server(config: StubConfig, host: str = "127.0.0.1", port: int = 8787) -> ThreadingHTTPServer:
+    """Start the stub in a background thread and return the server (port 0 picks a free port)."""
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def base_url_for(server: ThreadingHTTPServer) -> str:
+    """OpenAI-compatible base URL of a running stub server."""
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/api/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenRouter-compatible stub server")
+    parser.add_argument("--mode", choices=["replay", "record", "synthetic"], default="synthetic")
+    parser.add_argument("--recordings", help="JSONL file of recorded responses")
+    parser.add_argument("--samples", default=None, help="Glob of plan files served in synthetic mode, e.g. '../sample_*.json'")
+    parser.add_argument("--upstream", default=UPSTREAM_BASE_URL, help="Upstream base URL for record mode")
+    parser.add_argument("--latency", default="0", help="fixed:S | uniform:A,B | exp:MEAN | lognormal:MU,SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--no-fallback", action="store_true", help="In replay mode, answer misses with 404")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    args = parser.parse_args()
+
+    config = StubConfig(
+        mode=args.mode,
+        recordings=args.recordings,
+        samples=sorted(glob.glob(args.samples)) if args.samples else None,
+        upstream=args.upstream,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        fallback_synthetic=not args.no_fallback,
+        seed=args.seed,
+    )
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    print(f"🧪 Stub LLM server ({args.mode}) on {base_url_for(server)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Stub server stopped")
+        with config.stats_lock:
+            print(json.dumps(config.stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+LLM Usage Ledger and Token Budgets
+
+Every chat completion's `usage` is recorded against its problem and
+attempt, so a run can report where its tokens went. Budgets cap spend per
+problem and per run: before a request is sent the problem's budget (and
+what is left of the run's) is checked, and BudgetExceeded stops further
+retries. Close to the limit the planner switches to cheaper strategies
+(one candidate, no hedged request) instead of failing outright.
+"""
+
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Assumed size of one request until the run has seen some
+DEFAULT_REQUEST_ESTIMATE = 2000
+
+
+class BudgetExceeded(Exception):
+    """Raised when a problem or the whole run has used up its token budget."""
+
+    def __init__(self, message: str, scope: str):
+        super().__init__(message)
+        self.scope = scope
+
+
+class UsageLedger:
+    """
+    Token usage of a run, per problem and per request.
+
+    With a path, every request is appended there as one JSON line
+    (pid, attempt, kind, tokens, cost). Prices are USD per million tokens
+    and only used for reporting.
+
+    Usage:
+        ledger = UsageLedger("outputs/usage_ledger.jsonl", run_budget=500_000, problem_budget=20_000)
+        usage = ledger.for_problem("PID-0001")
+        usage.check("plan")            # raises BudgetExceeded
+        usage.record(response, "single")
+        print(ledger.report())
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        run_budget: Optional[int] = None,
+        problem_budget: Optional[int] = None,
+        price_in: float = 0.0,
+        price_out: float = 0.0
+    ):
+        self.path = Path(path) if path else None
+        self.run_budget = run_budget
+        self.problem_budget = problem_budget
+        self.price_in = price_in
+        self.price_out = price_out
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.requests = 0
+        self.problems: Dict[str, "ProblemUsage"] = {}
+        self._lock = threading.Lock()
+
+        if self.path:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text("")
+
+    @property
+    def total(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def for_problem(self, pid: str) -> "ProblemUsage":
+        with self._lock:
+            if pid not in self.problems:
+                self.problems[pid] = ProblemUsage(pid, self)
+            return self.problems[pid]
+
+    def run_remaining(self) -> Optional[int]:
+        if self.run_budget is None:
+            return None
+        return max(0, self.run_budget - self.total)
+
+    def request_estimate(self) -> float:
+        """Mean tokens per request so far in the run"""
+        if not self.requests:
+            return DEFAULT_REQUEST_ESTIMATE
+        return self.total / self.requests
+
+    def cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        return (prompt_tokens * self.price_in + completion_tokens * self.price_out) / 1_000_000
+
+    def _record(self, problem: "ProblemUsage", kind: str, prompt_tokens: int, completion_tokens: int):
+        self._record_shares([(problem, prompt_tokens, completion_tokens)], kind)
+
+    def _record_shares(self, shares: List[Tuple["ProblemUsage", int, int]], kind: str):
+        """One request whose tokens are split across the problems it served"""
+        with self._lock:
+            self.requests += 1
+            for problem, prompt_tokens, completion_tokens in shares:
+                self.prompt_tokens += prompt_tokens
+                self.completion_tokens += completion_tokens
+                problem.prompt_tokens += prompt_tokens
+                problem.completion_tokens += completion_tokens
+                problem.requests += 1
+
+                if self.path:
+                    entry = {
+                        "pid": problem.pid,
+                        "attempt": problem.requests,
+                        "kind": kind,
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "cost": round(self.cost(prompt_tokens, completion_tokens), 6),
+                    }
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(entry) + "\n")
+
+    def report(self, top_n: int = 5) -> Dict[str, Any]:
+        """Run totals, budgets and the problems that used the most tokens"""
+        with self._lock:
+            problems = sorted(self.problems.values(), key=lambda p: p.total, reverse=True)
+            top: List[Dict[str, Any]] = [
+                {
+                    "pid": p.pid,
+                    "requests": p.requests,
+                    "tokens": p.total,
+                    "cost": round(self.cost(p.prompt_tokens, p.completion_tokens), 4),
+                    "budget_exceeded": p.exceeded,
+                }
+                for p in problems[:top_n]
+            ]
+            return {
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "total_tokens": self.total,
+                "cost": round(self.cost(self.prompt_tokens, self.completion_tokens), 4),
+                "run_budget": self.run_budget,
+                "problem_budget": self.problem_budget,
+                "problems": len(problems),
+                "over_budget": sorted(p.pid for p in problems if p.exceeded),
+                "top_problems": top,
+            }
+
+
+class ProblemUsage:
+    """
+    One problem's share of the ledger. Created by UsageLedger.for_problem
+    and passed through the pipeline with the job, like its Deadline.
+    """
+
+    def __init__(self, pid: str, ledger: UsageLedger):
+        self.pid = pid
+        self.ledger = ledger
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.requests = 0
+        self.exceeded: Optional[str] = None  # scope of the budget that stopped it
+
+    @classmethod
+    def none(cls) -> "ProblemUsage":
+        """Unbounded usage that is not reported anywhere"""
+        return cls("", UsageLedger())
+
+    @property
+    def total(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def remaining(self) -> Optional[int]:
+        """Tokens left for this problem (bounded by the run), or None"""
+        limits = []
+        if self.ledger.problem_budget is not None:
+            limits.append(max(0, self.ledger.problem_budget - self.total))
+        run_left = self.ledger.run_remaining()
+        if run_left is not None:
+            limits.append(run_left)
+        return min(limits) if limits else None
+
+    def check(self, what: str):
+        """
+        Raise BudgetExceeded when the problem or run budget cannot pay for
+        another request of average size. A request's size is only known
+        once it returns, so a budget can still be overrun by one request.
+        """
+        needed = self.ledger.request_estimate() if self.ledger.requests else 1
+        run_left = self.ledger.run_remaining()
+        if run_left is not None and run_left < needed:
+            self.exceeded = "run"
+            raise BudgetExceeded(f"{what}: run token budget of {self.ledger.run_budget} used up", "run")
+        budget = self.ledger.problem_budget
+        if budget is not None and budget - self.total < needed:
+            self.exceeded = "problem"
+            raise BudgetExceeded(f"{what}: problem token budget of {budget} used up ({self.total})", "problem")
+
+    def can_afford(self, requests: int) -> bool:
+        """Whether `requests` more requests of average size fit the budget"""
+        remaining = self.remaining()
+        return remaining is None or remaining >= requests * self.ledger.request_estimate()
+
+    def record(self, response: Any, kind: str):
+        """Add a completion's reported usage (responses without one count as a request)"""
+        usage = getattr(response, "usage", None)
+        prompt_tokens = (getattr(usage, "prompt_tokens", 0) or 0) if usage is not None else 0
+        completion_tokens = (getattr(usage, "completion_tokens", 0) or 0) if usage is not None else 0
+        self.ledger._record(self, kind, prompt_tokens, completion_tokens)
+
+
+class BatchUsage:
+    """
+    The accounts of several problems planned in one request. It stands in
+    for a ProblemUsage: every member's budget must allow the request, and
+    the reported tokens are split evenly between them (one request in the
+    run totals).
+    """
+
+    def __init__(self, problems: List[ProblemUsage]):
+        if not problems:
+            raise ValueError("BatchUsage needs at least one problem")
+        self.problems = problems
+        self.ledger = problems[0].ledger
+
+    def check(self, what: str):
+        for problem in self.problems:
+            problem.check(what)
+
+    def can_afford(self, requests: int) -> bool:
+        return all(problem.can_afford(requests) for problem in self.problems)
+
+    def record(self, response: Any, kind: str):
+        usage = getattr(response, "usage", None)
+        prompt_tokens = (getattr(usage, "prompt_tokens", 0) or 0) if usage is not None else 0
+        completion_tokens = (getattr(usage, "completion_tokens", 0) or 0) if usage is not None else 0
+
+        count = len(self.problems)
+        shares = [
+            # The first problem takes the remainder so the shares add up
+            (
+                problem,
+                prompt_tokens // count + (prompt_tokens % count if i == 0 else 0),
+                completion_tokens // count + (completion_tokens % count if i == 0 else 0),
+            )
+            for i, problem in enumerate(self.problems)
+        ]
+        self.ledger._record_shares(shares, kind)
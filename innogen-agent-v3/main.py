@@ -4,23 +4,48 @@ Innogen Agent v3 - Main Entry Point
 Production-grade compiler-style system for converting natural language to Blockly XML.
 """
 
+import argparse
 import json
-import subprocess
+import os
+from functools import wraps
+from itertools import islice
 from pathlib import Path
 import sys
 
-from semantic.planner import generate_semantic_plan, SemanticPlannerError
+from semantic.planner import generate_semantic_plan, generate_semantic_plans, SemanticPlannerError
 from semantic.validator import CapabilityValidator
-from semantic.compiler import SemanticCompiler
+from semantic.template_cache import PlanTemplateCache
+from semantic.semantic_cache import SemanticPlanCache, DEFAULT_THRESHOLD, MODES
+from pipeline.scheduler import PipelineScheduler, Stage
+from pipeline.profiling import StageProfiler
+from pipeline.deadline import Deadline, DeadlineExceeded, run_with_deadline
+from pipeline.sandbox import FixtureReport, SandboxError, SandboxPool
+from llm.usage import UsageLedger, BudgetExceeded
+from llm.backends import BACKENDS, BackendError, get_backend
+from pipeline.metrics import (
+    REGISTRY,
+    BROWSER_LAUNCH_SECONDS,
+    PAGE_READY_SECONDS,
+    CACHE_REQUESTS,
+    CACHE_HIT_RATIO,
+    BATCH_PLANS,
+    DEADLINE_EXCEEDED,
+    FIXTURE_CHECKS,
+    BUDGET_EXCEEDED,
+    VALIDATION_FAILURES,
+    reason_label,
+    start_metrics_server,
+    timed_stage,
+)
 
 # -------------------------
 # Helper to run Node scripts
 # -------------------------
-def run(cmd, cwd):
-    subprocess.run(
+def run(cmd, cwd, deadline=None):
+    run_with_deadline(
         cmd,
         cwd=cwd,
-        check=True
+        deadline=deadline
     )
 
 # Paths
@@ -28,91 +53,272 @@ ROOT = Path(__file__).parent
 OUTPUTS = ROOT / "outputs"
 NORMALIZED_BLOCKS = ROOT / "data" / "normalized_blocks.json"
 
-def process_problem(problem: dict, team_id: str):
-    """Process a single problem through the pipeline"""
+# Compiled block-tree templates shared by every problem in the run
+TEMPLATE_CACHE = PlanTemplateCache()
+
+# Embedding cache of verified plans for paraphrased problems (configured in main)
+SEMANTIC_CACHE = None
+
+# cProfile + tracemalloc per stage when --profile is given (configured in main)
+PROFILER = None
+
+# Token usage per problem / request and the budgets (configured in main)
+USAGE_LEDGER = UsageLedger()
+
+# Chat backend of the planner (configured in main; None = LLM_BACKEND)
+LLM_BACKEND = None
+
+# Browser runner in runner/ (the load-test harness swaps in stub_execute.js)
+RUNNER_SCRIPT = "runner_execute.js"
+
+# Runs generated Python against the fixtures in problems.json (configured in main)
+SANDBOX = None
+
+# Fixture check results of the run, per problem
+FIXTURE_REPORT = FixtureReport()
+
+def write_failure_outputs(job: dict, txt_message: str, bug_message: str):
+    """Write placeholder submission files for a problem that stopped early"""
+    problem_dir = job["problem_dir"]
+    prefix = f"{job['team_id']}_TL_{job['pid']}"
+
+    (problem_dir / f"{prefix}.xml").write_text("<xml></xml>")  # Empty XML
+    (problem_dir / f"{prefix}.txt").write_text(txt_message)
+    (problem_dir / f"{prefix}_bug.txt").write_text(bug_message)
+
+def new_job(problem: dict, team_id: str, num_candidates: int = 1, deadline_seconds: float = None) -> dict:
+    """Create the per-problem state passed between pipeline stages"""
     pid = problem["problem_id"]
-    description = problem["description"]
+    problem_dir = OUTPUTS / f"Problem_{pid}"
+    problem_dir.mkdir(parents=True, exist_ok=True)
+
+    return {
+        "pid": pid,
+        "description": problem["description"],
+        "team_id": team_id,
+        "problem_dir": problem_dir,
+        "num_candidates": num_candidates,
+        # Started before the batch request when planned in a batch
+        "deadline": problem.get("deadline") or Deadline(deadline_seconds),
+        "usage": USAGE_LEDGER.for_problem(pid),
+        # Set when the problem was planned in a batch (see plan_in_batches)
+        "batch_plan": problem.get("batch_plan"),
+        "fixtures": problem.get("fixtures") or [],
+    }
+
+def plan_in_batches(problems, size: int, deadline_seconds: float = None):
+    """
+    Plan `size` problems per LLM request and attach each plan to its
+    problem as "batch_plan". Problems the batch could not plan pass
+    through unchanged and are planned alone by plan_stage. Lazy, so with
+    --pipeline the next batch is requested while the last one is processed.
+
+    The problems' deadlines start with their batch request and go with
+    them as "deadline", so the time spent in the batch counts against
+    each problem's own budget.
+    """
+    problems = iter(problems)
+    while True:
+        chunk = list(islice(problems, size))
+        if not chunk:
+            return
+
+        deadline = Deadline(deadline_seconds)
+        print(f"\n📦 Planning {len(chunk)} problems in one request")
+        plans = generate_semantic_plans(
+            {str(p["problem_id"]): p["description"] for p in chunk},
+            deadline=deadline,
+            usages={str(p["problem_id"]): USAGE_LEDGER.for_problem(p["problem_id"]) for p in chunk},
+            backend=LLM_BACKEND
+        )
+        print(f"📦 Batch planned {len(plans)}/{len(chunk)}")
+
+        for problem in chunk:
+            yield dict(problem, batch_plan=plans.get(str(problem["problem_id"])), deadline=deadline)
+
+def collect_cache_metrics():
+    """Copy cache hit ratios into the registry before each export"""
+    CACHE_HIT_RATIO.set(TEMPLATE_CACHE.stats()["hit_rate"], cache="template")
+    if SEMANTIC_CACHE:
+        CACHE_HIT_RATIO.set(SEMANTIC_CACHE.stats()["hit_rate"], cache="semantic")
+    hits = CACHE_REQUESTS.value(cache="execution", result="hit")
+    misses = CACHE_REQUESTS.value(cache="execution", result="miss")
+    if hits + misses:
+        CACHE_HIT_RATIO.set(round(hits / (hits + misses), 3), cache="execution")
+
+REGISTRY.add_collector(collect_cache_metrics)
+
+def record_execution_timings(timings_file: Path):
+    """Feed the runner's phase timings into the metrics registry"""
+    if not timings_file.exists():
+        return
+    timings = json.loads(timings_file.read_text())
+    if timings.get("cache") in ("hit", "miss"):
+        CACHE_REQUESTS.inc(cache="execution", result=timings["cache"])
+    if "browser_launch_ms" in timings:
+        BROWSER_LAUNCH_SECONDS.observe(timings["browser_launch_ms"] / 1000)
+    if "page_ready_ms" in timings:
+        PAGE_READY_SECONDS.observe(timings["page_ready_ms"] / 1000)
+
+def deadline_guard(stage: str):
+    """Stop the job with failure outputs once its deadline has run out"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(job: dict):
+            try:
+                job["deadline"].check(stage)
+                return fn(job)
+            except DeadlineExceeded as e:
+                print(f"⏰ Problem {job['pid']} stopped: {e}")
+                DEADLINE_EXCEEDED.inc(stage=stage)
+                write_failure_outputs(job, "# Deadline exceeded", f"Deadline error: {e}")
+                return None
+        return wrapper
+    return decorator
+
+# =========================
+# STAGE 1: Planning (Modules 1-2)
+# =========================
+@timed_stage("plan")
+@deadline_guard("plan")
+def plan_stage(job: dict):
+    """Run the semantic planner and capability validator. Returns None on failure."""
+    pid = job["pid"]
+    description = job["description"]
 
     print(f"\n🚀 Processing Problem {pid}")
     print(f"Description: {description}")
 
-    problem_dir = OUTPUTS / f"Problem_{pid}"
-    problem_dir.mkdir(parents=True, exist_ok=True)
+    validator = CapabilityValidator(str(NORMALIZED_BLOCKS))
+
+    # Paraphrase of an already solved problem?
+    cache_hit = SEMANTIC_CACHE.lookup(description) if SEMANTIC_CACHE else None
+    if cache_hit and SEMANTIC_CACHE.enforce:
+        validation = validator.validate(cache_hit["plan"])
+        if validation["status"] == "ok":
+            print(f"♻️  Reusing plan of {cache_hit['pid']} (similarity {cache_hit['similarity']:.3f})")
+            job["semantic_plan"] = cache_hit["plan"]
+            job["cache_hit"] = cache_hit
+            return job
+        print(f"⚠️  Cached plan of {cache_hit['pid']} rejected: {validation['reason']}")
+        VALIDATION_FAILURES.inc(reason=reason_label(validation["reason"]))
+        SEMANTIC_CACHE.reject(cache_hit)
+        cache_hit = None
 
     # =========================
     # MODULE 1: Semantic Planner
     # =========================
     try:
-        semantic_plan = generate_semantic_plan(description)
+        semantic_plan = job.pop("batch_plan", None)
+        if semantic_plan is not None and validator.validate(semantic_plan)["status"] != "ok":
+            print("⚠️  Batched plan failed capability validation, planning this problem alone")
+            BATCH_PLANS.inc(outcome="rejected")
+            semantic_plan = None
+
+        if semantic_plan is None:
+            semantic_plan = generate_semantic_plan(
+                description,
+                num_candidates=job["num_candidates"],
+                validator=validator,
+                deadline=job["deadline"],
+                usage=job["usage"],
+                backend=LLM_BACKEND
+            )
         print("📋 Semantic Plan:")
         print(json.dumps(semantic_plan, indent=2))
 
         if semantic_plan.get("error"):
             print(f"❌ Semantic planning failed: {semantic_plan['error']}")
+            VALIDATION_FAILURES.inc(reason=reason_label(semantic_plan["error"]))
             # For now, create empty outputs
-            xml_dst = problem_dir / f"{team_id}_TL_{pid}.xml"
-            txt_dst = problem_dir / f"{team_id}_TL_{pid}.txt"
-            bug_dst = problem_dir / f"{team_id}_TL_{pid}_bug.txt"
-
-            xml_dst.write_text("<xml></xml>")  # Empty XML
-            txt_dst.write_text("# Semantic planning failed")
-            bug_dst.write_text(f"Semantic error: {semantic_plan['error']}")
-            return
+            write_failure_outputs(
+                job,
+                "# Semantic planning failed",
+                f"Semantic error: {semantic_plan['error']}"
+            )
+            return None
 
     except SemanticPlannerError as e:
         print(f"❌ Semantic planner error: {e}")
         # Create error outputs
-        xml_dst = problem_dir / f"{team_id}_TL_{pid}.xml"
-        txt_dst = problem_dir / f"{team_id}_TL_{pid}.txt"
-        bug_dst = problem_dir / f"{team_id}_TL_{pid}_bug.txt"
+        write_failure_outputs(job, "# Planning failed", f"Planning error: {str(e)}")
+        return None
 
-        xml_dst.write_text("<xml></xml>")
-        txt_dst.write_text("# Planning failed")
-        bug_dst.write_text(f"Planning error: {str(e)}")
-        return
+    except BudgetExceeded as e:
+        print(f"💸 Problem {pid} stopped: {e}")
+        BUDGET_EXCEEDED.inc(scope=e.scope)
+        write_failure_outputs(job, "# Token budget exceeded", f"Budget error: {e}")
+        return None
 
     # =========================
     # MODULE 2: Capability Validator
     # =========================
-    validator = CapabilityValidator(str(NORMALIZED_BLOCKS))
     validation = validator.validate(semantic_plan)
 
     if validation["status"] != "ok":
         print(f"❌ Capability validation failed: {validation['reason']}")
+        VALIDATION_FAILURES.inc(reason=reason_label(validation["reason"]))
         # Create error outputs
-        xml_dst = problem_dir / f"{team_id}_TL_{pid}.xml"
-        txt_dst = problem_dir / f"{team_id}_TL_{pid}.txt"
-        bug_dst = problem_dir / f"{team_id}_TL_{pid}_bug.txt"
-
-        xml_dst.write_text("<xml></xml>")
-        txt_dst.write_text("# Capability validation failed")
-        bug_dst.write_text(f"Validation error: {validation['reason']}")
-        return
+        write_failure_outputs(
+            job,
+            "# Capability validation failed",
+            f"Validation error: {validation['reason']}"
+        )
+        return None
 
     print("✅ Capability validation passed")
 
+    if cache_hit:
+        agree = SEMANTIC_CACHE.record_shadow(cache_hit, semantic_plan)
+        print(f"👥 Shadow cache hit on {cache_hit['pid']} ({cache_hit['similarity']:.3f}): {'agrees' if agree else 'differs'}")
+
+    job["semantic_plan"] = semantic_plan
+    return job
+
+# =========================
+# STAGE 2: Assembly (Modules 3-4)
+# =========================
+@timed_stage("compile")
+@deadline_guard("compile")
+def compile_stage(job: dict):
+    """Compile the plan to a block tree and generate XML"""
+    problem_dir = job["problem_dir"]
+
     # =========================
     # MODULE 3: Semantic Compiler
     # =========================
-    compiler = SemanticCompiler()
-    block_tree = compiler.compile(semantic_plan)
+    block_tree = TEMPLATE_CACHE.compile(job["semantic_plan"])
     print("📋 Block tree generated")
 
     # For now, save block tree to a file for inspection
     block_tree_file = problem_dir / "block_tree.json"
-    block_tree_file.write_text(json.dumps(block_tree, indent=2))
+    block_tree_file.write_text(json.dumps(block_tree.to_dict(), indent=2))
 
     # =========================
     # MODULE 4: XML Generator
     # =========================
-    xml_output = problem_dir / f"{team_id}_TL_{pid}.xml"
+    xml_output = problem_dir / f"{job['team_id']}_TL_{job['pid']}.xml"
     run(
         ["node", "generate_xml.js", str(block_tree_file), str(xml_output)],
-        cwd=ROOT / "assembler"
+        cwd=ROOT / "assembler",
+        deadline=job["deadline"]
     )
 
     print("📄 XML generated")
 
+    job["xml_output"] = xml_output
+    return job
+
+# =========================
+# STAGE 3: Execution (Module 5)
+# =========================
+@timed_stage("execute")
+@deadline_guard("execute")
+def execute_stage(job: dict):
+    """Execute the XML in the browser and collect the final outputs"""
+    problem_dir = job["problem_dir"]
+    xml_output = job["xml_output"]
+
     # =========================
     # MODULE 5: Execution (Playwright)
     # =========================
@@ -121,8 +327,9 @@ def process_problem(problem: dict, team_id: str):
 
     try:
         run(
-            ["node", "runner_execute.js", str(xml_output), str(execution_output_dir)],
-            cwd=ROOT / "runner"
+            ["node", RUNNER_SCRIPT, str(xml_output), str(execution_output_dir)],
+            cwd=ROOT / "runner",
+            deadline=job["deadline"]
         )
 
         # Read execution results
@@ -140,7 +347,18 @@ def process_problem(problem: dict, team_id: str):
             diagnostics = "Execution completed - diagnostics not available\n"
 
         print("🎯 Execution completed")
-
+        record_execution_timings(execution_output_dir / "timings.json")
+
+        # Only plans verified by execution are cached; failed reuses are evicted
+        if SEMANTIC_CACHE:
+            if diagnostics.startswith("Execution successful"):
+                if "cache_hit" not in job:
+                    SEMANTIC_CACHE.store(job["pid"], job["description"], job["semantic_plan"])
+            elif "cache_hit" in job:
+                SEMANTIC_CACHE.invalidate(job["cache_hit"])
+
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"❌ Execution failed: {e}")
         generated_python = "# Execution failed"
@@ -149,16 +367,212 @@ def process_problem(problem: dict, team_id: str):
     # =========================
     # COLLECT FINAL OUTPUTS
     # =========================
-    txt_dst = problem_dir / f"{team_id}_TL_{pid}.txt"
-    bug_dst = problem_dir / f"{team_id}_TL_{pid}_bug.txt"
+    txt_dst = problem_dir / f"{job['team_id']}_TL_{job['pid']}.txt"
+    bug_dst = problem_dir / f"{job['team_id']}_TL_{job['pid']}_bug.txt"
 
     txt_dst.write_text(generated_python)
     bug_dst.write_text("All modules completed successfully\n")
 
-    print(f"✅ Problem {pid} completed fully")
+    print(f"✅ Problem {job['pid']} completed fully")
+    return job
+
+# =========================
+# STAGE 4: Fixture checks
+# =========================
+@timed_stage("verify")
+def verify_stage(job: dict):
+    """
+    Run the generated Python on the problem's fixture inputs in the sandbox.
+    Not deadline-guarded: the outputs are already written and the sandbox
+    has its own timeouts.
+    """
+    result_txt = job["problem_dir"] / "execution_output" / "result.txt"
+    if SANDBOX is None or not job["fixtures"] or not result_txt.exists():
+        return job
+
+    pid = job["pid"]
+    try:
+        result = SANDBOX.check(result_txt.read_text(), job["fixtures"])
+    except SandboxError as e:
+        print(f"⚠️  Fixtures of {pid} ignored: {e}")
+        return job
+
+    FIXTURE_REPORT.add(pid, result)
+    FIXTURE_CHECKS.inc(outcome=result["outcome"])
+    (job["problem_dir"] / "fixture_results.json").write_text(json.dumps(result, indent=2))
+    print(f"🧪 Fixtures of {pid}: {result['passed']}/{result['cases']} passed")
+
+    if result["outcome"] in ("failed", "error"):
+        # Flag the submission for review instead of reporting success
+        failing = [case for case in result["results"] if not case["passed"]]
+        lines = [f"Fixture check failed: {result['passed']}/{result['cases']} cases passed"]
+        for case in failing:
+            lines.append(
+                f"inputs {case['inputs']}: expected {case['expected']!r}, got {case['actual']!r}"
+                + (f" ({case['error']})" if case["error"] else "")
+            )
+        bug_dst = job["problem_dir"] / f"{job['team_id']}_TL_{pid}_bug.txt"
+        bug_dst.write_text("\n".join(lines) + "\n")
+
+    job["fixture_check"] = result["outcome"]
+    return job
+
+STAGES = [plan_stage, compile_stage, execute_stage, verify_stage]
+
+def stage_fn(stage):
+    """The stage function, profiled when --profile is on"""
+    if PROFILER is None:
+        return stage
+    return PROFILER.wrap(stage.__name__.replace("_stage", ""), stage)
+
+def process_problem(problem: dict, team_id: str, num_candidates: int = 1, deadline_seconds: float = None):
+    """Process a single problem through the pipeline"""
+    job = new_job(problem, team_id, num_candidates, deadline_seconds)
+
+    for stage in STAGES:
+        job = stage_fn(stage)(job)
+        if job is None:
+            return
+
+def run_pipelined(problems: list, team_id: str, args):
+    """Overlap planning, assembly and execution across problems"""
+    scheduler = PipelineScheduler(
+        [
+            Stage("plan", stage_fn(plan_stage), workers=args.plan_workers),
+            Stage("compile", stage_fn(compile_stage)),
+            Stage("execute", stage_fn(execute_stage), workers=args.execute_workers),
+            Stage("verify", stage_fn(verify_stage), workers=max(1, args.sandbox_workers)),
+        ],
+        queue_size=args.queue_size
+    )
+
+    if args.plan_batch > 1:
+        problems = plan_in_batches(problems, args.plan_batch, args.deadline or None)
+
+    def on_error(item, e):
+        # A job (stage error), a problem entry (feed error) or None (problem source error)
+        item = item if isinstance(item, dict) else {}
+        print(f"❌ Unexpected error processing {item.get('pid') or item.get('problem_id', '?')}: {e}")
+
+    scheduler.run(
+        problems,
+        on_error=on_error,
+        prepare=lambda problem: new_job(problem, team_id, args.candidates, args.deadline or None)
+    )
+
+    report = scheduler.report()
+    report["template_cache"] = TEMPLATE_CACHE.stats()
+    if SEMANTIC_CACHE:
+        report["semantic_cache"] = SEMANTIC_CACHE.stats()
+    if SANDBOX is not None:
+        report["fixtures"] = FIXTURE_REPORT.report()
+    print("\n📈 Pipeline report:")
+    print(json.dumps(report, indent=2))
+    (OUTPUTS / "pipeline_report.json").write_text(json.dumps(report, indent=2))
+
+def report_usage():
+    """Print the token usage summary and write it next to the ledger"""
+    report = USAGE_LEDGER.report()
+    print(f"\n💰 LLM usage: {report['total_tokens']} tokens in {report['requests']} requests (${report['cost']})")
+    for entry in report["top_problems"]:
+        print(f"   {entry['pid']}: {entry['tokens']} tokens, {entry['requests']} requests")
+    if report["over_budget"]:
+        print(f"   Over budget: {', '.join(report['over_budget'])}")
+    if LLM_BACKEND is not None:
+        report["backend"] = LLM_BACKEND.report()
+        backend = report["backend"]
+        print(
+            f"   {backend['backend']} ({backend['model']}): {backend['latency_mean_s']}s mean latency, "
+            f"{backend['completion_tokens_per_s']} completion tokens/s"
+        )
+    (OUTPUTS / "usage_report.json").write_text(json.dumps(report, indent=2))
+
+def report_fixtures():
+    """Print the fixture check summary and write outputs/fixture_report.json"""
+    if SANDBOX is None:
+        return
+    report = FIXTURE_REPORT.report()
+    if not report["problems"]:
+        return
+    print(f"\n🧪 Fixture checks: {report['cases_passed']}/{report['cases']} cases passed in {report['problems']} problems")
+    if report["failing"]:
+        print(f"   Failing: {', '.join(report['failing'])}")
+    (OUTPUTS / "fixture_report.json").write_text(json.dumps(report, indent=2))
+
+def write_metrics(args):
+    if args.metrics_file:
+        REGISTRY.write_textfile(args.metrics_file)
+        print(f"📈 Metrics written to {args.metrics_file}")
+    if PROFILER is not None:
+        print(f"🔬 Profile summary: {PROFILER.write_summary()}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Innogen Agent v3")
+    parser.add_argument(
+        "--candidates",
+        type=int,
+        default=1,
+        help="Number of plan candidates to sample per problem in one round trip"
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Overlap planning, assembly and execution across problems"
+    )
+    parser.add_argument("--plan-workers", type=int, default=1, help="Concurrent planner workers (with --pipeline)")
+    parser.add_argument("--execute-workers", type=int, default=1, help="Concurrent browser workers (with --pipeline)")
+    parser.add_argument("--queue-size", type=int, default=2, help="Bounded queue size between stages (with --pipeline)")
+    parser.add_argument(
+        "--plan-batch",
+        type=int,
+        default=1,
+        help="Problems planned per LLM request; a problem the batch misses is planned alone (1 = no batching)"
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=300,
+        help="Seconds each problem may take across all stages (0 = no deadline)"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Run each stage under cProfile and tracemalloc (outputs/profile/)"
+    )
+    parser.add_argument("--profile-top", type=int, default=15, help="Entries per profile / allocation listing")
+    parser.add_argument("--max-tokens-per-problem", type=int, help="Stop planning a problem once it has used this many tokens")
+    parser.add_argument("--max-tokens-per-run", type=int, help="Stop all LLM calls once the run has used this many tokens")
+    parser.add_argument("--price-in", type=float, default=0.0, help="USD per million prompt tokens (usage report)")
+    parser.add_argument("--price-out", type=float, default=0.0, help="USD per million completion tokens (usage report)")
+    parser.add_argument("--llm-backend", choices=list(BACKENDS), help="Chat backend (default: LLM_BACKEND or openrouter)")
+    parser.add_argument("--llm-model", help="Model name sent to the backend (default: LLM_MODEL or the backend's)")
+    parser.add_argument("--llm-base-url", help="Endpoint of the backend (default: LLM_BASE_URL or the backend's)")
+    parser.add_argument(
+        "--sandbox-workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Sandboxes checking generated programs against fixtures at once (0 = no fixture checks)"
+    )
+    parser.add_argument("--metrics-file", help="Write Prometheus text metrics here at the end of the run")
+    parser.add_argument("--metrics-port", type=int, help="Serve live Prometheus metrics on localhost:PORT/metrics")
+    parser.add_argument(
+        "--semantic-cache",
+        choices=MODES,
+        default="off",
+        help="Reuse verified plans of paraphrased problems (shadow only measures)"
+    )
+    parser.add_argument(
+        "--semantic-cache-threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Minimum cosine similarity for a semantic cache hit"
+    )
+    return parser.parse_args()
 
 def main():
     """Main entry point"""
+    global SEMANTIC_CACHE, PROFILER, USAGE_LEDGER, LLM_BACKEND, SANDBOX
+    args = parse_args()
     problems_path = ROOT / "problems.json"
 
     if not problems_path.exists():
@@ -173,16 +587,71 @@ def main():
 
     OUTPUTS.mkdir(exist_ok=True)
 
+    if args.semantic_cache != "off":
+        SEMANTIC_CACHE = SemanticPlanCache(
+            str(OUTPUTS / "semantic_cache.jsonl"),
+            threshold=args.semantic_cache_threshold,
+            mode=args.semantic_cache
+        )
+
+    USAGE_LEDGER = UsageLedger(
+        str(OUTPUTS / "usage_ledger.jsonl"),
+        run_budget=args.max_tokens_per_run,
+        problem_budget=args.max_tokens_per_problem,
+        price_in=args.price_in,
+        price_out=args.price_out
+    )
+
+    try:
+        LLM_BACKEND = get_backend(args.llm_backend, args.llm_base_url, args.llm_model)
+    except BackendError as e:
+        # Every problem reports the planner error in its outputs
+        print(f"⚠️  {e}")
+
     print(f"🏁 Starting Innogen Agent v3 for team {team_id}")
     print(f"📊 Processing {len(problems)} problems")
+    if LLM_BACKEND is not None:
+        print(f"🤖 LLM backend: {LLM_BACKEND.name} ({LLM_BACKEND.model})")
+
+    if args.sandbox_workers > 0:
+        SANDBOX = SandboxPool(workers=args.sandbox_workers)
+
+    if args.profile:
+        PROFILER = StageProfiler(str(OUTPUTS / "profile"), top_n=args.profile_top)
+
+    if args.metrics_port is not None:
+        server = start_metrics_server(REGISTRY, args.metrics_port)
+        print(f"📡 Metrics on http://127.0.0.1:{server.server_address[1]}/metrics")
+
+    if args.pipeline:
+        run_pipelined(problems, team_id, args)
+        report_usage()
+        report_fixtures()
+        write_metrics(args)
+        print("\n🎯 Processing complete")
+        return
+
+    if args.plan_batch > 1:
+        problems = plan_in_batches(problems, args.plan_batch, args.deadline or None)
 
     for problem in problems:
         try:
-            process_problem(problem, team_id)
+            process_problem(
+                problem,
+                team_id,
+                num_candidates=args.candidates,
+                deadline_seconds=args.deadline or None
+            )
         except Exception as e:
             print(f"❌ Unexpected error processing {problem['problem_id']}: {e}")
 
+    print(f"\n🧩 Template cache: {TEMPLATE_CACHE.stats()}")
+    if SEMANTIC_CACHE:
+        print(f"♻️  Semantic cache: {SEMANTIC_CACHE.stats()}")
+    report_usage()
+    report_fixtures()
+    write_metrics(args)
     print("\n🎯 Processing complete")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
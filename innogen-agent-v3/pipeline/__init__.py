@@ -0,0 +1 @@
+# Pipeline Module
\ No newline at end of file
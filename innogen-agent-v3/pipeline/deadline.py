@@ -0,0 +1,97 @@
+"""
+Per-Problem Deadlines
+
+A Deadline is created when a problem enters the pipeline and travels with
+the job through every stage. LLM calls use its remaining time as their
+request timeout, and node subprocesses are killed (with their whole process
+group, so Chromium goes too) when it runs out. Per-problem latency is
+bounded even when a provider or the browser hangs.
+"""
+
+import os
+import signal
+import subprocess
+import time
+from typing import List, Optional
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a problem runs out of time."""
+
+
+class Deadline:
+    """
+    Absolute point in time a problem must finish by.
+
+    Usage:
+        deadline = Deadline(120)
+        deadline.check("plan")             # raises DeadlineExceeded if late
+        timeout = deadline.timeout(cap=60) # seconds left, at most 60
+    """
+
+    def __init__(self, seconds: Optional[float]):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds if seconds else None
+
+    @classmethod
+    def none(cls) -> "Deadline":
+        return cls(None)
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None for no deadline"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def check(self, what: str):
+        if self.expired():
+            raise DeadlineExceeded(f"{what}: deadline of {self.seconds}s exceeded")
+
+    def timeout(self, cap: Optional[float] = None) -> Optional[float]:
+        """Timeout for the next blocking call: the time left, optionally capped"""
+        remaining = self.remaining()
+        if remaining is None:
+            return cap
+        return remaining if cap is None else min(remaining, cap)
+
+
+def run_with_deadline(cmd: List[str], cwd=None, deadline: Optional[Deadline] = None, env=None):
+    """
+    subprocess.run(check=True) that kills the whole process group when the
+    deadline runs out. The remaining time is exported as RUN_DEADLINE_MS so
+    node scripts can give up on their own first.
+    """
+    deadline = deadline or Deadline.none()
+    deadline.check(" ".join(cmd[:2]))
+
+    timeout = deadline.remaining()
+    if timeout is not None:
+        env = dict(env if env is not None else os.environ, RUN_DEADLINE_MS=str(int(timeout * 1000)))
+
+    process = subprocess.Popen(cmd, cwd=cwd, env=env, start_new_session=True)
+    try:
+        returncode = process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        _kill_group(process)
+        raise DeadlineExceeded(f"{' '.join(cmd[:2])}: killed after deadline of {deadline.seconds}s")
+    except BaseException:
+        _kill_group(process)
+        raise
+
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+
+def _kill_group(process: subprocess.Popen, grace: float = 2.0):
+    """SIGTERM the process group, then SIGKILL whatever is left."""
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=grace)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+    except ProcessLookupError:
+        pass
@@ -0,0 +1,403 @@
+"""
+End-to-End Throughput Harness
+
+Runs the full v3 pipeline (plan → compile → execute, through the stage
+scheduler) on a synthetic corpus against local stand-ins: the stub LLM
+server (llm/stub_server.py, synthetic mode) and runner/stub_execute.js in
+place of the Blockly page. Every concurrency setting in the sweep gets a
+fresh run and reports:
+
+    problems/min, completed / failed counts
+    p50 / p95 / p99 / max latency per stage and end to end
+    CPU % and RSS sampled over time (this process and its Node children)
+    speedup of each setting over the first one
+
+The JSON report carries the corpus, stand-in settings, host and git
+revision, so reports from two revisions can be compared (--compare).
+
+Usage:
+    python -m pipeline.loadtest --problems 200 --plan-workers 1,4,8 --execute-workers 1,2 \\
+        --llm-latency lognormal:-1,0.5 --execute-ms 300,900
+    python -m pipeline.loadtest --problems 200 --compare outputs/loadtest/baseline.json
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import main as pipeline_main
+from llm.stub_server import StubConfig, base_url_for, start_server
+from llm.usage import UsageLedger
+from pipeline.scheduler import PipelineScheduler, Stage
+from semantic.template_cache import PlanTemplateCache
+
+REPORT_VERSION = 1
+DEFAULT_OUT_DIR = pipeline_main.OUTPUTS / "loadtest"
+
+# Problem shapes for the synthetic corpus; {a}, {b}, {c} are filled with numbers
+PROBLEM_TEMPLATES = [
+    "A student passes if marks are at least {a} and attendance is at least {b}.",
+    "A candidate qualifies only if written score is at least {a} interview score at least {b} and total does not exceed {c}.",
+    "A container must hold between {a} and {c} units. Check whether the load of {b} units fits.",
+    "Print the total of two prices if it is above {a}, otherwise print the difference.",
+    "A shop gives a discount when the bill is at least {a} and the customer has {b} points.",
+    "Check whether a speed above {a} km/h with a limit of {b} km/h deserves a fine.",
+    "An account is flagged when withdrawals exceed {a} or the balance drops below {b}.",
+    "A tank alarm sounds if the level is below {a} or above {c} litres.",
+]
+
+
+def synthetic_corpus(size: int, seed: int = 0) -> List[Dict[str, str]]:
+    """`size` problems in problems.json format, the same for the same seed"""
+    rng = random.Random(seed)
+    problems = []
+    for i in range(size):
+        a, b = rng.randint(1, 100), rng.randint(1, 100)
+        description = rng.choice(PROBLEM_TEMPLATES).format(a=a, b=b, c=a + b + rng.randint(1, 500))
+        problems.append({"problem_id": f"LT-{i:05d}", "description": description})
+    return problems
+
+
+def percentiles(values: List[float]) -> Dict[str, Any]:
+    """p50 / p95 / p99 / mean / max in seconds (linear interpolation)"""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def at(q: float) -> float:
+        pos = (len(ordered) - 1) * q
+        low = int(pos)
+        high = min(low + 1, len(ordered) - 1)
+        return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+    return {
+        "count": len(ordered),
+        "p50": round(at(0.50), 4),
+        "p95": round(at(0.95), 4),
+        "p99": round(at(0.99), 4),
+        "mean": round(sum(ordered) / len(ordered), 4),
+        "max": round(ordered[-1], 4),
+    }
+
+
+class ResourceSampler:
+    """
+    Samples CPU and RSS in a background thread.
+
+    CPU counts this process plus finished children (the Node scripts), so
+    it can exceed 100% on several cores. RSS is this process's resident
+    size; child_rss_max_mb is the largest child seen.
+    """
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.samples: List[Dict[str, float]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def _cpu_seconds(self) -> float:
+        total = 0.0
+        for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+            usage = resource.getrusage(who)
+            total += usage.ru_utime + usage.ru_stime
+        return total
+
+    def _rss_mb(self) -> float:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * self._page_size / 1e6
+        except OSError:
+            # Peak, in KB on Linux
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+    def _loop(self):
+        start = last_time = time.perf_counter()
+        last_cpu = self._cpu_seconds()
+        while not self._stop.wait(self.interval):
+            now, cpu = time.perf_counter(), self._cpu_seconds()
+            self.samples.append({
+                "t": round(now - start, 2),
+                "cpu_percent": round(100 * (cpu - last_cpu) / (now - last_time), 1),
+                "rss_mb": round(self._rss_mb(), 1),
+            })
+            last_time, last_cpu = now, cpu
+
+    def __enter__(self) -> "ResourceSampler":
+        self._thread = threading.Thread(target=self._loop, name="resource-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def summary(self) -> Dict[str, Any]:
+        cpu = [s["cpu_percent"] for s in self.samples]
+        rss = [s["rss_mb"] for s in self.samples]
+        return {
+            "cpu_percent_avg": round(sum(cpu) / len(cpu), 1) if cpu else None,
+            "cpu_percent_max": max(cpu) if cpu else None,
+            "rss_mb_max": max(rss) if rss else None,
+            "child_rss_max_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1e3, 1),
+            "samples": self.samples,
+        }
+
+
+@contextlib.contextmanager
+def quiet_output():
+    """Send stdout (the pipeline's and its Node children's) to /dev/null"""
+    sys.stdout.flush()
+    saved = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    try:
+        with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+            yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved, 1)
+        os.close(saved)
+        os.close(devnull)
+
+
+def run_setting(
+    problems: List[Dict[str, str]],
+    out_dir: Path,
+    plan_workers: int,
+    execute_workers: int,
+    queue_size: int,
+    candidates: int = 1,
+    deadline_seconds: Optional[float] = None,
+    sample_interval: float = 0.5,
+    quiet: bool = True
+) -> Dict[str, Any]:
+    """One pipelined run of the corpus with fresh caches and ledger."""
+    pipeline_main.OUTPUTS = out_dir
+    pipeline_main.TEMPLATE_CACHE = PlanTemplateCache()
+    pipeline_main.USAGE_LEDGER = UsageLedger()
+    pipeline_main.SEMANTIC_CACHE = None
+
+    durations: Dict[str, List[float]] = {"plan": [], "compile": [], "execute": [], "end_to_end": []}
+
+    def timed(name: str, fn, last: bool = False):
+        def wrapper(job):
+            start = time.perf_counter()
+            try:
+                result = fn(job)
+            finally:
+                durations[name].append(time.perf_counter() - start)
+            if last and result is not None:
+                durations["end_to_end"].append(time.perf_counter() - job["loadtest_started"])
+            return result
+        return wrapper
+
+    scheduler = PipelineScheduler(
+        [
+            Stage("plan", timed("plan", pipeline_main.stage_fn(pipeline_main.plan_stage)), workers=plan_workers),
+            Stage("compile", timed("compile", pipeline_main.stage_fn(pipeline_main.compile_stage))),
+            Stage("execute", timed("execute", pipeline_main.stage_fn(pipeline_main.execute_stage), last=True),
+                  workers=execute_workers),
+        ],
+        queue_size=queue_size
+    )
+
+    def jobs():
+        for problem in problems:
+            job = pipeline_main.new_job(problem, "TEAM_LOADTEST", candidates, deadline_seconds)
+            job["loadtest_started"] = time.perf_counter()
+            yield job
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with quiet_output() if quiet else contextlib.nullcontext(), ResourceSampler(sample_interval) as sampler:
+        scheduler.run(jobs())
+
+    report = scheduler.report()
+    return {
+        "label": f"plan{plan_workers}-execute{execute_workers}-queue{queue_size}",
+        "plan_workers": plan_workers,
+        "execute_workers": execute_workers,
+        "queue_size": queue_size,
+        "candidates": candidates,
+        "problems": len(problems),
+        "completed": report["completed"],
+        "dropped": sum(stage["dropped"] for stage in report["stages"].values()),
+        "failed": report["failed"],
+        "wall_seconds": report["wall_seconds"],
+        "problems_per_min": report["throughput_per_min"],
+        "bottleneck": report["bottleneck"],
+        "latency": {name: percentiles(values) for name, values in durations.items()},
+        "stages": report["stages"],
+        "tokens": pipeline_main.USAGE_LEDGER.report(top_n=0)["total_tokens"],
+        "resources": sampler.summary(),
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=pipeline_main.ROOT, capture_output=True, text=True, timeout=5
+        )
+        return result.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare_reports(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """problems/min and p95 end-to-end of settings present in both reports"""
+    previous = {run["label"]: run for run in baseline.get("runs", [])}
+    rows = []
+    for run in current["runs"]:
+        before = previous.get(run["label"])
+        if before is None:
+            continue
+        rate_before = before["problems_per_min"]
+        rows.append({
+            "label": run["label"],
+            "problems_per_min": [rate_before, run["problems_per_min"]],
+            "change": round(run["problems_per_min"] / rate_before - 1, 3) if rate_before else None,
+            "p95_end_to_end": [
+                before["latency"]["end_to_end"].get("p95"),
+                run["latency"]["end_to_end"].get("p95"),
+            ],
+        })
+    return rows
+
+
+def parse_list(text: str) -> List[int]:
+    return [int(v) for v in text.split(",") if v.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput and tail latency of the v3 pipeline on stand-ins")
+    parser.add_argument("--problems", type=int, default=100, help="Synthetic corpus size (10 to 10000)")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus and stub server seed")
+    parser.add_argument("--plan-workers", default="1,4", help="Comma list of planner worker counts to sweep")
+    parser.add_argument("--execute-workers", default="1,2", help="Comma list of browser worker counts to sweep")
+    parser.add_argument("--queue-size", default="2", help="Comma list of stage queue sizes to sweep")
+    parser.add_argument("--candidates", type=int, default=1, help="Plan candidates per problem")
+    parser.add_argument("--deadline", type=float, default=300, help="Seconds per problem (0 = no deadline)")
+    parser.add_argument("--llm-latency", default="lognormal:-1,0.5", help="Stub LLM latency (llm.stub_server spec)")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Fraction of LLM requests answered with 500")
+    parser.add_argument("--llm-rate-limit-rate", type=float, default=0.0, help="Fraction of LLM requests answered with 429")
+    parser.add_argument("--execute-ms", default="300,900", help="Stand-in page latency: MS or MIN,MAX")
+    parser.add_argument("--execute-fail-rate", type=float, default=0.0, help="Fraction of executions reported as failed")
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="Seconds between CPU / RSS samples")
+    parser.add_argument("--out-dir", default=str(DEFAULT_OUT_DIR), help="Problem outputs and the report go here")
+    parser.add_argument("--report", help="Report path (default: <out-dir>/report.json)")
+    parser.add_argument("--compare", help="Earlier report to compare throughput with")
+    parser.add_argument("--verbose", action="store_true", help="Keep the pipeline's own output")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not 1 <= args.problems <= 10000:
+        raise SystemExit("--problems must be between 1 and 10000")
+
+    out_dir = Path(args.out_dir)
+    problems = synthetic_corpus(args.problems, args.seed)
+
+    # Stand-ins: stub LLM on a free port, stub browser runner
+    stub = start_server(StubConfig(
+        mode="synthetic",
+        latency=args.llm_latency,
+        error_rate=args.llm_error_rate,
+        rate_limit_rate=args.llm_rate_limit_rate,
+        seed=args.seed,
+    ), port=0)
+    os.environ["OPENROUTER_BASE_URL"] = base_url_for(stub)
+    os.environ.setdefault("OPENROUTER_API_KEY", "stub")
+    os.environ["STUB_EXECUTE_MS"] = args.execute_ms
+    os.environ["STUB_EXECUTE_FAIL_RATE"] = str(args.execute_fail_rate)
+    if not args.verbose:
+        os.environ["NODE_NO_WARNINGS"] = "1"
+    pipeline_main.RUNNER_SCRIPT = "stub_execute.js"
+
+    settings = list(itertools.product(
+        parse_list(args.plan_workers), parse_list(args.execute_workers), parse_list(args.queue_size)
+    ))
+    print(f"🏋️  {len(problems)} problems × {len(settings)} settings (stub LLM on {base_url_for(stub)})")
+
+    runs = []
+    try:
+        for plan_workers, execute_workers, queue_size in settings:
+            label = f"plan{plan_workers}-execute{execute_workers}-queue{queue_size}"
+            run = run_setting(
+                problems,
+                out_dir / label,
+                plan_workers,
+                execute_workers,
+                queue_size,
+                candidates=args.candidates,
+                deadline_seconds=args.deadline or None,
+                sample_interval=args.sample_interval,
+                quiet=not args.verbose
+            )
+            runs.append(run)
+            e2e = run["latency"]["end_to_end"]
+            print(
+                f"   {label}: {run['problems_per_min']} problems/min, "
+                f"p50 {e2e.get('p50')}s p95 {e2e.get('p95')}s p99 {e2e.get('p99')}s, "
+                f"{run['completed']}/{run['problems']} completed, bottleneck {run['bottleneck']}"
+            )
+    finally:
+        stub.shutdown()
+
+    base_rate = runs[0]["problems_per_min"] if runs else 0
+    report = {
+        "version": REPORT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_revision": git_revision(),
+        "host": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "corpus": {"problems": len(problems), "seed": args.seed},
+        "stand_ins": {
+            "llm_latency": args.llm_latency,
+            "llm_error_rate": args.llm_error_rate,
+            "llm_rate_limit_rate": args.llm_rate_limit_rate,
+            "execute_ms": args.execute_ms,
+            "execute_fail_rate": args.execute_fail_rate,
+        },
+        "runs": runs,
+        "scaling": [
+            {
+                "label": run["label"],
+                "problems_per_min": run["problems_per_min"],
+                "speedup": round(run["problems_per_min"] / base_rate, 2) if base_rate else None,
+            }
+            for run in runs
+        ],
+    }
+
+    if args.compare:
+        report["compared_with"] = args.compare
+        report["comparison"] = compare_reports(report, json.loads(Path(args.compare).read_text()))
+        print("\n📊 Against", args.compare)
+        for row in report["comparison"]:
+            change = f" ({row['change']:+.1%})" if row["change"] is not None else ""
+            print(f"   {row['label']}: {row['problems_per_min'][0]} → {row['problems_per_min'][1]} problems/min{change}")
+
+    report_path = Path(args.report) if args.report else out_dir / "report.json"
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    report_path.write_text(json.dumps(report, indent=2))
+    print(f"\n📈 Report written to {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+Metrics Registry
+
+Counters, gauges and histograms for the orchestrator, exported in the
+Prometheus text exposition format. Export them as a textfile at the end of
+a run (node_exporter textfile collector), or serve them on a local
+/metrics endpoint during long batch runs.
+
+No client library is needed; the format is plain text.
+"""
+
+import re
+import threading
+import time
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+# Seconds; covers compile (ms) through LLM calls and browser runs (tens of s)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+# Quoted names inside validation reasons (masked to bound label values)
+QUOTED_RE = re.compile(r"(['\"`]).*?\1")
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram with _sum and _count series."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def time(self, **labels):
+        """Context manager observing the elapsed seconds of its block."""
+        histogram = self
+
+        class _Timer:
+            def __enter__(self):
+                self.start = time.perf_counter()
+                return self
+
+            def __exit__(self, *exc):
+                histogram.observe(time.perf_counter() - self.start, **labels)
+                return False
+
+        return _Timer()
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, dict(v, counts=list(v["counts"]))) for k, v in self._series.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["counts"]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Collection of metrics rendered together.
+
+    Collectors are callbacks run just before rendering, used to copy
+    values that live elsewhere (e.g. cache stats) into gauges.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+        self.collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} already registered with a different shape")
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, fn: Callable[[], None]):
+        self.collectors.append(fn)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        for collect in self.collectors:
+            collect()
+        lines: List[str] = []
+        for name in sorted(self.metrics):
+            metric = self.metrics[name]
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        """Write atomically so a scraping collector never sees a partial file."""
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_suffix(target.suffix + ".tmp")
+        tmp.write_text(self.render(), encoding="utf-8")
+        tmp.replace(target)
+
+
+def start_metrics_server(registry: "MetricsRegistry", port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve GET /metrics from a daemon thread. Port 0 picks a free port."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # keep the console for pipeline output
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+# -------------------------
+# Orchestrator metrics
+# -------------------------
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "innogen_stage_seconds", "Wall time of one pipeline stage for one problem", ["stage"]
+)
+STAGE_OUTCOMES = REGISTRY.counter(
+    "innogen_stage_outcomes_total", "Stage results by outcome (ok, dropped, error)", ["stage", "outcome"]
+)
+LLM_REQUESTS = REGISTRY.counter(
+    "innogen_llm_requests_total", "Chat completion requests by outcome (ok or error class)", ["outcome"]
+)
+LLM_RETRIES = REGISTRY.counter(
+    "innogen_llm_retries_total", "Chat completion retries after backoff, by error class", ["error_class"]
+)
+LLM_CONCURRENCY_LIMIT = REGISTRY.gauge(
+    "innogen_llm_concurrency_limit", "Current AIMD limit on LLM requests in flight"
+)
+LLM_TOKENS = REGISTRY.counter(
+    "innogen_llm_tokens_total", "LLM tokens reported by the provider", ["direction"]
+)
+LLM_SECONDS = REGISTRY.histogram(
+    "innogen_llm_request_seconds", "Latency of one chat completion call, including retries"
+)
+LLM_HEDGES = REGISTRY.counter(
+    "innogen_llm_hedged_total", "Requests that sent a hedge after the p90 latency, by winner", ["winner"]
+)
+BUDGET_EXCEEDED = REGISTRY.counter(
+    "innogen_budget_exceeded_total", "Problems stopped by a token budget, by scope (problem, run)", ["scope"]
+)
+BUDGET_DOWNGRADES = REGISTRY.counter(
+    "innogen_budget_downgrades_total", "Cheaper planning strategies chosen near a token budget", ["strategy"]
+)
+DEADLINE_EXCEEDED = REGISTRY.counter(
+    "innogen_deadline_exceeded_total", "Problems stopped by their deadline, by stage", ["stage"]
+)
+PLANNER_RETRIES = REGISTRY.counter(
+    "innogen_planner_retries_total", "Planner requests beyond the first for a problem"
+)
+BATCH_PLANS = REGISTRY.counter(
+    "innogen_batch_plans_total", "Problems sent in batched planner requests, by outcome (planned, fallback, rejected)", ["outcome"]
+)
+VALIDATION_FAILURES = REGISTRY.counter(
+    "innogen_validation_failures_total", "Plans rejected by validation, by reason", ["reason"]
+)
+FIXTURE_CHECKS = REGISTRY.counter(
+    "innogen_fixture_checks_total", "Generated programs checked against fixtures, by outcome", ["outcome"]
+)
+BROWSER_LAUNCH_SECONDS = REGISTRY.histogram(
+    "innogen_browser_launch_seconds", "Time to launch the headless browser"
+)
+PAGE_READY_SECONDS = REGISTRY.histogram(
+    "innogen_page_ready_seconds", "Time from navigation until Blockly is ready"
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "innogen_cache_requests_total", "Cache lookups by cache and result", ["cache", "result"]
+)
+CACHE_HIT_RATIO = REGISTRY.gauge(
+    "innogen_cache_hit_ratio", "Hit ratio of each cache over the run", ["cache"]
+)
+
+
+def reason_label(reason: str, limit: int = 60) -> str:
+    """
+    Bound label cardinality: keep the first clause of a free-text reason
+    and mask anything quoted (block names, expressions) in it.
+    """
+    text = str(reason).split(":")[0].split("\n")[0]
+    text = " ".join(QUOTED_RE.sub("_", text).split())
+    return text[:limit] or "unknown"
+
+
+def timed_stage(name: str) -> Callable:
+    """
+    Decorator recording latency and outcome of a stage function.
+    A stage that returns None counts as dropped.
+    """
+
+    def decorator(fn: Callable[[Any], Any]) -> Callable[[Any], Any]:
+        @wraps(fn)
+        def wrapper(item):
+            start = time.perf_counter()
+            try:
+                result = fn(item)
+            except Exception:
+                STAGE_OUTCOMES.inc(stage=name, outcome="error")
+                raise
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
+            STAGE_OUTCOMES.inc(stage=name, outcome="ok" if result is not None else "dropped")
+            return result
+
+        return wrapper
+
+    return decorator
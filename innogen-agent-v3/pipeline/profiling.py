@@ -0,0 +1,130 @@
+"""
+Stage Profiler
+
+Runs pipeline stages under cProfile and tracemalloc. For every problem and
+stage it writes:
+
+    <out_dir>/<pid>/<stage>.prof        cProfile stats (snakeviz / pstats)
+    <out_dir>/<pid>/<stage>_alloc.txt   top-N allocation growth by line
+    <out_dir>/<pid>/<stage>_alloc.json  same, machine readable
+
+write_summary() merges everything into <out_dir>/summary.txt plus one
+merged <stage>.prof per stage.
+
+cProfile and tracemalloc are process-wide, so profiled stages run one at
+a time even in --pipeline mode. Node subprocesses (XML generation, the
+browser) show up only as time spent waiting on them.
+"""
+
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+
+class StageProfiler:
+    """
+    Usage:
+        profiler = StageProfiler("outputs/profile")
+        job = profiler.run("plan", job["pid"], plan_stage, job)
+        profiler.write_summary()
+    """
+
+    def __init__(self, out_dir: str, top_n: int = 15):
+        self.out_dir = Path(out_dir)
+        self.top_n = top_n
+        self.wall: Dict[str, List[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def run(self, stage: str, pid: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Call fn under the profilers and write this problem's artifacts."""
+        problem_dir = self.out_dir / str(pid)
+        problem_dir.mkdir(parents=True, exist_ok=True)
+
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+            profile = cProfile.Profile()
+            start = time.perf_counter()
+            try:
+                return profile.runcall(fn, *args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                after = tracemalloc.take_snapshot()
+                self.wall[stage].append(elapsed)
+                profile.dump_stats(str(problem_dir / f"{stage}.prof"))
+                self._write_allocations(problem_dir, stage, after.compare_to(before, "lineno"))
+
+    def wrap(self, stage: str, fn: Callable[[Dict[str, Any]], Any]) -> Callable[[Dict[str, Any]], Any]:
+        """Profiled version of a stage function taking a job dict."""
+        return lambda job: self.run(stage, job["pid"], fn, job)
+
+    def _write_allocations(self, problem_dir: Path, stage: str, diffs: List[tracemalloc.StatisticDiff]):
+        # Allocations made by the profilers themselves are noise
+        ignored = (tracemalloc.__file__, cProfile.__file__, __file__)
+        diffs = [
+            d for d in diffs
+            if d.traceback[0].filename not in ignored
+        ][:self.top_n]
+
+        (problem_dir / f"{stage}_alloc.txt").write_text(
+            "\n".join(str(d) for d in diffs) + "\n"
+        )
+        (problem_dir / f"{stage}_alloc.json").write_text(json.dumps([
+            {
+                "location": f"{d.traceback[0].filename}:{d.traceback[0].lineno}",
+                "size_diff": d.size_diff,
+                "count_diff": d.count_diff,
+            }
+            for d in diffs
+        ], indent=2))
+
+    def write_summary(self) -> Path:
+        """Merge all per-problem artifacts into a batch summary."""
+        return write_summary(self.out_dir, self.top_n, self.wall)
+
+
+def write_summary(out_dir: Path, top_n: int = 15, wall: Optional[Dict[str, List[float]]] = None) -> Path:
+    """
+    Merge the .prof and _alloc.json files found under out_dir/<pid>/ into
+    out_dir/summary.txt and out_dir/<stage>.prof.
+    """
+    out_dir = Path(out_dir)
+    profiles: Dict[str, List[str]] = defaultdict(list)
+    allocations: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    for prof in sorted(out_dir.glob("*/*.prof")):
+        profiles[prof.stem].append(str(prof))
+    for alloc in sorted(out_dir.glob("*/*_alloc.json")):
+        stage = alloc.name[:-len("_alloc.json")]
+        for entry in json.loads(alloc.read_text()):
+            allocations[stage][entry["location"]] += entry["size_diff"]
+
+    report = io.StringIO()
+    for stage in sorted(profiles):
+        runs = profiles[stage]
+        report.write(f"=== {stage} ({len(runs)} runs) ===\n")
+        if wall and wall.get(stage):
+            times = wall[stage]
+            report.write(f"wall: total {sum(times):.3f}s, mean {sum(times) / len(times):.3f}s, max {max(times):.3f}s\n")
+
+        stats = pstats.Stats(*runs, stream=report)
+        stats.dump_stats(str(out_dir / f"{stage}.prof"))
+        stats.sort_stats("cumulative").print_stats(top_n)
+
+        report.write(f"Top {top_n} allocation growth (summed over problems):\n")
+        ranked = sorted(allocations[stage].items(), key=lambda kv: abs(kv[1]), reverse=True)[:top_n]
+        for location, size in ranked:
+            report.write(f"  {size / 1024:10.1f} KiB  {location}\n")
+        report.write("\n")
+
+    summary = out_dir / "summary.txt"
+    summary.write_text(report.getvalue())
+    return summary
@@ -0,0 +1,359 @@
+"""
+Sandboxed Fixture Checks
+
+Runs the generated Python (execution_output/result.txt) against fixture
+inputs and compares what it prints with the expected output, so a plan
+that compiles and executes but computes the wrong thing is caught
+without a human reading it.
+
+Every program runs in its own subprocess (pipeline/sandbox_harness.py
+under `python -I -S`) in an empty temporary directory with an empty
+environment, its own process group and resource limits: CPU seconds,
+address space, written file size, open files and processes (a fork loop
+gets a few dozen processes, not the machine's PIDs). Started as root, the
+harness switches to `nobody` before the limits apply, since root is
+exempt from the process limit. A wall-clock timeout kills the whole
+group. Inside, each fixture case runs in a forked child with input()
+replaced by a safe_input shim that feeds the case's inputs.
+
+These are resource limits, not isolation: the program can still read
+whatever `nobody` (or the invoking user) can read, and it has the
+network. They stop runaway loops, fork bombs and memory hogs in
+generated code; do not run untrusted code here without a container.
+
+Fixtures are listed per problem in problems.json:
+
+    {"problem_id": "PID-0006", "description": "...",
+     "fixtures": [
+         {"inputs": ["70", "20"], "expected": "Qualified"},
+         {"inputs": ["50", "20"], "expected": ["Not qualified"]},
+         {"inputs": ["90", "30"], "expected": "exceeds", "match": "contains"}
+     ]}
+
+`expected` is a string or a list of lines. Output and expectation are
+compared line by line with trailing whitespace and blank lines dropped
+("exact", the default) or as a substring ("contains").
+
+A pool of worker threads keeps that many sandboxes running at once; one
+interpreter start-up per program and a fork per case put a machine in
+the thousands of checked programs per minute (see --bench).
+
+Usage:
+    python -m pipeline.sandbox --outputs outputs
+    python -m pipeline.sandbox --bench 2000 --workers 8
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+HARNESS = Path(__file__).parent / "sandbox_harness.py"
+
+MATCH_MODES = ("exact", "contains")
+
+
+class SandboxError(Exception):
+    """Raised for invalid fixtures or sandbox configuration."""
+
+
+class Limits:
+    """Resource limits of one sandboxed program (per fixture case for time)."""
+
+    def __init__(
+        self,
+        cpu_seconds: int = 2,
+        memory_mb: int = 256,
+        case_timeout: float = 2.0,
+        wall_timeout: float = 10.0,
+        max_output: int = 64 * 1024,
+        file_size_kb: int = 1024,
+        open_files: int = 32,
+        processes: int = 64
+    ):
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.case_timeout = case_timeout
+        self.wall_timeout = wall_timeout
+        self.max_output = max_output
+        self.file_size_kb = file_size_kb
+        self.open_files = open_files
+        self.processes = processes
+
+    def rlimits(self) -> Dict[str, int]:
+        """
+        setrlimit values the harness applies to itself before anything
+        else (not preexec_fn, which is unsafe next to the pool's threads).
+        RLIMIT_CPU is per process, so every forked case gets the full allowance.
+        RLIMIT_NPROC counts every process of the user, so the harness adds
+        what is already running to this value.
+        """
+        return {
+            "RLIMIT_CPU": self.cpu_seconds,
+            "RLIMIT_AS": self.memory_mb * 1024 * 1024,
+            "RLIMIT_FSIZE": self.file_size_kb * 1024,
+            "RLIMIT_NOFILE": self.open_files,
+            "RLIMIT_CORE": 0,
+            "RLIMIT_NPROC": self.processes,
+        }
+
+
+# -------------------------
+# Fixtures and comparison
+# -------------------------
+def normalize_fixtures(fixtures: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Check the fixture list of one problem and fill in defaults"""
+    if not isinstance(fixtures, list):
+        raise SandboxError("fixtures must be a list")
+
+    normalized = []
+    for i, fixture in enumerate(fixtures):
+        if not isinstance(fixture, dict) or "expected" not in fixture:
+            raise SandboxError(f"fixture {i} needs an 'expected' output")
+        match = fixture.get("match", "exact")
+        if match not in MATCH_MODES:
+            raise SandboxError(f"fixture {i}: unknown match mode {match!r}")
+        expected = fixture["expected"]
+        if isinstance(expected, list):
+            expected = "\n".join(str(line) for line in expected)
+        normalized.append({
+            "inputs": [str(value) for value in fixture.get("inputs", [])],
+            "expected": str(expected),
+            "match": match,
+        })
+    return normalized
+
+
+def output_lines(text: str) -> List[str]:
+    return [line.rstrip() for line in text.splitlines() if line.strip()]
+
+
+def matches(actual: str, expected: str, match: str = "exact") -> bool:
+    if match == "contains":
+        return expected.strip() in actual
+    return output_lines(actual) == output_lines(expected)
+
+
+# -------------------------
+# Running
+# -------------------------
+class SandboxPool:
+    """
+    Checks programs against fixtures with up to `workers` sandboxes at once.
+
+    Usage:
+        pool = SandboxPool(workers=8)
+        result = pool.check(source, fixtures)
+        results = pool.check_many([(source, fixtures), ...])
+        pool.close()
+    """
+
+    def __init__(self, workers: Optional[int] = None, limits: Optional[Limits] = None,
+                 python: str = sys.executable):
+        self.workers = workers or os.cpu_count() or 1
+        self.limits = limits or Limits()
+        self.python = python
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sandbox")
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def check(self, source: str, fixtures: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Run one program on its fixtures (in the calling thread)"""
+        fixtures = normalize_fixtures(fixtures)
+        start = time.perf_counter()
+        if not fixtures:
+            return self._summary([], start)
+
+        try:
+            runs = self._run(source, [{"inputs": f["inputs"]} for f in fixtures])
+        except subprocess.TimeoutExpired:
+            runs = [{"status": "timeout", "error": "sandbox wall timeout", "stdout": "", "inputs_used": 0}] * len(fixtures)
+        except (OSError, ValueError) as e:
+            runs = [{"status": "killed", "error": str(e), "stdout": "", "inputs_used": 0}] * len(fixtures)
+
+        cases = []
+        for fixture, run in zip(fixtures, runs):
+            passed = run["status"] == "ok" and matches(run["stdout"], fixture["expected"], fixture["match"])
+            cases.append({
+                "inputs": fixture["inputs"],
+                "expected": fixture["expected"],
+                "actual": run["stdout"],
+                "status": run["status"],
+                "error": run.get("error", ""),
+                "inputs_used": run.get("inputs_used", 0),
+                "passed": passed,
+            })
+        return self._summary(cases, start)
+
+    def check_many(self, programs: List[tuple]) -> List[Dict[str, Any]]:
+        """check() for many (source, fixtures) pairs on the pool, in order"""
+        return list(self._executor.map(lambda item: self.check(*item), programs))
+
+    def submit(self, source: str, fixtures: List[Dict[str, Any]]):
+        """check() on the pool; returns a Future"""
+        return self._executor.submit(self.check, source, fixtures)
+
+    def _run(self, source: str, cases: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        job = json.dumps({
+            "source": source,
+            "cases": cases,
+            "timeout": self.limits.case_timeout,
+            "max_output": self.limits.max_output,
+            "rlimits": self.limits.rlimits(),
+        })
+        with tempfile.TemporaryDirectory(prefix="sandbox-") as workdir:
+            process = subprocess.Popen(
+                [self.python, "-I", "-S", str(HARNESS)],
+                cwd=workdir,
+                env={"PATH": "/usr/bin:/bin", "PYTHONHASHSEED": "0"},
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                start_new_session=True
+            )
+            try:
+                stdout, _ = process.communicate(job, timeout=self.limits.wall_timeout)
+            except subprocess.TimeoutExpired:
+                _kill_group(process)
+                raise
+        if process.returncode != 0 or not stdout:
+            raise ValueError(f"sandbox harness exited with {process.returncode}")
+        return json.loads(stdout)
+
+    @staticmethod
+    def _summary(cases: List[Dict[str, Any]], start: float) -> Dict[str, Any]:
+        passed = sum(1 for case in cases if case["passed"])
+        errors = sum(1 for case in cases if case["status"] != "ok")
+        if not cases:
+            outcome = "no_fixtures"
+        elif passed == len(cases):
+            outcome = "passed"
+        elif errors:
+            outcome = "error"
+        else:
+            outcome = "failed"
+        return {
+            "outcome": outcome,
+            "cases": len(cases),
+            "passed": passed,
+            "seconds": round(time.perf_counter() - start, 4),
+            "results": cases,
+        }
+
+
+def _kill_group(process: subprocess.Popen):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    process.wait()
+
+
+# -------------------------
+# Run report
+# -------------------------
+class FixtureReport:
+    """Fixture check results of a run, per problem (thread-safe)."""
+
+    def __init__(self):
+        self.problems: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, pid: str, result: Dict[str, Any]):
+        with self._lock:
+            self.problems[pid] = {k: v for k, v in result.items() if k != "results"}
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            outcomes: Dict[str, int] = {}
+            for result in self.problems.values():
+                outcomes[result["outcome"]] = outcomes.get(result["outcome"], 0) + 1
+            return {
+                "problems": len(self.problems),
+                "outcomes": outcomes,
+                "failing": sorted(pid for pid, r in self.problems.items() if r["outcome"] in ("failed", "error")),
+                "cases": sum(r["cases"] for r in self.problems.values()),
+                "cases_passed": sum(r["passed"] for r in self.problems.values()),
+                "by_problem": dict(sorted(self.problems.items())),
+            }
+
+
+# -------------------------
+# CLI
+# -------------------------
+BENCH_PROGRAM = (
+    "a = int(input('a: '))\n"
+    "b = int(input('b: '))\n"
+    "print('yes' if a + b >= 100 else 'no')\n"
+)
+BENCH_FIXTURES = [
+    {"inputs": ["60", "40"], "expected": "yes"},
+    {"inputs": ["10", "20"], "expected": "no"},
+]
+
+
+def check_outputs(problems_path: Path, outputs: Path, pool: SandboxPool) -> Dict[str, Any]:
+    """Re-check a finished run: each problem's result.txt against its fixtures"""
+    with open(problems_path) as f:
+        problems = json.load(f).get("problems", [])
+
+    report = FixtureReport()
+    pending = []
+    for problem in problems:
+        result_txt = outputs / f"Problem_{problem['problem_id']}" / "execution_output" / "result.txt"
+        if problem.get("fixtures") and result_txt.exists():
+            pending.append((problem["problem_id"], pool.submit(result_txt.read_text(), problem["fixtures"])))
+    for pid, future in pending:
+        report.add(pid, future.result())
+    return report.report()
+
+
+def bench(count: int, pool: SandboxPool) -> Dict[str, Any]:
+    """Programs checked per minute on this machine"""
+    start = time.perf_counter()
+    results = pool.check_many([(BENCH_PROGRAM, BENCH_FIXTURES)] * count)
+    elapsed = time.perf_counter() - start
+    return {
+        "programs": count,
+        "workers": pool.workers,
+        "seconds": round(elapsed, 2),
+        "programs_per_minute": round(count / elapsed * 60),
+        "all_passed": all(r["outcome"] == "passed" for r in results),
+    }
+
+
+def main(argv=None):
+    root = Path(__file__).parent.parent
+    parser = argparse.ArgumentParser(description="Check generated programs against fixture inputs in a sandbox")
+    parser.add_argument("--problems", type=Path, default=root / "problems.json", help="problems.json with fixtures")
+    parser.add_argument("--outputs", type=Path, default=root / "outputs", help="Run outputs to check")
+    parser.add_argument("--workers", type=int, help="Sandboxes at once (default: CPU count)")
+    parser.add_argument("--bench", type=int, metavar="N", help="Check a sample program N times and report throughput")
+    args = parser.parse_args(argv)
+
+    with SandboxPool(workers=args.workers) as pool:
+        if args.bench:
+            report = bench(args.bench, pool)
+        else:
+            report = check_outputs(args.problems, args.outputs, pool)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
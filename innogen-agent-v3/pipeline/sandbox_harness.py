@@ -0,0 +1,185 @@
+"""
+Sandbox Harness
+
+Runs inside the sandbox subprocess started by pipeline/sandbox.py, under
+`python -I -S`. Standard library only: the sandbox does not see the project
+or its packages.
+
+Started as root (Docker, CI), it first hands its working directory to
+`nobody` and drops to that user: root ignores RLIMIT_NPROC and could
+write anywhere. It then reads one JSON job from stdin and applies its
+resource limits:
+    {"source": "...", "cases": [{"inputs": ["70", "20"]}, ...],
+     "timeout": 2.0, "max_output": 65536,
+     "rlimits": {"RLIMIT_CPU": 2, "RLIMIT_AS": 268435456, ...}}
+(RLIMIT_NPROC is relative: processes on top of what the user already runs.)
+
+The program is compiled once; every case runs in its own forked child,
+so cases cannot leak state into each other and one interpreter start-up
+serves all of them. input() is replaced by safe_input, which hands out
+the case's fixture inputs in order (without echoing the prompt) and
+raises EOFError once they run out.
+
+Writes one JSON result per case to stdout:
+    {"status": "ok" | "error" | "timeout" | "cpu_limit" | "killed",
+     "stdout": "...", "error": "...", "inputs_used": 2}
+"""
+
+import builtins
+import io
+import json
+import os
+import pwd
+import resource
+import signal
+import sys
+import traceback
+
+
+class OutputLimitExceeded(Exception):
+    pass
+
+
+class CappedWriter(io.TextIOBase):
+    """stdout that stops the program once it has printed max_output characters"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.parts = []
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        self.size += len(text)
+        if self.size > self.limit:
+            raise OutputLimitExceeded(f"output exceeded {self.limit} characters")
+        self.parts.append(text)
+        return len(text)
+
+    def getvalue(self):
+        return "".join(self.parts)
+
+
+def run_case(code, inputs, timeout, max_output):
+    """In the forked child: run the program once and return its result"""
+    remaining = list(inputs)
+    used = 0
+
+    def safe_input(prompt=""):
+        nonlocal used
+        if not remaining:
+            raise EOFError("fixture inputs exhausted")
+        used += 1
+        return str(remaining.pop(0))
+
+    builtins.input = safe_input
+    out = CappedWriter(max_output)
+    sys.stdout = out
+    sys.stderr = io.StringIO()
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+
+    result = {"status": "ok", "error": ""}
+    try:
+        exec(code, {"__name__": "__main__", "__builtins__": builtins})
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            result = {"status": "error", "error": f"SystemExit: {e.code}"}
+    except BaseException as e:
+        lines = traceback.format_exception_only(type(e), e)
+        result = {"status": "error", "error": "".join(lines).strip()}
+    signal.setitimer(signal.ITIMER_REAL, 0)
+
+    result["stdout"] = out.getvalue()
+    result["inputs_used"] = used
+    return result
+
+
+def fork_case(code, case, timeout, max_output):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        # Output only reaches the parent through the result pipe
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+        os.dup2(devnull, 2)
+        try:
+            payload = json.dumps(run_case(code, case.get("inputs", []), timeout, max_output))
+        except BaseException as e:
+            payload = json.dumps({"status": "error", "error": repr(e), "stdout": "", "inputs_used": 0})
+        with os.fdopen(write_fd, "w") as pipe:
+            pipe.write(payload)
+        os._exit(0)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd, "r") as pipe:
+        payload = pipe.read()
+    _, status = os.waitpid(pid, 0)
+
+    if payload:
+        return json.loads(payload)
+    if os.WIFSIGNALED(status):
+        signum = os.WTERMSIG(status)
+        reason = {signal.SIGALRM: "timeout", signal.SIGXCPU: "cpu_limit"}.get(signum, "killed")
+        return {"status": reason, "error": signal.Signals(signum).name, "stdout": "", "inputs_used": 0}
+    return {"status": "killed", "error": f"exit status {status}", "stdout": "", "inputs_used": 0}
+
+
+def user_tasks():
+    """Processes and threads of this user: what RLIMIT_NPROC counts on Linux"""
+    uid = os.getuid()
+    count = 0
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            if os.stat(f"/proc/{pid}").st_uid == uid:
+                count += len(os.listdir(f"/proc/{pid}/task"))
+        except OSError:
+            pass  # exited meanwhile
+    return count
+
+
+def drop_root():
+    """As root: switch to nobody (owner of the working directory) for good"""
+    if os.getuid() != 0:
+        return
+    try:
+        nobody = pwd.getpwnam("nobody")
+        uid, gid = nobody.pw_uid, nobody.pw_gid
+    except KeyError:
+        uid = gid = 65534
+    os.chown(".", uid, gid)
+    os.setgroups([])
+    os.setgid(gid)
+    os.setuid(uid)
+
+
+def apply_limits(rlimits):
+    for name, value in rlimits.items():
+        if name == "RLIMIT_NPROC":
+            # Per user, not per process: allow `value` more than already run
+            value += user_tasks()
+        # The CPU hard limit sits a second above the soft one: SIGXCPU first, then SIGKILL
+        hard = value + 1 if name == "RLIMIT_CPU" else value
+        resource.setrlimit(getattr(resource, name), (value, hard))
+
+
+def main():
+    drop_root()
+    job = json.load(sys.stdin)
+    apply_limits(job.get("rlimits", {}))
+    try:
+        code = compile(job["source"], "<generated>", "exec")
+    except SyntaxError as e:
+        error = f"SyntaxError: {e.msg} (line {e.lineno})"
+        results = [{"status": "error", "error": error, "stdout": "", "inputs_used": 0} for _ in job["cases"]]
+    else:
+        results = [fork_case(code, case, job["timeout"], job["max_output"]) for case in job["cases"]]
+    sys.stdout.write(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Stage-Pipelined Scheduler
+
+Overlaps the pipeline stages across problems: while problem i+1 is being
+planned, problem i is compiling and problem i-1 is executing in the browser.
+Stages are connected by bounded queues, so a slow stage applies backpressure
+to the ones before it instead of letting work pile up in memory.
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Marks the end of the input stream on a stage queue
+_STOP = object()
+
+
+class Stage:
+    """
+    One pipeline stage.
+
+    The function receives an item and returns the item to hand to the next
+    stage, or None when the item is finished early (e.g. planning failed).
+    """
+
+    def __init__(self, name: str, fn: Callable[[Any], Any], workers: int = 1):
+        if workers < 1:
+            raise ValueError(f"Stage {name} needs at least one worker")
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+
+
+class StageStats:
+    """Timing counters for one stage, shared by its workers."""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.idle_seconds = 0.0      # waiting for input
+        self.blocked_seconds = 0.0   # waiting for space downstream
+        self._lock = threading.Lock()
+
+    def add(self, **deltas: float):
+        with self._lock:
+            for key, value in deltas.items():
+                setattr(self, key, getattr(self, key) + value)
+
+    def to_dict(self, wall_seconds: float) -> Dict[str, Any]:
+        capacity = wall_seconds * self.workers
+        return {
+            "workers": self.workers,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "idle_seconds": round(self.idle_seconds, 3),
+            "blocked_seconds": round(self.blocked_seconds, 3),
+            "utilization": round(self.busy_seconds / capacity, 3) if capacity else 0.0,
+            "avg_seconds": round(self.busy_seconds / self.processed, 3) if self.processed else 0.0,
+        }
+
+
+class PipelineScheduler:
+    """
+    Runs items through a list of stages with bounded queues in between.
+
+    Usage:
+        scheduler = PipelineScheduler([Stage("plan", plan), Stage("run", run)])
+        results = scheduler.run(problems)
+        print(scheduler.report())
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = 2):
+        if not stages:
+            raise ValueError("PipelineScheduler needs at least one stage")
+        self.stages = stages
+        self.queue_size = queue_size
+        self.stats = [StageStats(s.name, s.workers) for s in stages]
+        self.failures: List[Dict[str, Any]] = []
+        self.wall_seconds = 0.0
+        self.completed = 0
+
+    def run(
+        self,
+        items: Iterable[Any],
+        on_error: Optional[Callable[[Any, Exception], None]] = None,
+        prepare: Optional[Callable[[Any], Any]] = None
+    ) -> List[Any]:
+        """
+        Push every item through all stages and return the items that
+        came out of the last stage, in completion order.
+
+        `prepare` turns each item into what the first stage takes while it
+        is fed. An item that fails there, like one that fails in a stage,
+        is recorded as a failure (stage "feed") and passed to on_error; an
+        error raised by `items` itself is passed with item None and ends
+        the feeding. Items already fed still run to completion.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        results: List[Any] = []
+        results_lock = threading.Lock()
+        failures_lock = threading.Lock()
+
+        # Counts live workers per stage so the last one out forwards the stop
+        remaining = [s.workers for s in self.stages]
+        remaining_lock = threading.Lock()
+
+        def worker(index: int):
+            stage = self.stages[index]
+            stats = self.stats[index]
+            inbox = queues[index]
+            outbox = queues[index + 1] if index + 1 < len(queues) else None
+
+            while True:
+                wait_start = time.perf_counter()
+                item = inbox.get()
+                stats.add(idle_seconds=time.perf_counter() - wait_start)
+
+                if item is _STOP:
+                    break
+
+                start = time.perf_counter()
+                try:
+                    result = stage.fn(item)
+                except Exception as e:
+                    stats.add(busy_seconds=time.perf_counter() - start, failed=1)
+                    with failures_lock:
+                        self.failures.append({"stage": stage.name, "item": item, "error": str(e)})
+                    if on_error:
+                        on_error(item, e)
+                    continue
+                stats.add(busy_seconds=time.perf_counter() - start, processed=1)
+
+                if result is None:
+                    stats.add(dropped=1)
+                    continue
+
+                if outbox is None:
+                    with results_lock:
+                        results.append(result)
+                    continue
+
+                put_start = time.perf_counter()
+                outbox.put(result)
+                stats.add(blocked_seconds=time.perf_counter() - put_start)
+
+            with remaining_lock:
+                remaining[index] -= 1
+                last_out = remaining[index] == 0
+
+            if last_out and outbox is not None:
+                for _ in range(self.stages[index + 1].workers):
+                    outbox.put(_STOP)
+
+        threads = [
+            threading.Thread(target=worker, args=(i,), name=f"{stage.name}-{w}", daemon=True)
+            for i, stage in enumerate(self.stages)
+            for w in range(stage.workers)
+        ]
+
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        def feed_failed(item: Any, e: Exception):
+            with failures_lock:
+                self.failures.append({"stage": "feed", "item": item, "error": str(e)})
+            if on_error:
+                on_error(item, e)
+
+        # Feeding blocks when the first queue is full (backpressure)
+        iterator = iter(items)
+        try:
+            while True:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                except Exception as e:
+                    # A generator that raised is finished
+                    feed_failed(None, e)
+                    break
+
+                if prepare is not None:
+                    try:
+                        item = prepare(item)
+                    except Exception as e:
+                        feed_failed(item, e)
+                        continue
+                queues[0].put(item)
+        finally:
+            for _ in range(self.stages[0].workers):
+                queues[0].put(_STOP)
+
+        for thread in threads:
+            thread.join()
+
+        self.wall_seconds = time.perf_counter() - started
+        self.completed = len(results)
+        return results
+
+    def report(self) -> Dict[str, Any]:
+        """Per-stage utilization and overall throughput of the last run."""
+        stages = {s.name: s.to_dict(self.wall_seconds) for s in self.stats}
+        bottleneck = max(self.stats, key=lambda s: s.busy_seconds / s.workers).name if self.stats else None
+        return {
+            "wall_seconds": round(self.wall_seconds, 3),
+            "completed": self.completed,
+            "failed": len(self.failures),
+            "throughput_per_min": round(60 * self.completed / self.wall_seconds, 2) if self.wall_seconds else 0.0,
+            "bottleneck": bottleneck,
+            "stages": stages,
+        }
@@ -0,0 +1,123 @@
+import crypto from "crypto";
+import fs from "fs";
+import path from "path";
+import { fileURLToPath } from "url";
+
+/**
+ * Content-addressed cache of execution results, shared by runner_execute.js
+ * and runner_batch.js: keyed by the canonical XML and the page version, so
+ * a program executed by either runner is a hit for both.
+ */
+
+const __dirname = path.dirname(fileURLToPath(import.meta.url));
+
+export const PAGE_URL = "https://hackpy.tarcin.in/";
+export const EXECUTE_XML_SCRIPT = path.join(__dirname, "execute_xml.js");
+
+// EXECUTION_CACHE=off disables it
+export const CACHE_DIR = process.env.EXECUTION_CACHE_DIR || path.join(__dirname, ".cache", "executions");
+export const CACHE_ENABLED = process.env.EXECUTION_CACHE !== "off";
+
+// jsdom is only needed to canonicalize cache keys, so it is imported on
+// first use: runs with EXECUTION_CACHE=off never load it, and without it
+// keys fall back to the document text (fewer hits, never a wrong one).
+let xmlWindow = null;
+
+function xmlDOM() {
+  xmlWindow ??= import("jsdom")
+    .then(({ JSDOM }) => new JSDOM("").window)
+    .catch(error => {
+      console.warn(`⚠️  jsdom unavailable (${error.message}) - cache keys use the raw XML text`);
+      return null;
+    });
+  return xmlWindow;
+}
+
+function stripLayout(node, inField, Node) {
+  for (const child of [...node.childNodes]) {
+    if (child.nodeType === Node.ELEMENT_NODE) {
+      child.removeAttribute("id");
+      stripLayout(child, inField || child.localName === "field", Node);
+    } else if (child.nodeType === Node.TEXT_NODE && !inField && !child.data.trim()) {
+      node.removeChild(child);
+    }
+  }
+}
+
+/**
+ * Canonical form of a Blockly XML document: id attributes and the
+ * whitespace-only text between tags do not change the generated Python,
+ * so they are dropped. Text inside <field> is kept as it is, whitespace
+ * and all (print(" ") and print("") are different programs). A document
+ * that does not parse, or any document when jsdom is not installed, is
+ * keyed by its text.
+ */
+export async function canonicalizeXML(xmlText) {
+  const text = xmlText.replace(/\r\n?/g, "\n").trim();
+  const window = await xmlDOM();
+  if (!window) return text;
+
+  const { DOMParser, XMLSerializer, Node } = window;
+  const doc = new DOMParser().parseFromString(text, "text/xml");
+  if (doc.getElementsByTagName("parsererror").length) return text;
+
+  const root = doc.documentElement;
+  root.removeAttribute("id");
+  stripLayout(root, root.localName === "field", Node);
+  return new XMLSerializer().serializeToString(doc);
+}
+
+/**
+ * Version of the page and injected helper. Set BLOCKLY_PAGE_VERSION to pin
+ * it; otherwise the page's ETag / Last-Modified headers are used.
+ */
+export async function pageVersion() {
+  const helperHash = crypto
+    .createHash("sha256")
+    .update(fs.readFileSync(EXECUTE_XML_SCRIPT))
+    .digest("hex")
+    .slice(0, 12);
+
+  if (process.env.BLOCKLY_PAGE_VERSION) {
+    return `${process.env.BLOCKLY_PAGE_VERSION}:${helperHash}`;
+  }
+
+  try {
+    const response = await fetch(PAGE_URL, {
+      method: "HEAD",
+      signal: AbortSignal.timeout(3000)
+    });
+    const tag = response.headers.get("etag") || response.headers.get("last-modified");
+    return `${tag || "unversioned"}:${helperHash}`;
+  } catch {
+    return `unversioned:${helperHash}`;
+  }
+}
+
+export async function cacheKey(xmlText, version) {
+  const canonical = await canonicalizeXML(xmlText);
+  return crypto
+    .createHash("sha256")
+    .update(version)
+    .update("\0")
+    .update(canonical)
+    .digest("hex");
+}
+
+export function readCache(key) {
+  const entryPath = path.join(CACHE_DIR, `${key}.json`);
+  if (!fs.existsSync(entryPath)) return null;
+  try {
+    return JSON.parse(fs.readFileSync(entryPath, "utf-8"));
+  } catch {
+    return null; // corrupt entry: treat as a miss
+  }
+}
+
+export function writeCache(key, entry) {
+  fs.mkdirSync(CACHE_DIR, { recursive: true });
+  const entryPath = path.join(CACHE_DIR, `${key}.json`);
+  const tmpPath = `${entryPath}.${process.pid}.tmp`;
+  fs.writeFileSync(tmpPath, JSON.stringify(entry));
+  fs.renameSync(tmpPath, entryPath); // atomic for concurrent runners
+}
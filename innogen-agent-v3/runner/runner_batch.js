@@ -0,0 +1,241 @@
+import { chromium } from "playwright";
+import fs from "fs";
+import path from "path";
+
+import {
+  CACHE_ENABLED,
+  EXECUTE_XML_SCRIPT,
+  PAGE_URL,
+  cacheKey,
+  pageVersion,
+  readCache,
+  writeCache
+} from "./execution_cache.js";
+
+/**
+ * Batch runner: many XML programs through ONE browser session.
+ *
+ * runner_execute.js launches a browser and loads the page for every
+ * program. Here the page is loaded once and programs go through
+ * window.executeXMLBatch in chunks, one page.evaluate round trip per
+ * chunk: a 500-problem batch is one page load and a handful of calls.
+ *
+ * Input is a directory of *.xml files (id = file name) or a JSONL file
+ * with one {"id": ..., "xml": ...} document per line. Every item gets the
+ * files runner_execute.js writes (result.xml, result.txt, diagnostics.txt)
+ * in <output_dir>/<id>/; per-item status and timing go to
+ * <output_dir>/batch_results.jsonl and the totals to batch_timings.json.
+ *
+ * A chunk whose evaluate call fails (page crash, navigation) is retried
+ * item by item on a reloaded page, so one bad program only fails itself.
+ *
+ *   node runner_batch.js <xml_dir | programs.jsonl> <output_dir> [--chunk 100]
+ *
+ * EXECUTION_CACHE / EXECUTION_CACHE_DIR: as for runner_execute.js
+ * RUN_DEADLINE_MS: close the browser and exit (124) after this long
+ */
+
+const DEFAULT_CHUNK = 100;
+
+// Blockly load delay after navigation (as in runner_execute.js)
+const PAGE_SETTLE_MS = 6000;
+
+const DEADLINE_MS = Number(process.env.RUN_DEADLINE_MS || 0);
+
+function parseArgs(argv) {
+  const args = { chunk: DEFAULT_CHUNK, positional: [] };
+  for (let i = 0; i < argv.length; i++) {
+    if (argv[i] === "--chunk") {
+      args.chunk = Math.max(1, Number(argv[++i]) || DEFAULT_CHUNK);
+    } else {
+      args.positional.push(argv[i]);
+    }
+  }
+  return args;
+}
+
+const ARGS = parseArgs(process.argv.slice(2));
+const [INPUT, OUTPUT_DIR] = ARGS.positional;
+
+if (!INPUT || !OUTPUT_DIR) {
+  console.error("Usage: node runner_batch.js <xml_dir | programs.jsonl> <output_dir> [--chunk 100]");
+  process.exit(1);
+}
+
+/**
+ * [{id, xml}] from a directory of .xml files or a JSONL file. Ids are
+ * made safe as directory names; duplicates are rejected.
+ */
+function loadPrograms(input) {
+  let programs;
+  if (fs.statSync(input).isDirectory()) {
+    programs = fs
+      .readdirSync(input)
+      .filter(name => name.endsWith(".xml"))
+      .sort()
+      .map(name => ({
+        id: path.basename(name, ".xml"),
+        xml: fs.readFileSync(path.join(input, name), "utf-8")
+      }));
+  } else {
+    programs = fs
+      .readFileSync(input, "utf-8")
+      .split("\n")
+      .map((line, i) => [line.trim(), i])
+      .filter(([line]) => line)
+      .map(([line, i]) => {
+        const entry = JSON.parse(line);
+        if (typeof entry.xml !== "string") {
+          throw new Error(`${input}:${i + 1}: missing "xml"`);
+        }
+        return { id: String(entry.id ?? entry.problem_id ?? i), xml: entry.xml };
+      });
+  }
+
+  const seen = new Set();
+  for (const program of programs) {
+    program.id = program.id.replace(/[^A-Za-z0-9_.-]/g, "_");
+    if (seen.has(program.id)) throw new Error(`Duplicate program id: ${program.id}`);
+    seen.add(program.id);
+  }
+  return programs;
+}
+
+function writeOutputs(id, xmlText, python, diagnostics) {
+  const dir = path.join(OUTPUT_DIR, id);
+  fs.mkdirSync(dir, { recursive: true });
+  fs.writeFileSync(path.join(dir, "result.xml"), xmlText);
+  fs.writeFileSync(path.join(dir, "result.txt"), python || "");
+  fs.writeFileSync(path.join(dir, "diagnostics.txt"), diagnostics);
+}
+
+function diagnosticsFor(result) {
+  if (result.status === "success") return "Execution successful\n";
+  return `Execution failed: ${result.status}\nError: ${result.error || "Unknown error"}\n`;
+}
+
+async function openPage(page) {
+  await page.goto(PAGE_URL);
+  await page.waitForTimeout(PAGE_SETTLE_MS);
+  await page.addScriptTag({ path: EXECUTE_XML_SCRIPT });
+}
+
+(async () => {
+  const programs = loadPrograms(INPUT);
+  fs.mkdirSync(OUTPUT_DIR, { recursive: true });
+  console.log(`🔄 Executing ${programs.length} programs from ${INPUT}`);
+
+  const timings = { items: programs.length, chunk: ARGS.chunk, round_trips: 0, reloads: 0, cache_hits: 0 };
+  const results = new Map();
+
+  // Cached programs never reach the browser
+  let version = null;
+  const keys = new Map();
+  let pending = programs;
+  if (CACHE_ENABLED) {
+    version = await pageVersion();
+    pending = [];
+    for (const program of programs) {
+      const key = await cacheKey(program.xml, version);
+      keys.set(program.id, key);
+      const cached = readCache(key);
+      if (cached) {
+        results.set(program.id, { id: program.id, status: "success", python: cached.python, error: "", ms: 0, cache: "hit" });
+        timings.cache_hits += 1;
+      } else {
+        pending.push(program);
+      }
+    }
+  }
+
+  if (pending.length) {
+    let phaseStart = performance.now();
+    const browser = await chromium.launch({ headless: true });
+    const page = await browser.newPage();
+    timings.browser_launch_ms = Math.round(performance.now() - phaseStart);
+
+    let watchdog = null;
+    if (DEADLINE_MS) {
+      page.setDefaultTimeout(DEADLINE_MS);
+      watchdog = setTimeout(async () => {
+        console.error("⏰ Deadline reached - closing browser");
+        await browser.close().catch(() => {});
+        process.exit(124);
+      }, Math.max(DEADLINE_MS - 1000, 0));
+    }
+
+    try {
+      phaseStart = performance.now();
+      await openPage(page);
+      timings.page_ready_ms = Math.round(performance.now() - phaseStart);
+
+      phaseStart = performance.now();
+      for (let start = 0; start < pending.length; start += ARGS.chunk) {
+        const chunk = pending.slice(start, start + ARGS.chunk);
+        let batch;
+        try {
+          timings.round_trips += 1;
+          batch = await page.evaluate(items => window.executeXMLBatch(items), chunk);
+        } catch (error) {
+          console.error(`⚠️  Chunk at ${start} failed (${error.message}) - retrying item by item`);
+          batch = { results: [] };
+          for (const item of chunk) {
+            try {
+              timings.reloads += 1;
+              await openPage(page);
+              timings.round_trips += 1;
+              const single = await page.evaluate(items => window.executeXMLBatch(items), [item]);
+              batch.results.push(...single.results);
+            } catch (itemError) {
+              batch.results.push({ id: item.id, status: "evaluate_error", python: "", error: itemError.message, ms: 0 });
+            }
+          }
+          // Leave a working page for the next chunk
+          timings.reloads += 1;
+          await openPage(page).catch(() => {});
+        }
+        for (const result of batch.results) {
+          results.set(result.id, { ...result, cache: CACHE_ENABLED ? "miss" : "off" });
+        }
+        console.log(`   ${Math.min(start + ARGS.chunk, pending.length)}/${pending.length} executed`);
+      }
+      timings.execute_ms = Math.round(performance.now() - phaseStart);
+    } finally {
+      clearTimeout(watchdog);
+      await browser.close();
+    }
+  }
+
+  // Outputs in input order; anything the page did not report is an error
+  const statuses = {};
+  const lines = [];
+  for (const program of programs) {
+    const result = results.get(program.id) || {
+      id: program.id, status: "missing", python: "", error: "No result from the page", ms: 0, cache: "miss"
+    };
+    const diagnostics = diagnosticsFor(result);
+    writeOutputs(program.id, program.xml, result.python, diagnostics);
+    statuses[result.status] = (statuses[result.status] || 0) + 1;
+    lines.push(JSON.stringify({ id: result.id, status: result.status, error: result.error, ms: result.ms, cache: result.cache }));
+
+    // Only successful runs are cached; failures may be transient page issues
+    if (result.cache === "miss" && result.status === "success") {
+      writeCache(keys.get(program.id), {
+        python: result.python,
+        diagnostics,
+        page_version: version,
+        created: new Date().toISOString()
+      });
+    }
+  }
+
+  timings.statuses = statuses;
+  fs.writeFileSync(path.join(OUTPUT_DIR, "batch_results.jsonl"), lines.join("\n") + (lines.length ? "\n" : ""));
+  fs.writeFileSync(path.join(OUTPUT_DIR, "batch_timings.json"), JSON.stringify(timings, null, 2));
+
+  console.log(`✅ ${statuses.success || 0}/${programs.length} successful in ${timings.round_trips} round trips`);
+  console.log("📋 Statuses:", JSON.stringify(statuses));
+})().catch(error => {
+  console.error("❌ Batch execution error:", error.message);
+  process.exit(1);
+});
@@ -2,6 +2,20 @@ import { chromium } from "playwright";
 import fs from "fs";
 import path from "path";
 
+import {
+  CACHE_ENABLED,
+  EXECUTE_XML_SCRIPT,
+  PAGE_URL,
+  cacheKey,
+  pageVersion,
+  readCache,
+  writeCache
+} from "./execution_cache.js";
+
+// Time left in the problem deadline (set by main.py); the browser is closed
+// before the orchestrator has to kill the process group
+const DEADLINE_MS = Number(process.env.RUN_DEADLINE_MS || 0);
+
 // Get XML path from command line arguments
 const XML_PATH = process.argv[2];
 const OUTPUT_DIR = process.argv[3];
@@ -11,6 +25,23 @@ if (!XML_PATH || !OUTPUT_DIR) {
   process.exit(1);
 }
 
+// Phase timings read by main.py for the metrics registry
+function writeTimings(timings) {
+  fs.mkdirSync(OUTPUT_DIR, { recursive: true });
+  fs.writeFileSync(path.join(OUTPUT_DIR, "timings.json"), JSON.stringify(timings, null, 2));
+}
+
+function writeOutputs(xmlText, python, diagnostics) {
+  // Ensure output directory exists
+  fs.mkdirSync(OUTPUT_DIR, { recursive: true });
+
+  fs.writeFileSync(path.join(OUTPUT_DIR, "result.xml"), xmlText);
+  fs.writeFileSync(path.join(OUTPUT_DIR, "result.txt"), python || "");
+
+  // Write diagnostics to a file for main.py to read
+  fs.writeFileSync(path.join(OUTPUT_DIR, "diagnostics.txt"), diagnostics);
+}
+
 (async () => {
   try {
     // Load XML generated by compiler
@@ -18,36 +49,60 @@ if (!XML_PATH || !OUTPUT_DIR) {
 
     console.log(`🔄 Executing XML: ${XML_PATH}`);
 
+    const timings = { cache: CACHE_ENABLED ? "miss" : "off" };
+
+    let key = null;
+    let version = null;
+    if (CACHE_ENABLED) {
+      version = await pageVersion();
+      key = await cacheKey(xmlText, version);
+
+      const cached = readCache(key);
+      if (cached) {
+        writeOutputs(xmlText, cached.python, cached.diagnostics);
+        writeTimings({ cache: "hit" });
+        console.log(`⚡ Execution cache hit (${key.slice(0, 12)}) - browser skipped`);
+        console.log("📋 Diagnostics:", cached.diagnostics.trim());
+        return;
+      }
+    }
+
+    let phaseStart = performance.now();
     const browser = await chromium.launch({ headless: true }); // Run headless for automation
     const page = await browser.newPage();
+    timings.browser_launch_ms = Math.round(performance.now() - phaseStart);
+
+    let watchdog = null;
+    if (DEADLINE_MS) {
+      page.setDefaultTimeout(DEADLINE_MS);
+      watchdog = setTimeout(async () => {
+        console.error("⏰ Deadline reached - closing browser");
+        await browser.close().catch(() => {});
+        process.exit(124);
+      }, Math.max(DEADLINE_MS - 1000, 0));
+    }
 
     // Open CodeAsthram
-    await page.goto("https://hackpy.tarcin.in/");
+    phaseStart = performance.now();
+    await page.goto(PAGE_URL);
     await page.waitForTimeout(6000); // Blockly load delay
+    timings.page_ready_ms = Math.round(performance.now() - phaseStart);
 
     // Inject execution helper
     await page.addScriptTag({
-      path: path.resolve("./execute_xml.js")
+      path: EXECUTE_XML_SCRIPT
     });
 
     // Execute XML in browser
+    phaseStart = performance.now();
     const result = await page.evaluate(
       xml => window.executeXML(xml),
       xmlText
     );
+    timings.execute_ms = Math.round(performance.now() - phaseStart);
 
     console.log("📊 Execution result:", result.status);
 
-    // Ensure output directory exists
-    fs.mkdirSync(OUTPUT_DIR, { recursive: true });
-
-    // Save outputs
-    const xmlOutputPath = path.join(OUTPUT_DIR, "result.xml");
-    const txtOutputPath = path.join(OUTPUT_DIR, "result.txt");
-
-    fs.writeFileSync(xmlOutputPath, xmlText);
-    fs.writeFileSync(txtOutputPath, result.python || "");
-
     // Handle diagnostics
     let diagnostics = "";
     if (result.status !== "success") {
@@ -58,11 +113,21 @@ if (!XML_PATH || !OUTPUT_DIR) {
       console.log(`✅ Execution successful - Generated ${result.python.length} characters of Python code`);
     }
 
+    clearTimeout(watchdog);
     await browser.close();
 
-    // Write diagnostics to a file for main.py to read
-    const diagnosticsPath = path.join(OUTPUT_DIR, "diagnostics.txt");
-    fs.writeFileSync(diagnosticsPath, diagnostics);
+    writeOutputs(xmlText, result.python, diagnostics);
+    writeTimings(timings);
+
+    // Only successful runs are cached; failures may be transient page issues
+    if (key && result.status === "success") {
+      writeCache(key, {
+        python: result.python,
+        diagnostics,
+        page_version: version,
+        created: new Date().toISOString()
+      });
+    }
 
     // Return diagnostics for the bug file
     console.log("📋 Diagnostics:", diagnostics.trim());
@@ -76,4 +141,4 @@ if (!XML_PATH || !OUTPUT_DIR) {
     const diagnostics = `Execution setup failed: ${error.message}\n`;
     console.log("📋 Error diagnostics:", diagnostics.trim());
   }
-})();
\ No newline at end of file
+})();
@@ -0,0 +1,49 @@
+import fs from "fs";
+import path from "path";
+
+/**
+ * Local stand-in for runner_execute.js (no browser, no network).
+ *
+ * Same command line and output files, so the pipeline can be load-tested
+ * offline: it waits a sampled "page" latency, then writes result.xml,
+ * result.txt, diagnostics.txt and timings.json.
+ *
+ * STUB_EXECUTE_MS         latency in ms: "800" or "MIN,MAX" (uniform), default 0
+ * STUB_EXECUTE_FAIL_RATE  fraction of runs reported as failed, default 0
+ */
+
+const XML_PATH = process.argv[2];
+const OUTPUT_DIR = process.argv[3];
+
+if (!XML_PATH || !OUTPUT_DIR) {
+  console.error("Usage: node stub_execute.js <xml_path> <output_dir>");
+  process.exit(1);
+}
+
+function sampleLatency(spec) {
+  const [min, max] = String(spec || "0").split(",").map(Number);
+  if (max === undefined || Number.isNaN(max)) return min || 0;
+  return min + Math.random() * (max - min);
+}
+
+const xmlText = fs.readFileSync(XML_PATH, "utf-8");
+const latency = sampleLatency(process.env.STUB_EXECUTE_MS);
+const failed = Math.random() < Number(process.env.STUB_EXECUTE_FAIL_RATE || 0);
+
+setTimeout(() => {
+  const blocks = (xmlText.match(/<block /g) || []).length;
+  const diagnostics = failed
+    ? "Execution failed: stub\nError: Injected failure (stub)\n"
+    : "Execution successful\n";
+
+  fs.mkdirSync(OUTPUT_DIR, { recursive: true });
+  fs.writeFileSync(path.join(OUTPUT_DIR, "result.xml"), xmlText);
+  fs.writeFileSync(path.join(OUTPUT_DIR, "result.txt"), failed ? "" : `# stub execution: ${blocks} blocks\n`);
+  fs.writeFileSync(path.join(OUTPUT_DIR, "diagnostics.txt"), diagnostics);
+  fs.writeFileSync(
+    path.join(OUTPUT_DIR, "timings.json"),
+    JSON.stringify({ cache: "off", browser_launch_ms: 0, page_ready_ms: 0, execute_ms: Math.round(latency) }, null, 2)
+  );
+
+  console.log("📋 Diagnostics:", diagnostics.trim());
+}, latency);
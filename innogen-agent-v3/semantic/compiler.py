@@ -5,17 +5,24 @@ Converts validated semantic JSON into block tree JSON for XML generation.
 """
 
 import re
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
+
+from semantic.blocks import NODES, Block, NodeTable
 
 class SemanticCompiler:
     """
     Compiles semantic plans into block trees.
+
+    Trees are Block objects (see semantic/blocks.py), built bottom-up and
+    hash-consed: identical subtrees are shared, within a tree and across
+    compiled plans. Use block_tree.to_dict() for the JSON form.
     """
 
-    def __init__(self):
+    def __init__(self, nodes: Optional[NodeTable] = None):
         self.variable_counter = 0
+        self.nodes = nodes or NODES
 
-    def compile(self, semantic_plan: Dict[str, Any]) -> Dict[str, Any]:
+    def compile(self, semantic_plan: Dict[str, Any]) -> Block:
         """
         Compile semantic plan to block tree.
 
@@ -23,60 +30,61 @@ class SemanticCompiler:
             semantic_plan: Validated semantic plan
 
         Returns:
-            Block tree JSON
+            Block tree (root Block; statements follow through `next`)
         """
-        # Start with input blocks
-        head = None
-        current = None
+        # Statements in program order; linked through `next` at the end
+        statements: List[Dict[str, Any]] = []
 
         # 1. Create input variables
         for var_name in semantic_plan.get("inputs", []):
-            input_block = self._create_input_block(var_name)
-            head, current = self._chain_blocks(head, current, input_block)
+            statements.append(self._create_input_block(var_name))
 
         # 2. Create derived calculations
         for derived_expr in semantic_plan.get("derived", []):
             derived_block = self._create_derived_block(derived_expr)
             if derived_block:
-                head, current = self._chain_blocks(head, current, derived_block)
+                statements.append(derived_block)
 
         # 3. Create conditional logic with actions
         condition = semantic_plan.get("condition")
         if condition:
             condition_block = self._create_condition_block(condition, semantic_plan.get("actions", {}))
             if condition_block:
-                head, current = self._chain_blocks(head, current, condition_block)
+                statements.append(condition_block)
 
         # 4. If no condition, just execute the then actions
         elif semantic_plan.get("actions", {}).get("then"):
             for action in semantic_plan["actions"]["then"]:
                 action_block = self._create_action_block(action)
                 if action_block:
-                    head, current = self._chain_blocks(head, current, action_block)
+                    statements.append(action_block)
+
+        if not statements:
+            statements.append(self._print_block("No operations"))  # Fallback
 
-        return head if head else {"type": "text_print", "value_inputs": {"TEXT": {"type": "text_literal", "fields": {"TEXT": "No operations"}}}}  # Fallback
+        return self._chain_blocks(statements)
 
-    def _chain_blocks(self, head: Dict, current: Dict, new_block: Dict) -> tuple:
-        """Chain a new block to the sequence"""
-        if head is None:
-            return new_block, new_block
-        current["next"] = new_block
-        return head, new_block
+    def _chain_blocks(self, statements: List[Dict[str, Any]]) -> Optional[Block]:
+        """
+        Build a statement sequence. Blocks are immutable, so the chain is
+        built from its tail: each block is created with its `next` in place.
+        """
+        head = None
+        for statement in reversed(statements):
+            head = self.nodes.block(**statement, next=head)
+        return head
 
     def _create_input_block(self, var_name: str) -> Dict[str, Any]:
         """Create a block to read input into a variable"""
         return {
             "type": "essentials_var_set",
-            "fields": {"VAR": var_name},
-            "value_inputs": {
-                "VALUE": {
-                    "type": "essentials_safe_input",
-                    "fields": {"TYPE": "str"}
-                }
-            }
+            "fields": (("VAR", var_name),),
+            "value_inputs": (
+                ("VALUE", self.nodes.block("essentials_safe_input", fields=(("TYPE", "str"),))),
+            )
         }
 
-    def _create_derived_block(self, derived_expr: str) -> Dict[str, Any]:
+    def _create_derived_block(self, derived_expr: str) -> Optional[Dict[str, Any]]:
         """Create a block for a derived calculation"""
         # Parse expressions like "total = a + b"
         match = re.match(r'^(\w+)\s*=\s*(.+)$', derived_expr.strip())
@@ -91,11 +99,11 @@ class SemanticCompiler:
 
         return {
             "type": "essentials_var_set",
-            "fields": {"VAR": var_name},
-            "value_inputs": {"VALUE": calc_block}
+            "fields": (("VAR", var_name),),
+            "value_inputs": (("VALUE", calc_block),)
         }
 
-    def _parse_expression(self, expr: str) -> Dict[str, Any]:
+    def _parse_expression(self, expr: str) -> Block:
         """Parse a mathematical expression into blocks"""
         expr = expr.strip()
 
@@ -118,74 +126,58 @@ class SemanticCompiler:
                         '/': '/'
                     }.get(op)
 
-                    return {
-                        "type": "essentials_num_arithmetic",
-                        "fields": {"OP": op_field},
-                        "value_inputs": {
-                            "A": self._parse_operand(left),
-                            "B": self._parse_operand(right)
-                        }
-                    }
+                    return self.nodes.block(
+                        "essentials_num_arithmetic",
+                        fields=(("OP", op_field),),
+                        value_inputs=(
+                            ("A", self._parse_operand(left)),
+                            ("B", self._parse_operand(right))
+                        )
+                    )
 
         # Single operand
         return self._parse_operand(expr)
 
-    def _parse_operand(self, operand: str) -> Dict[str, Any]:
+    def _parse_operand(self, operand: str) -> Block:
         """Parse a single operand (variable or number)"""
         operand = operand.strip()
 
         # Check if it's a number
         try:
             float(operand)
-            return {
-                "type": "essentials_num_literal",
-                "fields": {"NUM": operand}
-            }
+            return self.nodes.block("essentials_num_literal", fields=(("NUM", operand),))
         except ValueError:
             pass
 
         # Assume it's a variable
-        return {
-            "type": "essentials_var_get",
-            "fields": {"VAR": operand}
-        }
+        return self.nodes.block("essentials_var_get", fields=(("VAR", operand),))
 
     def _create_condition_block(self, condition: str, actions: Dict[str, List[str]]) -> Dict[str, Any]:
         """Create an if-else block with condition and actions"""
         condition_block = self._parse_condition(condition)
 
         # Create then branch
-        then_head = None
-        then_current = None
-        for action in actions.get("then", []):
-            action_block = self._create_action_block(action)
-            if action_block:
-                then_head, then_current = self._chain_blocks(then_head, then_current, action_block)
+        then_blocks = [b for b in (self._create_action_block(a) for a in actions.get("then", [])) if b]
 
         # Create else branch
-        else_head = None
-        else_current = None
-        for action in actions.get("else", []):
-            action_block = self._create_action_block(action)
-            if action_block:
-                else_head, else_current = self._chain_blocks(else_head, else_current, action_block)
+        else_blocks = [b for b in (self._create_action_block(a) for a in actions.get("else", [])) if b]
 
         # Create if block
-        if_block = {
-            "type": "control_if_truthy",
-            "value_inputs": {"EXPR": condition_block},
-            "statement_inputs": {}
-        }
+        statement_inputs = []
 
-        if then_head:
-            if_block["statement_inputs"]["THEN"] = then_head
+        if then_blocks:
+            statement_inputs.append(("THEN", self._chain_blocks(then_blocks)))
 
-        if else_head:
-            if_block["statement_inputs"]["ELSE"] = else_head
+        if else_blocks:
+            statement_inputs.append(("ELSE", self._chain_blocks(else_blocks)))
 
-        return if_block
+        return {
+            "type": "control_if_truthy",
+            "value_inputs": (("EXPR", condition_block),),
+            "statement_inputs": tuple(statement_inputs)
+        }
 
-    def _parse_condition(self, condition: str) -> Dict[str, Any]:
+    def _parse_condition(self, condition: str) -> Block:
         """Parse a condition expression"""
         condition = condition.strip()
 
@@ -198,10 +190,7 @@ class SemanticCompiler:
                     right = self._parse_condition(parts[1])
 
                     op_type = "essentials_logic_and" if logic_op == "and" else "essentials_logic_or"
-                    return {
-                        "type": op_type,
-                        "value_inputs": {"A": left, "B": right}
-                    }
+                    return self.nodes.block(op_type, value_inputs=(("A", left), ("B", right)))
 
         # Handle comparison operators
         for comp_op in ['>=', '<=', '>', '<', '==', '!=']:
@@ -211,11 +200,11 @@ class SemanticCompiler:
                     left = self._parse_operand(parts[0].strip())
                     right = self._parse_operand(parts[1].strip())
 
-                    return {
-                        "type": "essentials_compare",
-                        "fields": {"OP": self._map_comparison_op(comp_op)},
-                        "value_inputs": {"A": left, "B": right}
-                    }
+                    return self.nodes.block(
+                        "essentials_compare",
+                        fields=(("OP", self._map_comparison_op(comp_op)),),
+                        value_inputs=(("A", left), ("B", right))
+                    )
 
         # Fallback: treat as variable
         return self._parse_operand(condition)
@@ -239,23 +228,15 @@ class SemanticCompiler:
         # Handle print actions
         if action.startswith('print '):
             message = action[6:].strip()
-            return {
-                "type": "text_print",
-                "value_inputs": {
-                    "TEXT": {
-                        "type": "text_literal",
-                        "fields": {"TEXT": message}
-                    }
-                }
-            }
+            return self._print_block(message)
 
         # Default: assume it's a print action
+        return self._print_block(action)
+
+    def _print_block(self, message: str) -> Dict[str, Any]:
         return {
             "type": "text_print",
-            "value_inputs": {
-                "TEXT": {
-                    "type": "text_literal",
-                    "fields": {"TEXT": action}
-                }
-            }
-        }
\ No newline at end of file
+            "value_inputs": (
+                ("TEXT", self.nodes.block("text_literal", fields=(("TEXT", message),))),
+            )
+        }
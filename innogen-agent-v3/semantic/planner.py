@@ -6,69 +6,164 @@ No Blockly, no XML, no code - just semantic meaning.
 """
 
 import json
-import os
-from typing import Dict, Union, Any
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+from typing import Dict, List, Union, Any, Optional
 
 from dotenv import load_dotenv
-from openai import OpenAI
 
-from semantic.prompt import system_prompt, user_prompt
-from semantic.schema import validate_semantic_plan
+from semantic.prompt import batch_user_prompt, system_prompt, user_prompt
+from semantic.schema import BATCH_PLAN_JSON_SCHEMA, PLAN_JSON_SCHEMA, validate_semantic_plan
+from pipeline.deadline import Deadline, DeadlineExceeded
+from pipeline.metrics import (
+    BATCH_PLANS,
+    BUDGET_DOWNGRADES,
+    LLM_CONCURRENCY_LIMIT,
+    LLM_HEDGES,
+    LLM_REQUESTS,
+    LLM_RETRIES,
+    LLM_SECONDS,
+    LLM_TOKENS,
+    PLANNER_RETRIES,
+)
+from llm.hedging import LatencyTracker, hedged_call
+from llm.limiter import AIMDLimiter, call_with_retries, classify_error
+from llm import structured
+from llm.backends import BackendError, ChatBackend, OpenRouterBackend, get_backend
+from llm.usage import BatchUsage, BudgetExceeded, ProblemUsage
 
 # Load environment variables
 load_dotenv()
 
+# Temperatures used when sampling several candidates concurrently.
+# The first candidate stays deterministic, the rest add diversity.
+CANDIDATE_TEMPERATURES = [0, 0.3, 0.6, 0.8, 1.0]
+
+# Upper bound for one request; a problem deadline can shorten it further
+REQUEST_TIMEOUT = 60
+
+# Latencies of answered requests; past their p90 a hedged request is sent
+LLM_LATENCY = LatencyTracker()
+
+# Requests in flight across all problems, adapted to 429s / 5xx (AIMD)
+LLM_LIMITER = AIMDLimiter(initial=4, max_limit=32)
+MAX_ATTEMPTS = 4
+
 class SemanticPlannerError(Exception):
     """Raised when the semantic planner fails unexpectedly."""
 
 
-def generate_semantic_plan(problem_text: str) -> Dict[str, Any]:
+def generate_semantic_plan(
+    problem_text: str,
+    num_candidates: int = 1,
+    validator: Optional[Any] = None,
+    base_url: Optional[str] = None,
+    deadline: Optional[Deadline] = None,
+    usage: Optional[ProblemUsage] = None,
+    backend: Optional[ChatBackend] = None
+) -> Dict[str, Any]:
     """
     Generate a semantic plan from a natural language problem.
 
     Args:
         problem_text: The natural language problem description
+        num_candidates: Number of candidates to sample in one round trip.
+            With more than one, candidates are validated in parallel and
+            the first valid one (or the best-scoring one) is returned.
+        validator: Optional CapabilityValidator used to score candidates
+        base_url: OpenRouter-compatible endpoint to use instead of `backend`
+        deadline: Problem deadline; bounds every request made here
+        usage: The problem's token account; every request is recorded and
+            checked against its budget. Near the budget, candidates and
+            hedged requests are dropped.
+        backend: Chat backend (see llm/backends.py); defaults to the one
+            selected by LLM_BACKEND
 
     Returns:
         Semantic plan dict matching the schema, or {"error": "not_expressible"}
 
     Raises:
         SemanticPlannerError on unexpected failures
+        DeadlineExceeded when the deadline runs out first
+        BudgetExceeded when the token budget is used up first
     """
 
     if not problem_text or not isinstance(problem_text, str):
         raise SemanticPlannerError("Problem text must be a non-empty string")
 
-    api_key = os.getenv("OPENROUTER_API_KEY")
-    if not api_key:
-        raise SemanticPlannerError("OPENROUTER_API_KEY not set")
+    if num_candidates < 1:
+        raise SemanticPlannerError("num_candidates must be at least 1")
 
-    # Initialize OpenRouter client
-    client = OpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=api_key
-    )
+    try:
+        if backend is None:
+            backend = OpenRouterBackend(base_url=base_url) if base_url else get_backend()
+    except BackendError as e:
+        raise SemanticPlannerError(str(e))
 
     # Build prompts
-    sys_prompt = system_prompt()
-    usr_prompt = user_prompt(problem_text)
+    messages = [
+        {"role": "system", "content": system_prompt()},
+        {"role": "user", "content": user_prompt(problem_text)}
+    ]
 
-    # Call LLM
-    try:
-        response = client.chat.completions.create(
-            model="meta-llama/llama-3-8b-instruct",
-            messages=[
-                {"role": "system", "content": sys_prompt},
-                {"role": "user", "content": usr_prompt}
-            ],
-            temperature=0
+    deadline = deadline or Deadline.none()
+    usage = usage or ProblemUsage.none()
+    usage.check("LLM request")
+
+    if num_candidates > 1 and not usage.can_afford(num_candidates):
+        BUDGET_DOWNGRADES.inc(strategy="single_candidate")
+        num_candidates = 1
+
+    if num_candidates > 1:
+        return _generate_from_candidates(backend, messages, num_candidates, validator, deadline, usage)
+
+    def single():
+        return _chat(
+            backend,
+            deadline,
+            usage,
+            "single",
+            messages=messages,
+            temperature=0,
+            response_format=_plan_response_format()
         )
+
+    # Call LLM (hedged: a second request goes out if the first is slow,
+    # unless the budget cannot pay for both)
+    try:
+        if usage.can_afford(2):
+            response = hedged_call(
+                single,
+                LLM_LATENCY,
+                deadline,
+                on_hedge=lambda winner: LLM_HEDGES.inc(winner=winner)
+            )
+        else:
+            BUDGET_DOWNGRADES.inc(strategy="no_hedge")
+            response = single()
+    except (DeadlineExceeded, BudgetExceeded):
+        raise
     except Exception as e:
-        raise SemanticPlannerError(f"LLM call failed: {e}")
+        raise SemanticPlannerError(f"LLM call failed ({classify_error(e)}): {e}")
 
-    raw_output = response.choices[0].message.content.strip()
+    parsed = parse_plan_output(response.choices[0].message.content)
+
+    # Validate the semantic plan structure
+    if not validate_semantic_plan(parsed):
+        return {"error": "not_expressible"}
+
+    return parsed
+
+
+def parse_plan_output(raw_output: str) -> Dict[str, Any]:
+    """
+    Extract and parse the JSON object from raw LLM output.
+
+    Raises:
+        SemanticPlannerError if no valid JSON can be recovered
+    """
+    raw_output = (raw_output or "").strip()
 
-    # Extract and parse JSON
     try:
         # Try to find JSON in the response
         json_start = raw_output.find('{')
@@ -78,14 +173,354 @@ def generate_semantic_plan(problem_text: str) -> Dict[str, Any]:
         else:
             json_text = raw_output[json_start:json_end]
 
-        parsed = json.loads(json_text)
-    except json.JSONDecodeError as e:
+        return json.loads(json_text)
+    except json.JSONDecodeError:
         raise SemanticPlannerError(
             f"LLM did not return valid JSON. Raw output: {raw_output[:500]}"
         )
 
-    # Validate the semantic plan structure
-    if not validate_semantic_plan(parsed):
+
+# -------------------------
+# Batch planning
+# -------------------------
+def generate_semantic_plans(
+    problems: Dict[str, str],
+    deadline: Optional[Deadline] = None,
+    usages: Optional[Dict[str, ProblemUsage]] = None,
+    backend: Optional[ChatBackend] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Plan several problems with one request. The system prompt and the
+    per-request overhead are paid once for the whole batch, which is what
+    counts when the provider limits requests per minute.
+
+    Args:
+        problems: Problem text by id
+        deadline: Bounds the request (pass the tightest of the problems')
+        usages: Each problem's token account; the request's tokens are
+            split evenly between them
+        backend: Chat backend; defaults to the one selected by LLM_BACKEND
+
+    Returns:
+        Schema-valid plans by id. A problem whose plan is missing,
+        malformed or not_expressible is left out, and so is every problem
+        when the request fails; the caller plans those one at a time.
+    """
+    if not problems:
+        return {}
+
+    deadline = deadline or Deadline.none()
+    usages = usages or {}
+    usage = BatchUsage([usages.get(pid) or ProblemUsage.none() for pid in problems])
+
+    messages = [
+        {"role": "system", "content": system_prompt()},
+        {"role": "user", "content": batch_user_prompt(problems)}
+    ]
+
+    try:
+        if backend is None:
+            backend = get_backend()
+        response = _chat(
+            backend,
+            deadline,
+            usage,
+            "batch",
+            messages=messages,
+            temperature=0,
+            response_format=structured.response_format("semantic_plans", BATCH_PLAN_JSON_SCHEMA)
+        )
+        plans = parse_batch_output(response.choices[0].message.content, list(problems))
+    except Exception as e:
+        # Nothing lost: each problem is planned on its own instead, where
+        # an exhausted deadline or budget is reported for that problem
+        print(f"⚠️  Batch planning failed, planning {len(problems)} problems alone: {type(e).__name__}: {e}")
+        plans = {}
+
+    BATCH_PLANS.inc(len(plans), outcome="planned")
+    BATCH_PLANS.inc(len(problems) - len(plans), outcome="fallback")
+    return plans
+
+
+def parse_batch_output(raw_output: str, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Schema-valid plans by id from a batch completion. Accepts the
+    {"plans": [...]} object that was asked for or a bare array of entries;
+    entries with unknown ids, duplicate ids or invalid plans are dropped.
+
+    Raises:
+        SemanticPlannerError if the completion holds no JSON at all
+    """
+    raw_output = (raw_output or "").strip()
+    starts = [i for i in (raw_output.find("{"), raw_output.find("[")) if i != -1]
+    if not starts:
+        raise SemanticPlannerError(f"LLM did not return valid JSON. Raw output: {raw_output[:500]}")
+    start = min(starts)
+    end = raw_output.rfind("]" if raw_output[start] == "[" else "}") + 1
+
+    try:
+        parsed = json.loads(raw_output[start:end])
+    except json.JSONDecodeError:
+        raise SemanticPlannerError(f"LLM did not return valid JSON. Raw output: {raw_output[:500]}")
+
+    entries = parsed.get("plans") if isinstance(parsed, dict) else parsed
+    if not isinstance(entries, list):
+        return {}
+
+    wanted = set(ids)
+    plans: Dict[str, Dict[str, Any]] = {}
+    seen = set()
+    duplicates = set()
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        pid = str(entry.get("id"))
+        if pid not in wanted:
+            continue
+        if pid in seen:
+            duplicates.add(pid)
+            continue
+        seen.add(pid)
+        if validate_semantic_plan(entry.get("plan")):
+            plans[pid] = entry["plan"]
+
+    # Two answers for one problem: trust neither
+    for pid in duplicates:
+        plans.pop(pid, None)
+    return plans
+
+
+def _plan_response_format() -> Optional[Dict[str, Any]]:
+    """response_format constraining completions to PLAN_JSON_SCHEMA"""
+    return structured.response_format("semantic_plan", PLAN_JSON_SCHEMA)
+
+
+def _chat(backend: ChatBackend, deadline: Deadline, usage: ProblemUsage, kind: str, **kwargs) -> Any:
+    """
+    One chat completion under the shared concurrency limiter. Rate-limit
+    and transient errors are retried with backoff while the token budget
+    lasts; the call is recorded in the metrics registry and usage ledger.
+
+    A request whose response_format gets a 400/422 is sent again without
+    it; later requests to that backend skip it only if the error named
+    response_format.
+    """
+    deadline.check("LLM request")
+
+    def create(options: Dict[str, Any]):
+        return backend.chat(timeout=deadline.timeout(cap=REQUEST_TIMEOUT), **options)
+
+    def request():
+        usage.check("LLM request")
+        options = dict(kwargs)
+        if options.get("response_format") is None or not structured.supported(backend.key):
+            options.pop("response_format", None)
+            response = create(options)
+        else:
+            try:
+                response = create(options)
+            except Exception as e:
+                if not structured.rejected(e):
+                    raise
+                # Any 400/422 is tried once without the schema; only an
+                # error naming response_format turns it off for the backend
+                if structured.unsupported(e):
+                    LLM_REQUESTS.inc(outcome="response_format_rejected")
+                    structured.mark_rejected(backend.key)
+                else:
+                    LLM_REQUESTS.inc(outcome="response_format_retried")
+                options.pop("response_format")
+                response = create(options)
+        usage.record(response, kind)
+        return response
+
+    def on_retry(error_class: str, delay: float):
+        LLM_REQUESTS.inc(outcome=error_class)
+        LLM_RETRIES.inc(error_class=error_class)
+
+    start = time.perf_counter()
+    try:
+        response = call_with_retries(
+            request,
+            LLM_LIMITER,
+            max_attempts=MAX_ATTEMPTS,
+            deadline=deadline,
+            on_retry=on_retry
+        )
+    except DeadlineExceeded:
+        LLM_REQUESTS.inc(outcome="deadline")
+        raise
+    except BudgetExceeded:
+        LLM_REQUESTS.inc(outcome="budget")
+        raise
+    except Exception as e:
+        LLM_REQUESTS.inc(outcome=classify_error(e))
+        raise
+    finally:
+        LLM_SECONDS.observe(time.perf_counter() - start)
+        LLM_CONCURRENCY_LIMIT.set(LLM_LIMITER.limit)
+
+    LLM_REQUESTS.inc(outcome="ok")
+    reported = getattr(response, "usage", None)
+    if reported is not None:
+        LLM_TOKENS.inc(getattr(reported, "prompt_tokens", 0) or 0, direction="in")
+        LLM_TOKENS.inc(getattr(reported, "completion_tokens", 0) or 0, direction="out")
+    return response
+
+
+# -------------------------
+# Multi-candidate sampling
+# -------------------------
+def score_candidate(raw_output: str, validator: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    Parse and validate one candidate completion.
+
+    Scores: 0 = unparseable, 1 = JSON but wrong shape,
+    2 = schema-valid, 3 = passes the capability validator too.
+
+    Returns:
+        {"score": int, "plan": dict or None, "reason": str}
+    """
+    try:
+        plan = parse_plan_output(raw_output)
+    except SemanticPlannerError as e:
+        return {"score": 0, "plan": None, "reason": str(e)}
+
+    if not validate_semantic_plan(plan):
+        return {"score": 1, "plan": plan, "reason": "schema mismatch"}
+
+    if validator is None:
+        return {"score": 3, "plan": plan, "reason": ""}
+
+    validation = validator.validate(plan)
+    if validation["status"] != "ok":
+        return {"score": 2, "plan": plan, "reason": validation["reason"]}
+
+    return {"score": 3, "plan": plan, "reason": ""}
+
+
+def _request_with_n(
+    backend: ChatBackend,
+    messages: List[Dict[str, str]],
+    k: int,
+    deadline: Deadline,
+    usage: ProblemUsage
+) -> List[str]:
+    """Ask for k choices in a single request using the `n` parameter."""
+    response = _chat(
+        backend,
+        deadline,
+        usage,
+        "n",
+        messages=messages,
+        temperature=CANDIDATE_TEMPERATURES[-1],
+        n=k,
+        response_format=_plan_response_format()
+    )
+    return [choice.message.content or "" for choice in response.choices]
+
+
+def _request_single(
+    backend: ChatBackend,
+    messages: List[Dict[str, str]],
+    index: int,
+    deadline: Deadline,
+    usage: ProblemUsage
+) -> str:
+    """Request one candidate, varying temperature and seed by index."""
+    temperature = CANDIDATE_TEMPERATURES[index % len(CANDIDATE_TEMPERATURES)]
+    response = _chat(
+        backend,
+        deadline,
+        usage,
+        "candidate",
+        messages=messages,
+        temperature=temperature,
+        seed=index,
+        response_format=_plan_response_format()
+    )
+    return response.choices[0].message.content or ""
+
+
+def _generate_from_candidates(
+    backend: ChatBackend,
+    messages: List[Dict[str, str]],
+    k: int,
+    validator: Optional[Any],
+    deadline: Deadline,
+    usage: ProblemUsage
+) -> Dict[str, Any]:
+    """
+    Sample k candidates and return the first valid one.
+
+    Tries the `n` parameter first. Providers that ignore `n` return fewer
+    choices, so the remainder is requested concurrently with varied
+    temperatures and seeds. Every candidate is validated as soon as it
+    arrives, and the first one that passes wins without waiting for the rest.
+    """
+    best: Optional[Dict[str, Any]] = None
+    errors: List[str] = []
+
+    def consider(result: Dict[str, Any]) -> bool:
+        nonlocal best
+        if best is None or result["score"] > best["score"]:
+            best = result
+        return result["score"] == 3
+
+    # Not a `with` block: leaving it would wait for every in-flight request
+    pool = ThreadPoolExecutor(max_workers=k)
+    try:
+        outputs: List[str] = []
+        try:
+            outputs = _request_with_n(backend, messages, k, deadline, usage)
+        except (DeadlineExceeded, BudgetExceeded):
+            raise
+        except Exception as e:
+            errors.append(str(e))
+
+        # Validate the batched choices in parallel, in index order
+        for result in pool.map(lambda raw: score_candidate(raw, validator), outputs):
+            if consider(result):
+                return result["plan"]
+
+        missing = k - len(outputs)
+        if missing > 1 and not usage.can_afford(missing):
+            # Not enough budget left to fill the rest: one more try at most
+            BUDGET_DOWNGRADES.inc(strategy="fewer_candidates")
+            missing = 1
+        # Provider ignored `n` (or failed): each extra request is a retry
+        PLANNER_RETRIES.inc(missing)
+        futures = [
+            pool.submit(
+                lambda i: score_candidate(_request_single(backend, messages, i, deadline, usage), validator),
+                len(outputs) + i
+            )
+            for i in range(missing)
+        ]
+
+        try:
+            for future in as_completed(futures, timeout=deadline.remaining()):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append(str(e))
+                    continue
+                if consider(result):
+                    return result["plan"]
+        except TimeoutError:
+            # Fall through with the best candidate seen so far, if any
+            if best is None:
+                raise DeadlineExceeded(f"LLM request: deadline of {deadline.seconds}s exceeded")
+    finally:
+        # Do not block on the remaining candidates
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    if best is None:
+        usage.check("LLM request")
+        raise SemanticPlannerError(f"LLM call failed: {'; '.join(errors)}")
+
+    # No candidate passed every check: return the best-scoring one
+    if best["score"] < 2:
         return {"error": "not_expressible"}
 
-    return parsed
\ No newline at end of file
+    return best["plan"]
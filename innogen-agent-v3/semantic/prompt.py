@@ -5,6 +5,8 @@ The LLM outputs PURE SEMANTIC JSON representing the problem's logic.
 No Blockly blocks, no XML, no code - just semantic meaning.
 """
 
+from typing import Dict
+
 def system_prompt() -> str:
     return (
         "You are a semantic planner for a programming system.\n\n"
@@ -43,4 +45,19 @@ def system_prompt() -> str:
     )
 
 def user_prompt(problem_text: str) -> str:
-    return f"Convert this problem to semantic representation:\n\n{problem_text}"
\ No newline at end of file
+    return f"Convert this problem to semantic representation:\n\n{problem_text}"
+
+def batch_user_prompt(problems: Dict[str, str]) -> str:
+    """
+    Several problems in one request, each under its id. The model answers
+    with one plan per id, so the system prompt is sent once for all of them.
+    """
+    listed = "\n\n".join(f"[id: {pid}]\n{text.strip()}" for pid, text in problems.items())
+    return (
+        "Convert EACH of these problems to semantic representation.\n\n"
+        "OUTPUT FORMAT: Instead of a single plan, output ONLY a JSON object of this form:\n"
+        '{"plans": [{"id": "<problem id>", "plan": <plan object as described above>}, ...]}\n'
+        "with exactly one entry per problem, using the ids given below. "
+        "Plan each problem on its own; do not share variables between problems.\n\n"
+        f"{listed}"
+    )
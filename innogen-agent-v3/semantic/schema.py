@@ -17,6 +17,69 @@ SEMANTIC_SCHEMA = {
     }
 }
 
+# JSON Schema of the same plan, sent as response_format so the backend
+# decodes only well-formed plans. It is a little stricter than
+# validate_semantic_plan: inputs must be identifiers and derived entries
+# "name = expression", the only forms the compiler can use.
+IDENTIFIER_PATTERN = r"^[A-Za-z_][A-Za-z0-9_]*$"
+DERIVED_PATTERN = r"^[A-Za-z_][A-Za-z0-9_]*\s*=\s*\S.*$"
+
+PLAN_JSON_SCHEMA = {
+    "anyOf": [
+        {"$ref": "#/$defs/plan"},
+        {"$ref": "#/$defs/not_expressible"}
+    ],
+    "$defs": {
+        "plan": {
+            "type": "object",
+            "properties": {
+                "inputs": {"type": "array", "items": {"type": "string", "pattern": IDENTIFIER_PATTERN}},
+                "derived": {"type": "array", "items": {"type": "string", "pattern": DERIVED_PATTERN}},
+                "condition": {"type": ["string", "null"]},
+                "actions": {
+                    "type": "object",
+                    "properties": {
+                        "then": {"type": "array", "items": {"type": "string"}},
+                        "else": {"type": "array", "items": {"type": "string"}}
+                    },
+                    "required": ["then", "else"],
+                    "additionalProperties": False
+                }
+            },
+            "required": ["inputs", "derived", "condition", "actions"],
+            "additionalProperties": False
+        },
+        "not_expressible": {
+            "type": "object",
+            "properties": {"error": {"const": "not_expressible"}},
+            "required": ["error"],
+            "additionalProperties": False
+        }
+    }
+}
+
+# Several plans in one completion (batch planning), each under its problem id
+BATCH_PLAN_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "plans": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "string"},
+                    "plan": {"anyOf": PLAN_JSON_SCHEMA["anyOf"]}
+                },
+                "required": ["id", "plan"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["plans"],
+    "additionalProperties": False,
+    "$defs": PLAN_JSON_SCHEMA["$defs"]
+}
+
 def validate_semantic_plan(plan: dict) -> bool:
     """
     Basic validation that the plan matches the expected schema.
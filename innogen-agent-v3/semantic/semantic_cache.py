@@ -0,0 +1,213 @@
+"""
+Semantic Plan Cache (Module 1 accelerator)
+
+Problem sets contain many paraphrases of the same task. An exact-prompt
+cache misses them, so descriptions are embedded with the same sentence
+embedder the v0 BlockKnowledgeBase uses and matched against previously
+solved problems by cosine similarity.
+
+Only plans that were verified by execution are stored. A reused plan still
+goes through the CapabilityValidator and the browser, and an entry whose
+reuse fails either check is evicted.
+
+Modes:
+    off      - no lookups
+    shadow   - look up and measure, but always call the LLM. The LLM plan is
+               compared with the cached one to estimate the false-positive
+               rate for the current threshold.
+    enforce  - reuse the cached plan above the threshold and skip the LLM
+"""
+
+import json
+import threading
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+from semantic.template_cache import canonicalize_plan
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+DEFAULT_THRESHOLD = 0.92
+MODES = ("off", "shadow", "enforce")
+
+
+def plans_equivalent(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    """
+    True when two plans are identical up to a consistent renaming of
+    variables. Constants and messages must match exactly.
+    """
+    ca, cb = canonicalize_plan(a), canonicalize_plan(b)
+    if ca is None or cb is None:
+        return json.dumps(a, sort_keys=True) == json.dumps(b, sort_keys=True)
+
+    def messages(canonical):
+        # "print total" prints a variable, so it follows the renaming too
+        return [
+            f"__v{canonical.identifiers.index(m)}__" if m in canonical.identifiers else m
+            for m in canonical.strings
+        ]
+
+    return ca.key == cb.key and ca.numbers == cb.numbers and messages(ca) == messages(cb)
+
+
+class SemanticPlanCache:
+    """
+    Nearest-neighbour cache of verified plans keyed by description embedding.
+
+    Usage:
+        cache = SemanticPlanCache("outputs/semantic_cache.jsonl", mode="shadow")
+        hit = cache.lookup(description)        # {"plan", "similarity", "pid"} or None
+        ...
+        cache.store(pid, description, plan)    # after a successful execution
+        print(cache.stats())
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        threshold: float = DEFAULT_THRESHOLD,
+        mode: str = "shadow",
+        embedder: Optional[Any] = None
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown semantic cache mode: {mode}")
+
+        self.path = Path(path) if path else None
+        self.threshold = threshold
+        self.mode = mode
+        self._embedder = embedder
+        self._lock = threading.Lock()
+
+        self.entries: List[Dict[str, Any]] = self._load()
+        self.counters = {
+            "lookups": 0,
+            "hits": 0,
+            "shadow_agree": 0,
+            "shadow_disagree": 0,
+            "rejected": 0,
+            "evicted": 0,
+            "stored": 0,
+        }
+
+    @property
+    def enforce(self) -> bool:
+        return self.mode == "enforce"
+
+    def _load(self) -> List[Dict[str, Any]]:
+        """Load persisted entries (one JSON object per line)"""
+        if not self.path or not self.path.exists():
+            return []
+        entries = []
+        with self.path.open("r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    entries.append(json.loads(line))
+        return entries
+
+    def _save(self):
+        if not self.path:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            for entry in self.entries:
+                f.write(json.dumps(entry) + "\n")
+        tmp.replace(self.path)
+
+    def _embed(self, text: str) -> List[float]:
+        # Loaded lazily so runs with the cache off never import the model
+        if self._embedder is None:
+            from sentence_transformers import SentenceTransformer
+            self._embedder = SentenceTransformer(EMBEDDING_MODEL_NAME)
+        return list(self._embedder.encode(text, normalize_embeddings=True).tolist())
+
+    def _nearest(self, vector: List[float]) -> Optional[Dict[str, Any]]:
+        best, best_score = None, -1.0
+        for entry in self.entries:
+            # Embeddings are normalized, so the dot product is the cosine
+            score = sum(x * y for x, y in zip(vector, entry["embedding"]))
+            if score > best_score:
+                best, best_score = entry, score
+        if best is None:
+            return None
+        return {"entry": best, "similarity": best_score}
+
+    def lookup(self, description: str) -> Optional[Dict[str, Any]]:
+        """
+        Find the most similar solved problem.
+
+        Returns:
+            {"plan": dict, "similarity": float, "pid": str} above the
+            threshold, otherwise None
+        """
+        if self.mode == "off":
+            return None
+
+        vector = self._embed(description)
+        with self._lock:
+            self.counters["lookups"] += 1
+            nearest = self._nearest(vector)
+            if nearest is None or nearest["similarity"] < self.threshold:
+                return None
+            self.counters["hits"] += 1
+            entry = nearest["entry"]
+            return {
+                "plan": json.loads(json.dumps(entry["plan"])),
+                "similarity": nearest["similarity"],
+                "pid": entry["pid"],
+            }
+
+    def record_shadow(self, hit: Dict[str, Any], llm_plan: Dict[str, Any]) -> bool:
+        """Compare a shadow hit with the plan the LLM produced. Returns True on agreement."""
+        agree = plans_equivalent(hit["plan"], llm_plan)
+        with self._lock:
+            self.counters["shadow_agree" if agree else "shadow_disagree"] += 1
+        return agree
+
+    def reject(self, hit: Dict[str, Any]):
+        """A reused plan failed capability validation: evict it."""
+        with self._lock:
+            self.counters["rejected"] += 1
+            self._evict(hit["pid"])
+
+    def invalidate(self, hit: Dict[str, Any]):
+        """A reused plan failed execution: evict it."""
+        with self._lock:
+            self._evict(hit["pid"])
+
+    def _evict(self, pid: str):
+        before = len(self.entries)
+        self.entries = [e for e in self.entries if e["pid"] != pid]
+        if len(self.entries) != before:
+            self.counters["evicted"] += 1
+            self._save()
+
+    def store(self, pid: str, description: str, plan: Dict[str, Any]):
+        """Remember a plan whose execution succeeded"""
+        if self.mode == "off":
+            return
+        vector = self._embed(description)
+        with self._lock:
+            self.entries = [e for e in self.entries if e["pid"] != pid]
+            self.entries.append({
+                "pid": pid,
+                "description": description,
+                "embedding": vector,
+                "plan": plan,
+            })
+            self.counters["stored"] += 1
+            self._save()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.counters)
+        lookups = stats["lookups"]
+        compared = stats["shadow_agree"] + stats["shadow_disagree"]
+        stats.update({
+            "mode": self.mode,
+            "threshold": self.threshold,
+            "entries": len(self.entries),
+            "hit_rate": round(stats["hits"] / lookups, 3) if lookups else 0.0,
+            "false_positive_rate": round(stats["shadow_disagree"] / compared, 3) if compared else 0.0,
+        })
+        return stats
@@ -0,0 +1,205 @@
+"""
+Plan Template Cache (Module 3 accelerator)
+
+Many exam-style problems produce plans with the same shape that differ only
+in variable names, constants and messages. Plans are alpha-canonicalized:
+identifiers become positional placeholders, numbers are renumbered and
+action messages are lifted out. The canonical plan is compiled once, and
+later plans with the same shape are compiled by substituting their bindings
+into the cached block-tree template.
+
+Templates and instances are hash-consed trees (semantic/blocks.py), so
+instantiating rebuilds only the nodes whose fields change; the rest of the
+template is shared.
+"""
+
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional
+
+from semantic.blocks import NODES, Block, NodeTable
+from semantic.compiler import SemanticCompiler
+
+# Tokens are only lifted when they stand alone (not part of "1e5" or "a.b")
+IDENTIFIER_RE = re.compile(r'(?<![\w.])[A-Za-z_]\w*')
+NUMBER_RE = re.compile(r'(?<![\w.])\d+(?:\.\d+)?(?![\w.])')
+PLACEHOLDER_RE = re.compile(r'__(v|s)(\d+)__')
+
+# Words the compiler interprets, plus names float() accepts as numbers
+RESERVED_IDENTIFIERS = {"and", "or", "not", "inf", "infinity", "nan"}
+
+
+class CanonicalPlan:
+    """A plan with its bindings lifted out."""
+
+    def __init__(self, plan: Dict[str, Any], identifiers: List[str], numbers: List[str], strings: List[str]):
+        self.plan = plan
+        self.identifiers = identifiers
+        self.numbers = numbers
+        self.strings = strings
+        self.key = hashlib.sha256(
+            json.dumps(plan, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+
+def canonicalize_plan(semantic_plan: Dict[str, Any]) -> Optional[CanonicalPlan]:
+    """
+    Rename identifiers to __v<i>__, renumber numeric literals to <i> and
+    lift action messages to __s<i>__.
+
+    Returns None when the plan has values the compiler would not treat as
+    strings (those plans are compiled directly).
+    """
+    identifiers: Dict[str, str] = {}
+    numbers: Dict[str, str] = {}
+    strings: List[str] = []
+
+    def lift_identifier(match):
+        name = match.group(0)
+        if name.lower() in RESERVED_IDENTIFIERS:
+            return name
+        if name not in identifiers:
+            identifiers[name] = f"__v{len(identifiers)}__"
+        return identifiers[name]
+
+    def lift_number(match):
+        value = match.group(0)
+        if value not in numbers:
+            numbers[value] = str(len(numbers))
+        return numbers[value]
+
+    def canon_text(text: str) -> str:
+        # Numbers first: placeholders contain digits but never stand alone
+        return IDENTIFIER_RE.sub(lift_identifier, NUMBER_RE.sub(lift_number, text))
+
+    def canon_action(action: str) -> str:
+        action = action.strip()
+        if action.startswith('print '):
+            strings.append(action[6:].strip())
+            return f"print __s{len(strings) - 1}__"
+        strings.append(action)
+        return f"__s{len(strings) - 1}__"
+
+    inputs = semantic_plan.get("inputs", [])
+    derived = semantic_plan.get("derived", [])
+    condition = semantic_plan.get("condition")
+    actions = semantic_plan.get("actions", {})
+
+    texts = list(inputs) + list(derived) + list(actions.get("then", [])) + list(actions.get("else", []))
+    if not all(isinstance(t, str) for t in texts) or not (condition is None or isinstance(condition, str)):
+        return None
+
+    canonical = {
+        "inputs": [canon_text(name) for name in inputs],
+        "derived": [canon_text(expr) for expr in derived],
+        "condition": canon_text(condition) if condition is not None else None,
+        "actions": {
+            "then": [canon_action(a) for a in actions.get("then", [])],
+            "else": [canon_action(a) for a in actions.get("else", [])],
+        },
+    }
+
+    # Invert the maps: position -> original text
+    identifier_list = [None] * len(identifiers)
+    for name, placeholder in identifiers.items():
+        identifier_list[int(placeholder[3:-2])] = name
+    number_list = [None] * len(numbers)
+    for value, index in numbers.items():
+        number_list[int(index)] = value
+
+    return CanonicalPlan(canonical, identifier_list, number_list, strings)
+
+
+def instantiate_template(
+    template: Block,
+    canonical: CanonicalPlan,
+    nodes: Optional[NodeTable] = None
+) -> Block:
+    """Substitute a plan's bindings into a cached block-tree template."""
+    nodes = nodes or NODES
+    rebuilt: Dict[int, Block] = {}
+
+    def bind(text: str) -> str:
+        text = NUMBER_RE.sub(lambda m: canonical.numbers[int(m.group(0))], text)
+        return PLACEHOLDER_RE.sub(
+            lambda m: (canonical.identifiers if m.group(1) == "v" else canonical.strings)[int(m.group(2))],
+            text
+        )
+
+    def bind_inputs(inputs):
+        if inputs is None:
+            return None
+        return tuple((name, walk(child)) for name, child in inputs)
+
+    def walk(block: Block) -> Block:
+        # Shared template subtrees are bound once
+        if id(block) not in rebuilt:
+            fields = block.fields
+            if fields is not None:
+                fields = tuple((name, bind(v) if isinstance(v, str) else v) for name, v in fields)
+            rebuilt[id(block)] = nodes.block(
+                block.type,
+                fields,
+                bind_inputs(block.value_inputs),
+                bind_inputs(block.statement_inputs),
+                walk(block.next) if block.next is not None else None
+            )
+        return rebuilt[id(block)]
+
+    return walk(template)
+
+
+class PlanTemplateCache:
+    """
+    LRU cache of compiled block-tree templates keyed by canonical plan hash.
+
+    Usage:
+        cache = PlanTemplateCache()
+        block_tree = cache.compile(semantic_plan)
+        print(cache.stats())
+    """
+
+    def __init__(self, compiler: Optional[SemanticCompiler] = None, max_entries: int = 10000):
+        self.compiler = compiler or SemanticCompiler()
+        self.nodes = self.compiler.nodes
+        self.max_entries = max_entries
+        self.templates: "OrderedDict[str, Block]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._lock = threading.Lock()
+
+    def compile(self, semantic_plan: Dict[str, Any]) -> Block:
+        """Compile through the cache; same result as SemanticCompiler.compile."""
+        canonical = canonicalize_plan(semantic_plan)
+        if canonical is None:
+            with self._lock:
+                self.bypassed += 1
+            return self.compiler.compile(semantic_plan)
+
+        with self._lock:
+            template = self.templates.get(canonical.key)
+            if template is not None:
+                self.hits += 1
+                self.templates.move_to_end(canonical.key)
+            else:
+                self.misses += 1
+                template = self.compiler.compile(canonical.plan)
+                self.templates[canonical.key] = template
+                if len(self.templates) > self.max_entries:
+                    self.templates.popitem(last=False)
+
+        return instantiate_template(template, canonical, self.nodes)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "templates": len(self.templates),
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }